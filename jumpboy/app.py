@@ -1,9 +1,11 @@
 from datetime import datetime
 from core import (
-  Size, Path,
+  Logger, Path, Dice, Platform, PyxelPlatform, Profiler, Key,
   Language, StringRes,
+  InputReplay,
   GameConfig,
   GameEngine,
+  SnapshotWriter, sqlite3_import,
 )
 try:
   from env import (
@@ -13,19 +15,31 @@ try:
   )
 except:
   pass
-from scene import OpeningScene
-import pyxel
+try:
+  from env import RENDER_FPS as ENV_RENDER_FPS
+except:
+  ENV_RENDER_FPS = None
+try:
+  from env import SQLITE as ENV_SQLITE
+except:
+  ENV_SQLITE = None
+from design import GAME_WINDOW_SIZE, FPS, RENDER_FPS, ASSET_FOLDER, ASSET_FILE, TRANSPARENT_COLOR
+from scene import Snapshot, OpeningScene, PlayScene
+import os
 
 
 DEBUG = ENV_DEBUG if ENV_DEBUG is not None else False
 COPYRIGHT = ENV_COPYRIGHT if ENV_COPYRIGHT is not None else 'ANONYMOUS'
 RELEASED_YEAR = ENV_RELEASED_YEAR if ENV_RELEASED_YEAR is not None else datetime.now().year
-
-GAME_WINDOW_SIZE = Size(160, 120)
-FPS = 30
-ASSET_FOLDER = 'assets'
-ASSET_FILE = 'jumpboy.pyxres'
-TRANSPARENT_COLOR = pyxel.COLOR_BLACK
+GAME_RENDER_FPS = ENV_RENDER_FPS if ENV_RENDER_FPS is not None else RENDER_FPS
+SQLITE = ENV_SQLITE if ENV_SQLITE is not None else False
+PROFILE_FILE = 'profile.json'
+LOG_FILE = 'log.json'
+REPLAY_FILE = 'replay.bin'
+SAVESTATE_FILE = 'savestate.bin'
+PROFILE_KEY = Key.P
+SAVESTATE_KEY = Key.S
+RESUME_KEY = Key.L
 
 
 class App:
@@ -37,6 +51,7 @@ class App:
       title=string_res.string('game_title_1', Language.EN),
       window_size=GAME_WINDOW_SIZE,
       fps=FPS,
+      render_fps=GAME_RENDER_FPS,
       copyright=COPYRIGHT,
       released_year=RELEASED_YEAR,
       debug=DEBUG,
@@ -44,18 +59,54 @@ class App:
 
     self.engine = GameEngine(
       config=config,
-      quit_key=pyxel.KEY_Q,
+      platform=Platform.shared if hasattr(Platform, 'shared') else PyxelPlatform(),
+      quit_key=Key.Q,
       asset_file=ASSET_FILE,
       update=self.update,
       draw=self.draw,
     )
+    self.config = config
+    Dice.setup(Dice.new_seed())
+    if SQLITE and sqlite3_import:
+      SnapshotWriter.setup(SnapshotWriter(Snapshot.sqlite_store()))
     self.scene = OpeningScene(config, string_res)
+    self.replay: InputReplay | None = None
+    if DEBUG:
+      self.replay = InputReplay(Dice.seed, len(self.scene.snapshot.game_pad.buttons))
+      self.scene.snapshot.game_pad.record(self.replay)
     self.engine.run()
 
   def update(self) -> None:
+    start = Profiler.shared.start()
+    name = type(self.scene).__name__
+    self.scene.snapshot.game_pad.update()
     self.scene = self.scene.update()
+    self.scene.snapshot.music_box.update()
+    Profiler.shared.stop('update.{}'.format(name), start)
+
+    if Profiler.shared.enabled and Platform.shared.btnp(PROFILE_KEY):
+      Profiler.shared.dump(os.path.join(self.config.path.root, PROFILE_FILE))
+      Logger.shared.dump(os.path.join(self.config.path.root, LOG_FILE))
+      if self.replay is not None:
+        self.replay.save(os.path.join(self.config.path.root, REPLAY_FILE))
+
+    if DEBUG:
+      self.update_savestate()
+
+  def update_savestate(self) -> None:
+    file_path = os.path.join(self.config.path.root, SAVESTATE_FILE)
+    if Platform.shared.btnp(SAVESTATE_KEY):
+      if isinstance(self.scene, PlayScene) and self.scene.play_timer is not None:
+        with open(file_path, mode='wb') as f:
+          f.write(self.scene.savestate())
+        Logger.shared.info('savestate', file_path)
+    elif Platform.shared.btnp(RESUME_KEY) and os.path.exists(file_path):
+      with open(file_path, mode='rb') as f:
+        self.scene = PlayScene.resume(self.scene, f.read())
+      Logger.shared.info('resume', file_path)
 
-  def draw(self) -> None:
+  def draw(self, interpolation: float) -> None:
+    self.scene.stopwatch.interpolation = interpolation
     self.scene.draw(TRANSPARENT_COLOR)
 
 
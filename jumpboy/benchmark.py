@@ -0,0 +1,294 @@
+from argparse import ArgumentParser
+from statistics import mean, median
+from typing import Callable
+import json
+import sys
+import time
+import tracemalloc
+from core import Platform, Key
+from component import GameLevel
+from design import FPS, GameLevelMode, GameLevelStage
+from scene import BaseStageScene, ReadyScene, PlayScene, GameOverScene, StageClearScene
+from simulator import Simulator
+
+
+class SceneStats:
+  def __init__(self) -> None:
+    self.update_msec: list[float] = []
+    self.draw_msec: list[float] = []
+    self.draw_calls: list[int] = []
+    self.growth_kib: list[float] = []
+
+  def to_json(self) -> dict:
+    return {
+      'frames': len(self.update_msec),
+      'update_msec': median(self.update_msec) if len(self.update_msec) > 0 else 0,
+      'draw_msec': median(self.draw_msec) if len(self.draw_msec) > 0 else 0,
+      'draw_calls': mean(self.draw_calls) if len(self.draw_calls) > 0 else 0,
+      'growth_kib': mean(self.growth_kib) if len(self.growth_kib) > 0 else 0,
+    }
+
+
+class Scenario:
+  OPENING_FRAMES = FPS*2
+  TITLE_FRAMES = FPS*2
+  MAX_READY_FRAMES = FPS*30
+  PAUSE_AFTER_FRAMES = FPS
+  PAUSE_FRAMES = FPS*2
+  PLAY_FRAMES = FPS*20
+  GAME_OVER_FRAMES = FPS*4
+  MAX_CLEAR_FRAMES = FPS*10
+  JUMP_INTERVAL = FPS//2
+
+  def __init__(self, mode: int, stage: int, seed: int) -> None:
+    self.mode = mode
+    self.stage = stage
+    self.seed = seed
+
+  @property
+  def name(self) -> str:
+    return '{}.{:02}'.format(GameLevelMode(self.mode).name, self.stage+1)
+
+  def run(self, trace_memory: bool) -> dict:
+    runner = ScenarioRunner(self.seed, trace_memory)
+
+    runner.idle(self.OPENING_FRAMES)
+    runner.step([Key.RETURN])
+    runner.idle(self.TITLE_FRAMES)
+
+    runner.simulator.start_level(GameLevel(self.mode, self.stage))
+    runner.wait(ReadyScene, self.MAX_READY_FRAMES)
+
+    runner.play(self.PAUSE_AFTER_FRAMES, self.JUMP_INTERVAL)
+    runner.step([Key.SPACE])
+    runner.idle(self.PAUSE_FRAMES)
+    runner.step([Key.SPACE])
+    runner.play(self.PLAY_FRAMES, self.JUMP_INTERVAL)
+
+    if isinstance(runner.simulator.scene, GameOverScene):
+      runner.idle(self.GAME_OVER_FRAMES)
+
+    scene = runner.simulator.scene
+    forced_clear = isinstance(scene, BaseStageScene) and not isinstance(scene, StageClearScene)
+    if forced_clear:
+      runner.simulator.scene = StageClearScene(scene, scene.point, scene.play_timer)
+    runner.wait(StageClearScene, self.MAX_CLEAR_FRAMES)
+
+    result = runner.to_json()
+    result['forced_clear'] = forced_clear
+    return result
+
+
+class ScenarioRunner:
+  def __init__(self, seed: int, trace_memory: bool) -> None:
+    self.trace_memory = trace_memory
+    self.simulator = Simulator(
+      max_frame=None,
+      input_keys=None,
+      draw=True,
+      save=False,
+      debug=False,
+      seed=seed,
+      rollback_interval=None,
+    )
+    self.stats: dict[str, SceneStats] = {}
+    self.peak_kib = 0.0
+
+  def measure(self, process: Callable[[], None], samples: list[float]) -> Callable[[], None]:
+    def _measure() -> None:
+      start = time.perf_counter()
+      process()
+      samples.append((time.perf_counter()-start)*1000)
+    return _measure
+
+  def step(self, keys: list[int]) -> None:
+    name = type(self.simulator.scene).__name__
+    if name not in self.stats:
+      self.stats[name] = SceneStats()
+    stats = self.stats[name]
+
+    self.simulator.platform.press(keys)
+    draw_count = Platform.shared.draw_count
+    if self.trace_memory:
+      tracemalloc.reset_peak()
+      (start_size, _) = tracemalloc.get_traced_memory()
+      self.simulator.platform.step(self.simulator.engine.update_frame, self.simulator.engine.draw_frame)
+      (size, peak_size) = tracemalloc.get_traced_memory()
+      stats.growth_kib.append((peak_size-start_size)/1024)
+      self.peak_kib = max(self.peak_kib, peak_size/1024)
+    else:
+      self.simulator.platform.step(
+        self.measure(self.simulator.engine.update_frame, stats.update_msec),
+        self.measure(self.simulator.engine.draw_frame, stats.draw_msec),
+      )
+      stats.draw_calls.append(Platform.shared.draw_count-draw_count)
+
+  def idle(self, frame: int) -> None:
+    for _ in range(frame):
+      self.step([])
+
+  def wait(self, scene_type: type, max_frame: int) -> None:
+    for _ in range(max_frame):
+      if not isinstance(self.simulator.scene, scene_type):
+        break
+      self.step([])
+
+  def play(self, max_frame: int, jump_interval: int) -> None:
+    for index in range(max_frame):
+      if not isinstance(self.simulator.scene, PlayScene):
+        break
+      self.step([Key.RETURN] if index%jump_interval == 0 else [])
+
+  def to_json(self) -> dict:
+    return {
+      'scenes': {name: stats.to_json() for (name, stats) in self.stats.items()},
+      'peak_kib': self.peak_kib,
+    }
+
+
+class Benchmark:
+  TIME_TOLERANCE = 0.2
+  SCENARIO_TIME_TOLERANCE = 0.5
+  TIME_FLOOR_MSEC = 0.02
+  GROWTH_TOLERANCE = 0.1
+  MEMORY_FLOOR_KIB = 1.0
+  PEAK_TOLERANCE = 0.1
+  DRAW_CALL_FLOOR = 0.5
+
+  def __init__(self, seed: int, scenario_filter: str | None, repeat: int, trace_memory: bool) -> None:
+    self.seed = seed
+    self.scenario_filter = scenario_filter
+    self.repeat = max(repeat, 1)
+    self.trace_memory = trace_memory
+
+  def scenarios(self) -> list[Scenario]:
+    scenarios: list[Scenario] = []
+    for mode in GameLevelMode:
+      for stage in GameLevelStage:
+        scenario = Scenario(mode, stage, self.seed+mode*len(GameLevelStage)+stage)
+        if self.scenario_filter is None or self.scenario_filter in scenario.name:
+          scenarios.append(scenario)
+    return scenarios
+
+  @classmethod
+  def frame_msec(cls, scenes: list[dict], key: str) -> float:
+    frames = sum([scene['frames'] for scene in scenes])
+    return sum([scene['frames']*scene[key] for scene in scenes])/frames if frames > 0 else 0
+
+  def run_scenario(self, scenario: Scenario) -> dict:
+    result = scenario.run(False)
+    for _ in range(self.repeat-1):
+      again = scenario.run(False)
+      for (name, scene) in again['scenes'].items():
+        for key in ['update_msec', 'draw_msec']:
+          result['scenes'][name][key] = min(result['scenes'][name][key], scene[key])
+
+    if self.trace_memory:
+      tracemalloc.start()
+      memory = scenario.run(True)
+      tracemalloc.stop()
+      for (name, scene) in memory['scenes'].items():
+        if name in result['scenes']:
+          result['scenes'][name]['growth_kib'] = scene['growth_kib']
+      result['peak_kib'] = memory['peak_kib']
+
+    scenes = list(result['scenes'].values())
+    result['update_msec'] = self.frame_msec(scenes, 'update_msec')
+    result['draw_msec'] = self.frame_msec(scenes, 'draw_msec')
+    return result
+
+  def run(self) -> dict:
+    scenarios = {scenario.name: self.run_scenario(scenario) for scenario in self.scenarios()}
+    scenes = [scene for result in scenarios.values() for scene in result['scenes'].values()]
+    return {
+      'update_msec': self.frame_msec(scenes, 'update_msec'),
+      'draw_msec': self.frame_msec(scenes, 'draw_msec'),
+      'scenarios': scenarios,
+    }
+
+  @classmethod
+  def exceeded(cls, value: float, base: float, tolerance: float, floor: float) -> bool:
+    return value > base*(1+tolerance) and value-base > floor
+
+  @classmethod
+  def compare(cls, results: dict, baseline: dict) -> list[str]:
+    regressions: list[str] = []
+    names = [name for name in results['scenarios'].keys() if name in baseline['scenarios']]
+    scenes = [scene for name in names for scene in results['scenarios'][name]['scenes'].values()]
+    base_scenes = [scene for name in names for scene in baseline['scenarios'][name]['scenes'].values()]
+    for key in ['update_msec', 'draw_msec']:
+      (value, base_value) = (cls.frame_msec(scenes, key), cls.frame_msec(base_scenes, key))
+      if cls.exceeded(value, base_value, cls.TIME_TOLERANCE, cls.TIME_FLOOR_MSEC):
+        regressions.append('total {} {:.3f} -> {:.3f}'.format(key, base_value, value))
+
+    for (name, result) in results['scenarios'].items():
+      if name not in baseline['scenarios']:
+        continue
+      base = baseline['scenarios'][name]
+
+      for key in ['update_msec', 'draw_msec']:
+        if cls.exceeded(result[key], base[key], cls.SCENARIO_TIME_TOLERANCE, cls.TIME_FLOOR_MSEC):
+          regressions.append('{} {} {:.3f} -> {:.3f}'.format(name, key, base[key], result[key]))
+
+      if result['peak_kib'] > 0 and cls.exceeded(result['peak_kib'], base['peak_kib'], cls.PEAK_TOLERANCE, cls.MEMORY_FLOOR_KIB):
+        regressions.append('{} peak_kib {:.1f} -> {:.1f}'.format(name, base['peak_kib'], result['peak_kib']))
+
+      for (scene_name, scene) in result['scenes'].items():
+        if scene_name not in base['scenes']:
+          continue
+        base_scene = base['scenes'][scene_name]
+
+        if scene['growth_kib'] > 0 and cls.exceeded(scene['growth_kib'], base_scene['growth_kib'], cls.GROWTH_TOLERANCE, cls.MEMORY_FLOOR_KIB):
+          regressions.append('{} {} growth_kib {:.1f} -> {:.1f}'.format(name, scene_name, base_scene['growth_kib'], scene['growth_kib']))
+        if cls.exceeded(scene['draw_calls'], base_scene['draw_calls'], 0, cls.DRAW_CALL_FLOOR):
+          regressions.append('{} {} draw_calls {:.1f} -> {:.1f}'.format(name, scene_name, base_scene['draw_calls'], scene['draw_calls']))
+
+    return regressions
+
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='run seeded scripted sessions of every stage and gate frame time regressions')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--scenario', type=str, default=None)
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--no-memory', action='store_true')
+  parser.add_argument('--baseline', type=str, default=None)
+  parser.add_argument('--output', type=str, default=None)
+  args = parser.parse_args()
+
+  benchmark = Benchmark(args.seed, args.scenario, args.repeat, not args.no_memory)
+  results = benchmark.run()
+
+  for (name, result) in results['scenarios'].items():
+    for (scene_name, scene) in result['scenes'].items():
+      print('{:10} {:16} frames {:5} update {:7.3f} draw {:7.3f} msec call {:6.1f} growth {:8.1f} KiB'.format(
+        name,
+        scene_name,
+        scene['frames'],
+        scene['update_msec'],
+        scene['draw_msec'],
+        scene['draw_calls'],
+        scene['growth_kib'],
+      ))
+    print('{:10} update {:7.3f} draw {:7.3f} msec peak {:8.1f} KiB{}'.format(
+      name,
+      result['update_msec'],
+      result['draw_msec'],
+      result['peak_kib'],
+      ' forced clear' if result['forced_clear'] else '',
+    ))
+  print('total      update {:7.3f} draw {:7.3f} msec'.format(results['update_msec'], results['draw_msec']))
+
+  if args.output is not None:
+    with open(args.output, mode='w') as f:
+      json.dump(results, f, indent=2)
+
+  if args.baseline is not None:
+    with open(args.baseline, mode='r') as f:
+      baseline = json.load(f)
+
+    regressions = Benchmark.compare(results, baseline)
+    for regression in regressions:
+      print('regression', regression)
+    if len(regressions) > 0:
+      sys.exit(1)
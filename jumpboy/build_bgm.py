@@ -0,0 +1,64 @@
+from argparse import ArgumentParser
+import glob
+import json
+import os
+import pyxel
+from core import Path, BgmTrack
+from design import ASSET_FOLDER
+from scene import BGM_FOLDER
+
+
+class BgmBuilder:
+  def __init__(self, path: Path, compress: bool) -> None:
+    self.path = path
+    self.compress = compress
+
+  @property
+  def bgm_path(self) -> str:
+    return os.path.join(self.path.asset_path, BGM_FOLDER)
+
+  @classmethod
+  def convert(cls, sounds: list) -> list[BgmTrack.Channel]:
+    channels: list[BgmTrack.Channel] = []
+    for (notes, tones, volumes, effects, speed) in sounds:
+      sound = pyxel.Sound()
+      sound.set(notes, tones, volumes, effects, speed)
+      channels.append(
+        BgmTrack.Channel(
+          sound.notes.to_list(),
+          sound.tones.to_list(),
+          sound.volumes.to_list(),
+          sound.effects.to_list(),
+          sound.speed,
+        )
+      )
+    return channels
+
+  def build(self, output_path: str) -> None:
+    for json_path in sorted(glob.glob(os.path.join(self.bgm_path, '*.json'))):
+      with open(json_path, mode='r') as f:
+        channels = self.convert(json.loads(f.read()))
+
+      track_file = os.path.splitext(os.path.basename(json_path))[0]+BgmTrack.EXTENSION
+      track_path = os.path.join(output_path, track_file)
+      with open(track_path, mode='wb') as f:
+        f.write(BgmTrack.encode(channels, self.compress))
+      print('bgm track build', track_path, os.path.getsize(json_path), os.path.getsize(track_path))
+
+  def clean(self) -> None:
+    for track_path in sorted(glob.glob(os.path.join(self.bgm_path, '*'+BgmTrack.EXTENSION))):
+      os.remove(track_path)
+      print('bgm track remove', track_path)
+
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='convert json bgm tracks into binary tracks loaded by music box')
+  parser.add_argument('--no-compress', action='store_true')
+  parser.add_argument('--clean', action='store_true')
+  args = parser.parse_args()
+
+  builder = BgmBuilder(Path(__file__, ASSET_FOLDER), not args.no_compress)
+  if args.clean:
+    builder.clean()
+  else:
+    builder.build(builder.bgm_path)
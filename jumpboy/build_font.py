@@ -0,0 +1,75 @@
+from argparse import ArgumentParser
+import ast
+import glob
+import os
+import string
+from core import Path, StringRes, GlyphAtlas, Typewriter
+from design import ASSET_FOLDER
+
+
+class GlyphCollector:
+  SOURCE_FILES = ['scene.py', 'app.py', 'env.py']
+  BASE_CHARS = ' '+string.ascii_letters+string.digits+string.punctuation
+
+  def __init__(self, path: Path) -> None:
+    self.path = path
+
+  def add(self, chars: set[str], value: str) -> None:
+    chars.update(value)
+    chars.update(value.upper())
+
+  def collect(self) -> set[int]:
+    chars = set(self.BASE_CHARS)
+
+    string_res = StringRes(self.path)
+    for strings in string_res.strings.values():
+      for value in strings.values():
+        self.add(chars, value)
+
+    for source_file in self.SOURCE_FILES:
+      source_path = os.path.join(self.path.root, source_file)
+      if not os.path.exists(source_path):
+        continue
+      with open(source_path, mode='r') as f:
+        tree = ast.parse(f.read())
+      for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+          self.add(chars, node.value)
+
+    return {ord(char) for char in chars if char.isprintable()}
+
+
+class FontBuilder:
+  def __init__(self, path: Path, codepoints: set[int] | None) -> None:
+    self.path = path
+    self.codepoints = codepoints
+
+  @property
+  def font_path(self) -> str:
+    return os.path.join(self.path.asset_path, Typewriter.FONT_FOLDER)
+
+  def build(self, output_path: str) -> None:
+    for bdf_path in sorted(glob.glob(os.path.join(self.font_path, '*.bdf'))):
+      atlas_file = os.path.splitext(os.path.basename(bdf_path))[0]+GlyphAtlas.EXTENSION
+      atlas_path = os.path.join(output_path, atlas_file)
+      count = GlyphAtlas.build(bdf_path, atlas_path, self.codepoints)
+      print('glyph atlas build', atlas_path, count, os.path.getsize(atlas_path))
+
+  def clean(self) -> None:
+    for atlas_path in sorted(glob.glob(os.path.join(self.font_path, '*'+GlyphAtlas.EXTENSION))):
+      os.remove(atlas_path)
+      print('glyph atlas remove', atlas_path)
+
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='compile bdf fonts into binary glyph atlases loaded by typewriter')
+  parser.add_argument('--subset', action='store_true')
+  parser.add_argument('--clean', action='store_true')
+  args = parser.parse_args()
+
+  path = Path(__file__, ASSET_FOLDER)
+  builder = FontBuilder(path, GlyphCollector(path).collect() if args.subset else None)
+  if args.clean:
+    builder.clean()
+  else:
+    builder.build(builder.font_path)
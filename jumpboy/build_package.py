@@ -0,0 +1,38 @@
+from argparse import ArgumentParser
+import os
+import shutil
+import tempfile
+import pyxel.cli
+from core import Path, Typewriter
+from design import ASSET_FOLDER
+from scene import BGM_FOLDER
+from build_font import GlyphCollector, FontBuilder
+from build_bgm import BgmBuilder
+
+
+PACKAGE_IGNORE_PATTERNS = ['__pycache__', 'snapshot', '*.bdf', '*.jbf', '*.jbm']
+STARTUP_SCRIPT = 'app.py'
+
+
+def package_ignore(folder: str, names: list[str]) -> set[str]:
+  ignore_names = shutil.ignore_patterns(*PACKAGE_IGNORE_PATTERNS)(folder, names)
+  if os.path.basename(folder) == BGM_FOLDER:
+    ignore_names.update([name for name in names if name.endswith('.json')])
+  return ignore_names
+
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='package app with subsetted fonts and binary bgm tracks')
+  parser.parse_args()
+
+  path = Path(__file__, ASSET_FOLDER)
+  codepoints = GlyphCollector(path).collect()
+  print('glyph subset', len(codepoints))
+
+  with tempfile.TemporaryDirectory() as work_path:
+    app_path = os.path.join(work_path, os.path.basename(path.root))
+    shutil.copytree(path.root, app_path, ignore=package_ignore)
+    FontBuilder(path, codepoints).build(os.path.join(app_path, ASSET_FOLDER, Typewriter.FONT_FOLDER))
+    BgmBuilder(path, True).build(os.path.join(app_path, ASSET_FOLDER, BGM_FOLDER))
+
+    pyxel.cli.package_pyxel_app(app_path, os.path.join(app_path, STARTUP_SCRIPT))
@@ -1,13 +1,21 @@
+from array import array
 from datetime import datetime
 from enum import IntEnum
-from typing import TypeVar
+from typing import Callable, TypeVar
 from core import (
-  Coordinate, Size, Dice, Stopwatch, Timer,
+  Logger, Coordinate, Size, Dice, Stopwatch, Timer, Key,
   Language, TileMap,
-  Block, FlashSprite, Obstacle, Field as BaseField, GamePad as BaseGamePad, MusicBox,
-  Snapshot as BaseSnapshot,
+  Variation, Block, FlashSprite, CollisionIndex, Obstacle, Field as BaseField, GamePad as BaseGamePad, MusicBox,
+  Path, Snapshot as BaseSnapshot, SnapshotWriter, SqliteSnapshotStore,
 )
-import pyxel
+import heapq
+import struct
+import zlib
+try:
+  import numpy as np
+  numpy_import = True
+except:
+  numpy_import = False
 
 
 class GamePad(BaseGamePad):
@@ -19,14 +27,14 @@ class GamePad(BaseGamePad):
     super().__init__(
       watch_buttons={
         self.Button.ENTER: [
-          pyxel.KEY_RETURN,
-          pyxel.MOUSE_BUTTON_LEFT,
-          pyxel.GAMEPAD1_BUTTON_A,
+          Key.RETURN,
+          Key.MOUSE_BUTTON_LEFT,
+          Key.GAMEPAD1_BUTTON_A,
         ],
         self.Button.CANCEL: [
-          pyxel.KEY_SPACE,
-          pyxel.MOUSE_BUTTON_RIGHT,
-          pyxel.GAMEPAD1_BUTTON_B,
+          Key.SPACE,
+          Key.MOUSE_BUTTON_RIGHT,
+          Key.GAMEPAD1_BUTTON_B,
         ]
       }
     )
@@ -54,13 +62,280 @@ class Score:
     self.level = level
     self.point = point
 
+  def to_json(self) -> dict:
+    return {
+      'created_at': self.created_at.timestamp(),
+      'level': self.level.mode,
+      'stage': self.level.stage,
+      'point': self.point,
+    }
+
+  @classmethod
+  def from_json(cls, data: dict) -> 'Score':
+    return Score(
+      datetime.fromtimestamp(data['created_at']),
+      GameLevel(data['level'], data['stage']),
+      data['point'],
+    )
+
+
+class ScoreHistory:
+  COMPRESS_LEVEL = 1
+
+  def __init__(self, retention: int) -> None:
+    self.retention = retention
+
+    self.created_at = array('d')
+    self.mode = array('B')
+    self.stage = array('B')
+    self.point = array('I')
+    self.dropped_count = 0
+    self.pending: Callable[[], list[array]] | None = None
+    self.pending_count = 0
+
+  def __len__(self) -> int:
+    self.decode()
+    return len(self.point)
+
+  @property
+  def count(self) -> int:
+    return self.dropped_count+self.pending_count+len(self.point)
+
+  @property
+  def columns(self) -> list[array]:
+    return [self.created_at, self.mode, self.stage, self.point]
+
+  def append(self, score: Score) -> None:
+    self.created_at.append(score.created_at.timestamp())
+    self.mode.append(score.level.mode)
+    self.stage.append(score.level.stage)
+    self.point.append(score.point)
+    if self.pending is None:
+      self.trim()
+
+  def trim(self) -> None:
+    drop_count = len(self.point)-self.retention
+    if drop_count > self.retention//4:
+      for column in self.columns:
+        del column[:drop_count]
+      self.dropped_count += drop_count
+      Logger.shared.debug('score history drop', drop_count, self.dropped_count)
+
+  def score(self, index: int) -> Score:
+    return Score(
+      datetime.fromtimestamp(self.created_at[index]),
+      GameLevel(self.mode[index], self.stage[index]),
+      self.point[index],
+    )
+
+  def scores(self, start: int) -> list[Score]:
+    if start >= self.count:
+      return []
+    if start < self.dropped_count+self.pending_count:
+      self.decode()
+    offset = self.dropped_count+self.pending_count
+    return [self.score(index) for index in range(max(start-offset, 0), len(self.point))]
+
+  def to_bytes(self) -> bytes:
+    self.decode()
+    return zlib.compress(b''.join([column.tobytes() for column in self.columns]), self.COMPRESS_LEVEL)
+
+  def from_bytes(self, data: memoryview, count: int, dropped_count: int) -> None:
+    self.load(lambda: self.unpack(zlib.decompress(data), count), count, dropped_count)
+
+  def load(self, loader: Callable[[], list[array]], count: int, dropped_count: int) -> None:
+    for column in self.columns:
+      del column[:]
+    self.dropped_count = dropped_count
+    self.pending = loader if count > 0 else None
+    self.pending_count = max(count, 0)
+
+  def unpack(self, data: bytes, count: int) -> list[array]:
+    columns = [array(column.typecode) for column in self.columns]
+    offset = 0
+    for column in columns:
+      size = count*column.itemsize
+      column.frombytes(data[offset:offset+size])
+      offset += size
+    return columns
+
+  def decode(self) -> None:
+    if self.pending is None:
+      return
+
+    columns = self.pending()
+    if len(columns[-1]) != self.pending_count:
+      Logger.shared.warning('score history missing', self.pending_count, len(columns[-1]))
+      self.dropped_count += self.pending_count-len(columns[-1])
+    for (column, pending_column) in zip(self.columns, columns):
+      column[:0] = pending_column
+    Logger.shared.debug('score history decode', self.pending_count)
+    self.pending = None
+    self.pending_count = 0
+    self.trim()
+
+
+class ScoreRanking:
+  def __init__(self, size: int) -> None:
+    self.size = size
+
+    self.heap: list[tuple[int, float, int, Score]] = []
+    self.sorted_scores: list[Score] | None = []
+
+  def add(self, score: Score, order: int) -> None:
+    entry = (score.point, score.created_at.timestamp(), -order, score)
+    if len(self.heap) < self.size:
+      heapq.heappush(self.heap, entry)
+    elif entry[:3] > self.heap[0][:3]:
+      heapq.heapreplace(self.heap, entry)
+    else:
+      return
+    self.sorted_scores = None
+
+  def ranking(self, num: int, offset: int) -> list[Score]:
+    if self.sorted_scores is None:
+      self.sorted_scores = [entry[3] for entry in sorted(self.heap, key=lambda x: x[:3], reverse=True)]
+    return self.sorted_scores[offset:offset+num]
+
 
 class ScoreBoard:
-  def __init__(self) -> None:
-    self.scores: list[Score] = []
+  RANKING_ORDER = ['point DESC', 'created_at DESC']
+  HEADER_FORMAT = '<IIH'
+  RANKING_FORMAT = '<BBH'
+  SCORE_FORMAT = '<dBBI'
+  NO_KEY = 0xff
+
+  def __init__(self, ranking_size: int, retention: int, stage_ranking: bool) -> None:
+    self.ranking_size = ranking_size
+    self.retention = retention
+    self.stage_ranking = stage_ranking
+    self.store: SqliteSnapshotStore | None = None
+    self.folder = ''
+    self.saved_count = 0
+
+    self.clear()
+
+  def attach(self, store: SqliteSnapshotStore | None, folder: str) -> None:
+    self.store = store
+    self.folder = folder
+
+  def clear(self) -> None:
+    self.history = ScoreHistory(self.retention)
+    self.rankings: dict[tuple[int | None, int | None], ScoreRanking] = {}
+    self.ranked = True
+    self.embedded = False
 
-  def ranking(self, num: int) -> list[Score]:
-    return sorted(self.scores, key=lambda x: (x.point, x.created_at), reverse=True)[:num]
+  @property
+  def count(self) -> int:
+    return self.history.count
+
+  def add(self, score: Score) -> None:
+    order = self.history.count
+    self.history.append(score)
+
+    keys: list[tuple[int | None, int | None]] = [(None, None), (score.level.mode, None)]
+    if self.stage_ranking:
+      keys.append((score.level.mode, score.level.stage))
+    for key in keys:
+      if key not in self.rankings:
+        self.rankings[key] = ScoreRanking(self.ranking_size)
+      self.rankings[key].add(score, order)
+
+  def scores(self, start: int) -> list[Score]:
+    return self.history.scores(start)
+
+  def encoder(self, history: bool) -> Callable[[], bytes]:
+    count = self.count
+    rankings = [(key, ranking.ranking(self.ranking_size, 0)) for (key, ranking) in self.rankings.items()]
+    (history_count, history_data) = (len(self.history), self.history.to_bytes()) if history else (0, b'')
+    return lambda: self.pack(count, rankings, history_count, history_data)
+
+  @classmethod
+  def pack(
+    cls,
+    count: int,
+    rankings: list[tuple[tuple[int | None, int | None], list[Score]]],
+    history_count: int,
+    history_data: bytes,
+  ) -> bytes:
+    data = [struct.pack(cls.HEADER_FORMAT, count, history_count, len(rankings))]
+    for ((mode, stage), scores) in rankings:
+      data.append(struct.pack(
+        cls.RANKING_FORMAT,
+        mode if mode is not None else cls.NO_KEY,
+        stage if stage is not None else cls.NO_KEY,
+        len(scores),
+      ))
+      for score in scores:
+        data.append(struct.pack(cls.SCORE_FORMAT, score.created_at.timestamp(), score.level.mode, score.level.stage, score.point))
+    data.append(history_data)
+    return b''.join(data)
+
+  def from_bytes(self, data: memoryview, seq: int) -> None:
+    self.clear()
+
+    (count, history_count, ranking_count) = struct.unpack_from(self.HEADER_FORMAT, data)
+    offset = struct.calcsize(self.HEADER_FORMAT)
+    for _ in range(ranking_count):
+      (mode, stage, score_count) = struct.unpack_from(self.RANKING_FORMAT, data, offset)
+      offset += struct.calcsize(self.RANKING_FORMAT)
+
+      ranking = ScoreRanking(self.ranking_size)
+      for (index, (created_at, score_mode, score_stage, point)) in enumerate(
+        struct.iter_unpack(self.SCORE_FORMAT, data[offset:offset+score_count*struct.calcsize(self.SCORE_FORMAT)])
+      ):
+        ranking.add(Score(datetime.fromtimestamp(created_at), GameLevel(score_mode, score_stage), point), index-score_count)
+      offset += score_count*struct.calcsize(self.SCORE_FORMAT)
+      self.rankings[(mode if mode != self.NO_KEY else None, stage if stage != self.NO_KEY else None)] = ranking
+    self.ranked = ranking_count > 0 or count == 0
+
+    if history_count > 0:
+      self.history.from_bytes(data[offset:], history_count, count-history_count)
+      self.embedded = True
+    else:
+      pending_count = min(count, self.retention, seq)
+      self.history.load(lambda: self.history_columns(seq-pending_count, seq), pending_count, count-pending_count)
+
+  def history_columns(self, start: int, end: int) -> list[array]:
+    history = ScoreHistory(self.retention)
+    for record in SnapshotWriter.shared.records(self.folder, start, end):
+      history.append(Score.from_json(record))
+    return history.columns
+
+  def ranking(self, num: int, mode: int | None = None, stage: int | None = None, page: int = 0) -> list[Score]:
+    if self.store is None or (self.ranked and (page+1)*num <= self.ranking_size):
+      ranking = self.rankings.get((mode, stage))
+      return ranking.ranking(num, page*num) if ranking is not None else []
+
+    scores = [
+      Score.from_json(record)
+      for record in self.store.select(self.folder, self.where(mode, stage), self.RANKING_ORDER, (page+1)*num, 0, self.saved_count)
+    ]
+    scores.extend(self.unsaved(mode, stage))
+    scores.sort(key=lambda score: (score.point, score.created_at), reverse=True)
+    return scores[page*num:(page+1)*num]
+
+  def ranking_count(self, mode: int | None = None, stage: int | None = None) -> int:
+    if self.store is not None:
+      return self.store.count(self.folder, self.where(mode, stage), self.saved_count)+len(self.unsaved(mode, stage))
+
+    ranking = self.rankings.get((mode, stage))
+    return len(ranking.heap) if ranking is not None else 0
+
+  def unsaved(self, mode: int | None, stage: int | None) -> list[Score]:
+    return [
+      score for score in self.history.scores(self.saved_count)
+      if (mode is None or score.level.mode == mode) and (stage is None or score.level.stage == stage)
+    ]
+
+  @classmethod
+  def where(cls, mode: int | None, stage: int | None) -> dict[str, int]:
+    where: dict[str, int] = {}
+    if mode is not None:
+      where['level'] = mode
+    if stage is not None:
+      where['stage'] = stage
+    return where
 
 
 class Field(BaseField):
@@ -156,6 +431,7 @@ class Jumper(FlashSprite):
 
   FLASH_MSEC = 100
   MAX_FLASH_COUNT = 4
+  STATE_FORMAT = FlashSprite.STATE_FORMAT+'BB??ddddd?HH'
 
   class Param:
     def __init__(
@@ -219,6 +495,42 @@ class Jumper(FlashSprite):
     self.joy_count = 0
     self.walk_interval = 0
 
+  def state(self) -> tuple:
+    return (
+      *super().state(),
+      self.action,
+      self.life,
+      self.damaging,
+      self.start_damage,
+      self.walk_x,
+      self.accel,
+      self.now_accel,
+      self.top_y,
+      self.prev_y,
+      self.keep_jump,
+      self.joy_count,
+      self.walk_interval,
+    )
+
+  def restore(self, state: tuple, index: int) -> int:
+    index = super().restore(state, index)
+    (
+      action,
+      self.life,
+      self.damaging,
+      self.start_damage,
+      self.walk_x,
+      self.accel,
+      self.now_accel,
+      self.top_y,
+      self.prev_y,
+      self.keep_jump,
+      self.joy_count,
+      self.walk_interval,
+    ) = state[index:index+12]
+    self.action = self.Action(action)
+    return index+12
+
   @property
   def stopping(self) -> bool:
     return self.action == self.Action.STOP
@@ -251,7 +563,7 @@ class Jumper(FlashSprite):
     return self.action == self.Action.JOY
 
   def stop(self) -> None:
-    print('jumper stop', self.id)
+    Logger.shared.debug('jumper stop', self.id)
     if self.action == self.Action.JUMP:
       self.keep_jump = False
     else:
@@ -260,14 +572,14 @@ class Jumper(FlashSprite):
 
   def walk(self, x: float) -> None:
     if self.stopping:
-      print('jumper walk', self.id, x)
+      Logger.shared.debug('jumper walk', self.id, x)
       self.action = self.Action.WALK
       self.clear(True)
       self.walk_x = x
 
   def stand_by(self) -> None:
     if self.stopping:
-      print('jumper stand by', self.id)
+      Logger.shared.debug('jumper stand by', self.id)
       self.action = self.Action.STAND_BY
       self.clear(True)
 
@@ -275,12 +587,12 @@ class Jumper(FlashSprite):
   def fuzzy_accel(self) -> int:
     accel = int(self.param.max_accel/2)
     accel += Dice.spin(abs(accel)) * (1 if self.param.max_accel >= 0 else -1)
-    print('jump accel', accel, self.param.max_accel)
+    Logger.shared.debug('jump accel', accel, self.param.max_accel)
     return accel
 
   def jump(self) -> None:
     if self.standing_by:
-      print('jumper jump', self.id, self.param.max_accel)
+      Logger.shared.debug('jumper jump', self.id, self.param.max_accel)
       self.action = self.Action.JUMP
       self.clear(False)
       self.accel = self.param.max_accel
@@ -292,19 +604,19 @@ class Jumper(FlashSprite):
     if self.standing_by or self.jumping(None):
       self.life -= 1
       if self.life <= 0:
-        print('jumper fall down', self.id, self.life)
+        Logger.shared.debug('jumper fall down', self.id, self.life)
         self.life = 0
         self.action = self.Action.FALL_DOWN
         self.clear(True)
       else:
-        print('jumper damage', self.id, self.life)
+        Logger.shared.debug('jumper damage', self.id, self.life)
         self.damaging = True
         self.flash()
         self.start_damage = True
 
   def joy(self) -> None:
     if self.stopping:
-      print('jumper joy', self.id)
+      Logger.shared.debug('jumper joy', self.id)
       self.action = self.Action.JOY
       self.clear(True)
       self.accel = self.fuzzy_accel
@@ -334,10 +646,10 @@ class Jumper(FlashSprite):
         if diff > 0:
           distance *= -1
 
-      self.origin = Coordinate(self.origin.x+distance, self.origin.y)
+      self.place_origin(self.origin.x+distance, self.origin.y)
 
       if self.origin.x == self.walk_x:
-        print('jumper walk to stop', self.id)
+        Logger.shared.debug('jumper walk to stop', self.id)
         self.action = self.Action.STOP
         self.clear(True)
 
@@ -372,7 +684,7 @@ class Jumper(FlashSprite):
         if new_y > max_y:
           new_y = max_y
 
-        self.center = Coordinate(self.center.x, new_y)
+        self.place(self.center.x, new_y)
         self.prev_y = center_y
 
         self.motion = self.Motion.JUMP_UP if new_y < center_y else self.Motion.JUMP_DOWN
@@ -388,7 +700,7 @@ class Jumper(FlashSprite):
         else:
           self.top_y = self.center.y
       else:
-        print('jumper jump to stand by', self.id)
+        Logger.shared.debug('jumper jump to stand by', self.id)
         self.action = self.Action.STAND_BY
         self.clear(False)
 
@@ -405,17 +717,17 @@ class Jumper(FlashSprite):
           snapshot.music_box.play_se(self.Sound.JOY)
 
         center_y = self.center.y
-        self.center.y += (self.center.y - self.prev_y) + self.accel
+        self.place(self.center.x, center_y + (center_y - self.prev_y) + self.accel)
         self.prev_y = center_y
         self.accel = 1
       else:
         self.joy_count += 1
         if self.joy_count >= self.param.joy_repeat_count:
-          print('jumper joy to stop', self.id, self.joy_count, self.param.joy_repeat_count)
+          Logger.shared.debug('jumper joy to stop', self.id, self.joy_count, self.param.joy_repeat_count)
           self.action = self.Action.STOP
           self.clear(True)
         else:
-          print('jumper joy again', self.id, self.joy_count, self.param.joy_repeat_count)
+          Logger.shared.debug('jumper joy again', self.id, self.joy_count, self.param.joy_repeat_count)
           self.accel = self.fuzzy_accel
           self.now_accel = self.accel
           self.prev_y = self.center.y
@@ -444,6 +756,8 @@ class Ball(FlashSprite):
   MAX_FLASH_COUNT = 4
 
   class Param:
+    STATE_FORMAT = 'didHHH'
+
     def __init__(
       self,
       spin_distance: float,
@@ -458,6 +772,33 @@ class Ball(FlashSprite):
       self.spin_period = spin_period
       self.max_points = max_points
 
+    def state(self) -> tuple:
+      return (
+        self.spin_distance,
+        self.max_accel,
+        self.first_y,
+        self.spin_period,
+        self.max_points.get(Ball.Action.SPIN, 0),
+        self.max_points.get(Ball.Action.BURST, 0),
+      )
+
+    @classmethod
+    def from_state(cls, state: tuple, index: int) -> tuple['Ball.Param', int]:
+      (spin_distance, max_accel, first_y, spin_period, spin_point, burst_point) = state[index:index+6]
+      param = Ball.Param(
+        spin_distance=spin_distance,
+        max_accel=max_accel,
+        first_y=first_y,
+        spin_period=spin_period,
+        max_points={
+          Ball.Action.SPIN: spin_point,
+          Ball.Action.BURST: burst_point,
+        },
+      )
+      return (param, index+6)
+
+  STATE_FORMAT = FlashSprite.STATE_FORMAT+Param.STATE_FORMAT+'B?'+Timer.STATE_FORMAT+'????dddH?'
+
   def __init__(
     self,
     name: str,
@@ -503,39 +844,79 @@ class Ball(FlashSprite):
 
   def stop(self) -> None:
     if self.spinning:
-      print('ball stop', self.id)
+      Logger.shared.debug('ball stop', self.id)
       self.action = self.Action.STOP
 
   def spin(self) -> None:
     if self.stopping:
-      print('ball spin', self.id)
+      Logger.shared.debug('ball spin', self.id)
       self.action = self.Action.SPIN
       self.spun_timer = None
       if self.param.max_accel != 0:
-        print('ball leap', self.id, self.param.max_accel)
+        Logger.shared.debug('ball leap', self.id, self.param.max_accel)
         self.accel = 1
         self.now_accel = self.param.max_accel
-        self.origin = Coordinate(self.origin.x, self.origin.y-self.param.first_y)
+        self.place_origin(self.origin.x, self.origin.y-self.param.first_y)
         self.prev_y = self.origin.y
       self.points = self.param.max_points
       self.start_spin = True
 
+  def state(self) -> tuple:
+    spun_timer = self.spun_timer if self.spun_timer is not None else Timer(self.stopwatch)
+    return (
+      *super().state(),
+      *self.param.state(),
+      self.action,
+      self.spun_timer is not None,
+      *spun_timer.state(),
+      self.points is self.param.max_points,
+      self.dead,
+      self.spin_direction,
+      self.start_spin,
+      self.accel,
+      self.now_accel,
+      self.prev_y,
+      self.spin_interval,
+      self.bounced,
+    )
+
+  def restore(self, state: tuple, index: int) -> int:
+    (self.param, index) = self.Param.from_state(state, super().restore(state, index))
+    (action, spun) = state[index:index+2]
+    self.action = self.Action(action)
+    spun_timer = Timer(self.stopwatch)
+    index = spun_timer.restore(state, index+2)
+    self.spun_timer = spun_timer if spun else None
+    (
+      scoring,
+      self.dead,
+      self.spin_direction,
+      self.start_spin,
+      self.accel,
+      self.now_accel,
+      self.prev_y,
+      self.spin_interval,
+      self.bounced,
+    ) = state[index:index+9]
+    self.points = self.param.max_points if scoring else {}
+    return index+9
+
   def spin_after_msec(self, stopwatch: Stopwatch, spun_msec: int) -> None:
     if self.stopping:
       if spun_msec > 0:
-        print('ball spin wait', self.id, spun_msec)
+        Logger.shared.debug('ball spin wait', self.id, spun_msec)
         self.spun_timer = Timer.set_msec(stopwatch, spun_msec, True)
       else:
         self.spin()
 
   def burst(self) -> None:
     if self.spinning:
-      print('ball burst', self.id)
+      Logger.shared.debug('ball burst', self.id)
       self.action = self.Action.BURST
       self.flash()
 
   def through(self) -> None:
-    print('ball through', self.id)
+    Logger.shared.debug('ball through', self.id)
     self.points = {}
 
   @property
@@ -566,7 +947,7 @@ class Ball(FlashSprite):
             new_x = left_end
             self.spin_direction = True
             self.bounced = True
-            print('ball spin direction', self.id, self.spin_direction, new_x)
+            Logger.shared.debug('ball spin direction', self.id, self.spin_direction, new_x)
             snapshot.music_box.play_se(self.sounds[self.Sound.BOUNCE])
       else:
         right_end = snapshot.field.right_end(self.origin)
@@ -576,7 +957,7 @@ class Ball(FlashSprite):
             new_x = right_end
             self.spin_direction = False
             self.bounced = True
-            print('ball spin direction', self.id, self.spin_direction, new_x)
+            Logger.shared.debug('ball spin direction', self.id, self.spin_direction, new_x)
             snapshot.music_box.play_se(self.sounds[self.Sound.BOUNCE])
 
       new_y = self.origin.y
@@ -599,12 +980,12 @@ class Ball(FlashSprite):
           self.prev_y = origin_y
           self.accel = 1
         else:
-          print('ball leap to next', self.id)
+          Logger.shared.debug('ball leap to next', self.id)
           self.accel = self.param.max_accel
           self.now_accel = self.accel
           self.prev_y = self.origin.y
 
-      self.origin = Coordinate(new_x, new_y)
+      self.place_origin(new_x, new_y)
 
       if self.spin_interval < self.param.spin_period:
         self.spin_interval += 1
@@ -629,7 +1010,144 @@ class Ball(FlashSprite):
         self.show = False
 
 
+class CollisionGroup(IntEnum):
+  BALL = 0
+  JUMPER = 1
+
+
+class BallPhysics(Variation):
+  # measured crossover; current stages spin at most a few balls, so play stays on the scalar path
+  MIN_BATCH_COUNT = 128
+
+  def __init__(self, min_batch_count: int) -> None:
+    self.min_batch_count = min_batch_count
+
+  def can_batch(self, count: int) -> bool:
+    return numpy_import and count > 0 and count >= self.min_batch_count
+
+  def load(self, balls: list[Ball]) -> None:
+    self.width = np.array([ball.size.width for ball in balls], dtype=np.float64)
+    self.height = np.array([ball.size.height for ball in balls], dtype=np.float64)
+    self.center_x = np.array([ball.center.x for ball in balls], dtype=np.float64)
+    self.center_y = np.array([ball.center.y for ball in balls], dtype=np.float64)
+    self.prev_y = np.array([ball.prev_y for ball in balls], dtype=np.float64)
+    self.accel = np.array([ball.accel for ball in balls], dtype=np.float64)
+    self.now_accel = np.array([ball.now_accel for ball in balls], dtype=np.float64)
+    self.max_accel = np.array([ball.param.max_accel for ball in balls], dtype=np.float64)
+    self.spin_distance = np.array([ball.param.spin_distance for ball in balls], dtype=np.float64)
+    self.spin_direction = np.array([ball.spin_direction for ball in balls], dtype=np.bool_)
+    self.spin_interval = np.array([ball.spin_interval for ball in balls], dtype=np.int64)
+    self.spin_period = np.array([ball.param.spin_period for ball in balls], dtype=np.int64)
+    self.motion = np.array([ball.motion for ball in balls], dtype=np.int64)
+
+  def step(self, field: Field) -> None:
+    origin_x = self.center_x-self.width/2
+    origin_y = self.center_y-self.height/2
+
+    new_x = origin_x+self.spin_distance*np.where(self.spin_direction, 1.0, -1.0)
+
+    left_end = np.full(len(new_x), np.inf)
+    right_end = np.full(len(new_x), -np.inf)
+    for obstacle in field.obstacles:
+      inside = (obstacle.collision.top-field.scroll_pos.y <= origin_y) & (origin_y <= obstacle.collision.bottom-field.scroll_pos.y)
+      right = obstacle.collision.right-field.scroll_pos.x
+      left = obstacle.collision.left-field.scroll_pos.x
+      left_end = np.where(inside & (right <= origin_x), np.minimum(left_end, right), left_end)
+      right_end = np.where(inside & (origin_x <= left), np.maximum(right_end, left), right_end)
+    right_end = right_end-self.width
+
+    bounce_left = ~self.spin_direction & (left_end != np.inf) & (new_x <= left_end)
+    bounce_right = self.spin_direction & (right_end != -np.inf) & (new_x >= right_end)
+    new_x = np.where(bounce_left, left_end, np.where(bounce_right, right_end, new_x))
+    self.bounced = bounce_left | bounce_right
+    self.spin_direction = np.where(bounce_left, True, np.where(bounce_right, False, self.spin_direction))
+
+    leap = self.accel != 0
+    fly = leap & ((origin_y+self.height < field.bottom) | (self.accel == self.now_accel))
+    land = leap & ~fly
+    self.leaped = fly & (self.accel == self.now_accel)
+    self.landed = land
+
+    min_y = field.top+self.height
+    max_y = field.bottom-self.height
+    fly_y = origin_y+(origin_y-self.prev_y)+self.accel
+    fly_y = np.where(fly_y < min_y, min_y, fly_y)
+    fly_y = np.where(fly_y > max_y, max_y, fly_y)
+    new_y = np.where(fly, fly_y, origin_y)
+
+    self.prev_y = np.where(leap, origin_y, self.prev_y)
+    self.accel = np.where(fly, 1.0, np.where(land, self.max_accel, self.accel))
+    self.now_accel = np.where(land, self.accel, self.now_accel)
+
+    self.center_x = new_x+self.width/2
+    self.center_y = new_y+self.height/2
+
+    rotate = self.spin_interval >= self.spin_period
+    self.spin_interval = np.where(rotate, 0, self.spin_interval+1)
+    forward = self.motion+1
+    forward = np.where(forward > Ball.Motion.ANGLE_270, Ball.Motion.ANGLE_0, forward)
+    backward = self.motion-1
+    backward = np.where(backward < Ball.Motion.ANGLE_0, Ball.Motion.ANGLE_270, backward)
+    self.motion = np.where(rotate, np.where(self.spin_direction, forward, backward), self.motion)
+
+  def update(self, stopwatch: Stopwatch, snapshot: TSnapshot) -> None:
+    balls = [ball for ball in snapshot.balls if ball.spinning]
+    if not self.can_batch(len(balls)):
+      for ball in snapshot.balls:
+        ball.update(stopwatch, snapshot)
+      return
+
+    self.load(balls)
+    self.step(snapshot.field)
+
+    bounced = self.bounced.tolist()
+    spin_direction = self.spin_direction.tolist()
+    leaped = self.leaped.tolist()
+    landed = self.landed.tolist()
+    center_x = self.center_x.tolist()
+    center_y = self.center_y.tolist()
+    prev_y = self.prev_y.tolist()
+    accel = self.accel.tolist()
+    now_accel = self.now_accel.tolist()
+    spin_interval = self.spin_interval.tolist()
+    motion = self.motion.tolist()
+
+    index = 0
+    for ball in snapshot.balls:
+      if not ball.spinning:
+        ball.update(stopwatch, snapshot)
+        continue
+
+      FlashSprite.update(ball, stopwatch, snapshot)
+      ball.bounced = bounced[index]
+
+      if ball.start_spin:
+        snapshot.music_box.play_se(ball.sounds[Ball.Sound.SPIN])
+        ball.start_spin = False
+
+      ball.spin_direction = spin_direction[index]
+      if ball.bounced:
+        Logger.shared.debug('ball spin direction', ball.id, ball.spin_direction, center_x[index]-ball.size.width/2)
+        snapshot.music_box.play_se(ball.sounds[Ball.Sound.BOUNCE])
+
+      if leaped[index]:
+        snapshot.music_box.play_se(ball.sounds[Ball.Sound.LEAP])
+      if landed[index]:
+        Logger.shared.debug('ball leap to next', ball.id)
+
+      ball.place(center_x[index], center_y[index])
+      ball.prev_y = prev_y[index]
+      ball.accel = accel[index]
+      ball.now_accel = now_accel[index]
+      ball.spin_interval = spin_interval[index]
+      ball.motion = motion[index]
+
+      index += 1
+
+
 class Snapshot(BaseSnapshot):
+  PAYLOAD_FORMAT = '<B'
+
   def __init__(
     self,
     lang: Language,
@@ -651,30 +1169,73 @@ class Snapshot(BaseSnapshot):
     self.field = field
     self.balls = balls
     self.jumper = jumper
+    self.ball_physics = BallPhysics(BallPhysics.MIN_BATCH_COUNT)
+    self.collision_index = CollisionIndex()
+
+  @classmethod
+  def sqlite_store(cls) -> SqliteSnapshotStore:
+    return SqliteSnapshotStore(
+      table='score',
+      columns={
+        'created_at': 'REAL',
+        'level': 'INTEGER',
+        'stage': 'INTEGER',
+        'point': 'INTEGER',
+      },
+      indexes=[
+        ['level', 'point DESC', 'created_at DESC'],
+        ['level', 'stage', 'point DESC', 'created_at DESC'],
+        ['point DESC', 'created_at DESC'],
+        ['created_at'],
+      ],
+      legacy_store=cls.file_store(),
+    )
+
+  def load(self, path: Path) -> None:
+    store = SnapshotWriter.shared.store
+    self.score_board.attach(store if isinstance(store, SqliteSnapshotStore) else None, self.folder(path))
+    super().load(path)
+    self.score_board.saved_count = self.journal_count
+
+  def saved(self, end: int) -> None:
+    super().saved(end)
+    self.score_board.saved_count = end
 
   def to_json(self) -> dict:
     return {
-      'score_board': [{
-        'created_at': score.created_at.timestamp(),
-        'level': score.level.mode,
-        'stage': score.level.stage,
-        'point': score.point,
-      } for score in self.score_board.scores],
       'level': self.level.mode,
+      'score_board': [score.to_json() for score in self.score_board.scores(0)],
     }
 
   def from_json(self, data: dict) -> None:
     if 'score_board' in data:
-      scores = []
+      self.score_board.clear()
       for score in data['score_board']:
-        scores.append(
-          Score(
-            datetime.fromtimestamp(score['created_at']),
-            GameLevel(score['level'], score['stage']),
-            score['point'],
-          )
-        )
-      self.score_board.scores = scores
+        self.score_board.add(Score.from_json(score))
+      self.score_board.embedded = len(data['score_board']) > 0
 
     if 'level' in data:
       self.level = GameLevel(int(data['level']), self.level.stage)
+
+  def encoder(self, history: bool) -> Callable[[], bytes]:
+    mode = self.level.mode
+    encode = self.score_board.encoder(history)
+    return lambda: struct.pack(self.PAYLOAD_FORMAT, mode)+encode()
+
+  def from_bytes(self, data: memoryview, seq: int) -> None:
+    (mode,) = struct.unpack_from(self.PAYLOAD_FORMAT, data)
+    self.level = GameLevel(mode, self.level.stage)
+    self.score_board.from_bytes(data[struct.calcsize(self.PAYLOAD_FORMAT):], seq)
+
+  def journal(self, start: int) -> list[dict]:
+    return [score.to_json() for score in self.score_board.scores(start)]
+
+  def journal_end(self) -> int:
+    return self.score_board.count
+
+  def from_journal(self, records: list[dict]) -> None:
+    for record in records:
+      self.score_board.add(Score.from_json(record))
+
+  def journaled(self) -> bool:
+    return not self.score_board.embedded
@@ -1,4 +1,8 @@
+from .logger import *
 from .utils import *
+from .font import *
+from .platform import *
+from .profiler import *
 from .asset import *
 from .component import *
 from .scene import *
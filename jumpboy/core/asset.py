@@ -1,8 +1,13 @@
+from array import array
 from enum import IntEnum, StrEnum
-from core import Coordinate, Size, Path
+from typing import Sequence
+from core import Logger, Coordinate, Size, Path, Platform
+from queue import Queue
 import json
 import os
-import pyxel
+import struct
+import threading
+import zlib
 
 
 class Language(StrEnum):
@@ -42,27 +47,24 @@ class AssetImage:
     self.scale = scale
     self.pose = pose
 
+    basic_size = self.basic_size()
+    self.origin = Coordinate(address.x*basic_size.width, address.y*basic_size.height)
+    self.size = Size(scale.width*basic_size.width, scale.height*basic_size.height)
+    self.copy_vector = self.mirror(self.size, pose)
+
   @classmethod
   def basic_size(cls) -> Size:
     return Size(8, 8)
 
-  @property
-  def origin(self) -> Coordinate:
-    return Coordinate(self.address.x*self.basic_size().width, self.address.y*self.basic_size().height)
-
-  @property
-  def size(self) -> Size:
-    return Size(self.scale.width*self.basic_size().width, self.scale.height*self.basic_size().height)
-
-  @property
-  def copy_vector(self) -> Size:
-    if self.pose == self.Pose.MIRROR_X:
-      return Size(self.size.width*-1, self.size.height)
-    elif self.pose == self.Pose.MIRROR_Y:
-      return Size(self.size.width, self.size.height*-1)
-    elif self.pose == self.Pose.MIRROR_XY:
-      return Size(self.size.width*-1, self.size.height*-1)
-    return self.size
+  @classmethod
+  def mirror(cls, size: Size, pose: Pose) -> Size:
+    if pose == cls.Pose.MIRROR_X:
+      return Size(size.width*-1, size.height)
+    elif pose == cls.Pose.MIRROR_Y:
+      return Size(size.width, size.height*-1)
+    elif pose == cls.Pose.MIRROR_XY:
+      return Size(size.width*-1, size.height*-1)
+    return size
 
 
 class Image(AssetImage):
@@ -90,8 +92,8 @@ class SoundEffect(AssetSound):
     self.id = id
 
   def play(self) -> None:
-    pyxel.play(self.channel, self.id, resume=True)
-    print('sound effect play', self.id, self.channel)
+    Platform.shared.play(self.channel, self.id, loop=False, resume=True)
+    Logger.shared.debug('sound effect play', self.id, self.channel)
 
 
 class AssetBgm(AssetSound):
@@ -102,8 +104,8 @@ class AssetBgm(AssetSound):
 
   def stop(self) -> None:
     for channel in self.channels:
-      pyxel.stop(channel)
-    print('bgm stop', self.channels)
+      Platform.shared.stop(channel)
+    Logger.shared.debug('bgm stop', self.channels)
 
 
 class Bgm(AssetBgm):
@@ -122,9 +124,86 @@ class Bgm(AssetBgm):
     self.channels = param.channels
 
   def play(self) -> None:
-    if len(self.channels) > 0 and pyxel.play_pos(self.channels[0]) is None:
-      pyxel.playm(self.id, loop=True)
-      print('bgm play', self.name, self.channels)
+    if len(self.channels) > 0 and Platform.shared.play_pos(self.channels[0]) is None:
+      Platform.shared.playm(self.id, loop=True)
+      Logger.shared.debug('bgm play', self.name, self.channels)
+
+
+class BgmTrack:
+  EXTENSION = '.jbm'
+  MAGIC = b'JBBM'
+  VERSION = 2
+  HEADER_FORMAT = '<4sBBBx'
+  CHANNEL_FORMAT = '<HHHHH'
+  FLAG_COMPRESSED = 1
+
+  class Channel:
+    def __init__(self, notes: Sequence[int], tones: Sequence[int], volumes: Sequence[int], effects: Sequence[int], speed: int) -> None:
+      self.notes = notes
+      self.tones = tones
+      self.volumes = volumes
+      self.effects = effects
+      self.speed = speed
+
+  def __init__(self, channels: list[Channel], sounds: list[tuple[str, str, str, str, int]]) -> None:
+    self.channels = channels
+    self.sounds = sounds
+
+  @property
+  def channel_count(self) -> int:
+    return len(self.channels) if len(self.channels) > 0 else len(self.sounds)
+
+  def set_sound(self, id: int, channel: int) -> None:
+    if len(self.channels) > 0:
+      data = self.channels[channel]
+      Platform.shared.set_sound_data(id, data.notes, data.tones, data.volumes, data.effects, data.speed)
+    else:
+      Platform.shared.set_sound(id, *self.sounds[channel])
+
+  @classmethod
+  def encode(cls, channels: list[Channel], compress: bool) -> bytes:
+    body = bytearray()
+    for channel in channels:
+      body += struct.pack(
+        cls.CHANNEL_FORMAT,
+        len(channel.notes),
+        len(channel.tones),
+        len(channel.volumes),
+        len(channel.effects),
+        channel.speed,
+      )
+      body += array('b', channel.notes).tobytes()+bytes(channel.tones)+bytes(channel.volumes)+bytes(channel.effects)
+
+    flags = cls.FLAG_COMPRESSED if compress else 0
+    header = struct.pack(cls.HEADER_FORMAT, cls.MAGIC, cls.VERSION, flags, len(channels))
+    return header+(zlib.compress(bytes(body), 9) if compress else bytes(body))
+
+  @classmethod
+  def decode(cls, data: bytes) -> 'BgmTrack':
+    (magic, version, flags, channel_count) = struct.unpack_from(cls.HEADER_FORMAT, data)
+    if magic != cls.MAGIC or version != cls.VERSION:
+      raise RuntimeError('invalid bgm track')
+
+    body = data[struct.calcsize(cls.HEADER_FORMAT):]
+    if flags & cls.FLAG_COMPRESSED:
+      body = zlib.decompress(body)
+
+    channels: list[BgmTrack.Channel] = []
+    offset = 0
+    for _ in range(channel_count):
+      (note_count, tone_count, volume_count, effect_count, speed) = struct.unpack_from(cls.CHANNEL_FORMAT, body, offset)
+      offset += struct.calcsize(cls.CHANNEL_FORMAT)
+      notes = array('b', body[offset:offset+note_count])
+      offset += note_count
+      tones = body[offset:offset+tone_count]
+      offset += tone_count
+      volumes = body[offset:offset+volume_count]
+      offset += volume_count
+      effects = body[offset:offset+effect_count]
+      offset += effect_count
+      channels.append(BgmTrack.Channel(notes, tones, volumes, effects, speed))
+
+    return BgmTrack(channels, [])
 
 
 class RawBgm(AssetBgm):
@@ -145,33 +224,108 @@ class RawBgm(AssetBgm):
   def setup_name(cls, filename: str) -> str:
     return 'raw_bgm_{}'.format(filename)
 
-  def __init__(self, filename: str, param: Param) -> None:
+  def __init__(self, filename: str, bank: 'RawBgmBank') -> None:
     super().__init__(RawBgm.setup_name(filename))
 
-    self.bgm_raw_data: dict = {}
-
-    file_path = os.path.join(param.path.asset_path, param.folder, '{}.json'.format(filename))
-    with open(file_path, mode='r') as f:
-      self.bgm_raw_data = json.loads(f.read())
-    print('raw bgm loaded', filename)
-
-    self.start_id = param.start_id
-    self.exclude_play_channels = param.exclude_play_channels
+    self.filename = filename
+    self.bank = bank
 
   def play(self) -> None:
     if len(self.channels) == 0:
-      for (channel, sound) in enumerate(self.bgm_raw_data):
-        if channel in self.exclude_play_channels:
-          continue
-
-        id = self.start_id+channel
-
-        pyxel.sounds[id].set(*sound)
-        pyxel.play(channel, id, loop=True, resume=True)
-
-        self.channels.append(channel)
-      print('raw bgm play', self.name, self.channels)
+      self.channels = self.bank.load(self.filename)
+      for channel in self.channels:
+        Platform.shared.play(channel, self.bank.param.start_id+channel, loop=True, resume=True)
+      Logger.shared.debug('raw bgm play', self.name, self.channels)
 
   def stop(self) -> None:
     super().stop()
     self.channels = []
+
+
+class RawBgmBank:
+  def __init__(self, param: RawBgm.Param) -> None:
+    self.param = param
+
+    self.tracks: dict[str, BgmTrack] = {}
+    self.pending: set[str] = set()
+    self.condition = threading.Condition()
+    self.requests: Queue[str] = Queue()
+    self.worker: threading.Thread | None = None
+    self.worker_enabled = True
+    self.loaded_filename: str | None = None
+
+  def parse(self, filename: str) -> BgmTrack:
+    track_path = os.path.join(self.param.path.asset_path, self.param.folder, filename+BgmTrack.EXTENSION)
+    if os.path.exists(track_path):
+      with open(track_path, mode='rb') as f:
+        track = BgmTrack.decode(f.read())
+    else:
+      file_path = os.path.join(self.param.path.asset_path, self.param.folder, '{}.json'.format(filename))
+      with open(file_path, mode='r') as f:
+        track = BgmTrack([], [tuple(sound) for sound in json.loads(f.read())])
+    Logger.shared.info('raw bgm loaded', filename)
+    return track
+
+  def track(self, filename: str) -> BgmTrack:
+    with self.condition:
+      while filename in self.pending:
+        self.condition.wait()
+      if filename in self.tracks:
+        return self.tracks[filename]
+      self.pending.add(filename)
+
+    try:
+      return self.store(filename)
+    finally:
+      self.settle(filename)
+
+  def store(self, filename: str) -> BgmTrack:
+    track = self.parse(filename)
+    with self.condition:
+      self.tracks[filename] = track
+    return track
+
+  def settle(self, filename: str) -> None:
+    with self.condition:
+      self.pending.discard(filename)
+      self.condition.notify_all()
+
+  def prefetch(self, filename: str) -> None:
+    with self.condition:
+      if filename in self.tracks or filename in self.pending:
+        return
+      self.pending.add(filename)
+
+    if self.worker is None and self.worker_enabled:
+      try:
+        self.worker = threading.Thread(target=self.fetch, daemon=True)
+        self.worker.start()
+      except RuntimeError:
+        self.worker = None
+        self.worker_enabled = False
+        Logger.shared.info('raw bgm prefetch disabled')
+
+    if self.worker is not None:
+      self.requests.put(filename)
+    else:
+      self.settle(filename)
+
+  def fetch(self) -> None:
+    while True:
+      filename = self.requests.get()
+      try:
+        self.store(filename)
+      except Exception as e:
+        Logger.shared.warning('raw bgm prefetch failed', filename, e)
+      finally:
+        self.settle(filename)
+
+  def load(self, filename: str) -> list[int]:
+    track = self.track(filename)
+    channels = [channel for channel in range(track.channel_count) if channel not in self.param.exclude_play_channels]
+    if self.loaded_filename != filename:
+      for channel in channels:
+        track.set_sound(self.param.start_id+channel, channel)
+      self.loaded_filename = filename
+      Logger.shared.debug('raw bgm set', filename, channels)
+    return channels
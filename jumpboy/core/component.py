@@ -1,11 +1,12 @@
-from typing import Any, Self, TypeVar
+from collections import OrderedDict
+from typing import Any, Iterator, Self
 from uuid import uuid4 as uuid
 from core import (
-  Coordinate, Size, Path, Stopwatch, Timer,
-  Image, TileMap, SoundEffect, AssetSound, AssetBgm, Bgm, RawBgm,
+  Logger, Coordinate, Size, Path, Stopwatch, Timer, GlyphAtlas,
+  Platform, Image, TileMap, SoundEffect, AssetSound, AssetBgm, Bgm, RawBgm, RawBgmBank,
 )
 import os
-import pyxel
+import struct
 
 
 class Variation:
@@ -39,22 +40,42 @@ class Collision:
   def bottom(self) -> float:
     return self.origin.y+self.size.height
 
-  def min(self, center: Coordinate) -> Coordinate:
-    return Coordinate(center.x-self.size.width/2+self.origin.x, center.y-self.size.height/2+self.origin.y)
-
-  def max(self, center: Coordinate) -> Coordinate:
-    return Coordinate(self.min(center).x+self.size.width, self.min(center).y+self.size.height)
+  def bounds(self, center: Coordinate) -> tuple[float, float, float, float]:
+    left = center.x-self.size.width/2+self.origin.x
+    top = center.y-self.size.height/2+self.origin.y
+    return (left, top, left+self.size.width, top+self.size.height)
 
   def hit(self, center: Coordinate, other: Self, other_center: Coordinate) -> bool:
-    if other.min(other_center).x <= self.min(center).x <= other.max(other_center).x:
-      if other.min(other_center).y <= self.min(center).y <= other.max(other_center).y:
-        return True
+    (left, top, right, bottom) = self.bounds(center)
+    (other_left, other_top, other_right, other_bottom) = other.bounds(other_center)
+    return left <= other_right and other_left <= right and top <= other_bottom and other_top <= bottom
 
-    if other.min(other_center).x <= self.max(center).x <= other.max(other_center).x:
-      if other.min(other_center).y <= self.max(center).y <= other.max(other_center).y:
-        return True
+  @classmethod
+  def time_of_impact(
+    cls,
+    start: tuple[float, float, float, float],
+    end: tuple[float, float, float, float],
+    other_start: tuple[float, float, float, float],
+    other_end: tuple[float, float, float, float],
+  ) -> float | None:
+    enter_time = 0.0
+    exit_time = 1.0
+    for axis in [0, 1]:
+      velocity = (end[axis]-start[axis])-(other_end[axis]-other_start[axis])
+      if velocity == 0:
+        if start[axis+2] < other_start[axis] or other_start[axis+2] < start[axis]:
+          return None
+      else:
+        enter = (other_start[axis]-start[axis+2])/velocity
+        exit = (other_start[axis+2]-start[axis])/velocity
+        if enter > exit:
+          (enter, exit) = (exit, enter)
+        enter_time = max(enter_time, enter)
+        exit_time = min(exit_time, exit)
+        if enter_time > exit_time:
+          return None
 
-    return False
+    return enter_time
 
 
 class Block:
@@ -63,9 +84,51 @@ class Block:
     self.collision = collision
 
 
-TSprite = TypeVar('TSprite', bound='Sprite')
+class Placement:
+  def __init__(self) -> None:
+    self.position = Coordinate(0, 0)
+    self.placed_origin = Coordinate(0, 0)
+    self.placed_size: Size | None = None
+
+  @property
+  def center(self) -> Coordinate:
+    return self.position
+
+  @center.setter
+  def center(self, value: Coordinate) -> None:
+    self.place(value.x, value.y)
+    self.snap()
+
+  def place(self, x: float, y: float) -> None:
+    self.position.x = x
+    self.position.y = y
+    self.placed_size = None
+
+  @property
+  def origin(self) -> Coordinate:
+    size = self.size
+    if self.placed_size is not size:
+      self.placed_origin.x = self.position.x-size.width/2
+      self.placed_origin.y = self.position.y-size.height/2
+      self.placed_size = size
+    return self.placed_origin
+
+  @origin.setter
+  def origin(self, value: Coordinate) -> None:
+    self.place_origin(value.x, value.y)
+    self.snap()
+
+  def place_origin(self, x: float, y: float) -> None:
+    size = self.size
+    self.place(x+size.width/2, y+size.height/2)
+
+  def snap(self) -> None:
+    pass
+
+
+class Sprite(Placement, Variation, Subject):
+  STATE_FORMAT = 'Bdd?dd'+Timer.STATE_FORMAT
 
-class Sprite(Variation, Subject):
   def __init__(
     self,
     name: str,
@@ -73,13 +136,18 @@ class Sprite(Variation, Subject):
     sounds: dict[int, int],
     stopwatch: Stopwatch,
   ) -> None:
+    super().__init__()
+
     self.id = '{}_{}'.format(name, str(uuid()))
     self.motions = motions
     self.sounds = sounds
+    self.stopwatch = stopwatch
     self.elapsed_timer = Timer(stopwatch)
 
     self.motion = list(self.motions.keys())[0]
-    self.center = Coordinate(0, 0)
+    self.prev_center: Coordinate | None = None
+    self.placed_bounds = (0.0, 0.0, 0.0, 0.0)
+    self.placed_collision: Collision | None = None
 
   @property
   def elapsed_msec(self) -> int:
@@ -87,21 +155,40 @@ class Sprite(Variation, Subject):
 
   def pause(self) -> None:
     self.elapsed_timer.pause()
+    self.snap()
 
   def resume(self) -> None:
     self.elapsed_timer.resume()
 
+  def state(self) -> tuple:
+    prev_center = self.prev_center if self.prev_center is not None else self.center
+    return (
+      self.motion,
+      self.center.x,
+      self.center.y,
+      self.prev_center is not None,
+      prev_center.x,
+      prev_center.y,
+      *self.elapsed_timer.state(),
+    )
+
+  def restore(self, state: tuple, index: int) -> int:
+    (motion, x, y, moved, prev_x, prev_y) = state[index:index+6]
+    self.motion = motion
+    self.place(x, y)
+    self.prev_center = Coordinate(prev_x, prev_y) if moved else None
+    return self.elapsed_timer.restore(state, index+6)
+
   @property
   def block(self) -> Block:
     return self.motions[self.motion]
 
-  @property
-  def origin(self) -> Coordinate:
-    return Coordinate(self.center.x-self.block.collision.size.width/2, self.center.y-self.block.collision.size.height/2)
+  def place(self, x: float, y: float) -> None:
+    super().place(x, y)
+    self.placed_collision = None
 
-  @origin.setter
-  def origin(self, value: Coordinate) -> None:
-    self.center = Coordinate(value.x+self.size.width/2, value.y+self.size.height/2)
+  def snap(self) -> None:
+    self.prev_center = None
 
   @property
   def size(self) -> Size:
@@ -113,7 +200,7 @@ class Sprite(Variation, Subject):
 
   @property
   def right(self) -> float:
-    return self.left+self.size.width
+    return self.origin.x+self.size.width
 
   @property
   def top(self) -> float:
@@ -121,25 +208,161 @@ class Sprite(Variation, Subject):
 
   @property
   def bottom(self) -> float:
-    return self.top+self.size.height
+    return self.origin.y+self.size.height
+
+  @property
+  def draw_center(self) -> Coordinate:
+    if self.prev_center is None or self.stopwatch.interpolation >= 1:
+      return self.center
+    return Coordinate(
+      self.prev_center.x+(self.center.x-self.prev_center.x)*self.stopwatch.interpolation,
+      self.prev_center.y+(self.center.y-self.prev_center.y)*self.stopwatch.interpolation,
+    )
+
+  def update(self, stopwatch: Stopwatch, snapshot: Any) -> None:
+    if self.prev_center is None:
+      self.prev_center = Coordinate(self.center.x, self.center.y)
+    else:
+      self.prev_center.x = self.center.x
+      self.prev_center.y = self.center.y
 
   def draw(self, transparent_color: int) -> None:
-    pyxel.blt(
-      x=self.center.x-self.block.image.size.width/2,
-      y=self.center.y-self.block.image.size.height/2,
-      img=self.block.image.id,
-      u=self.block.image.origin.x,
-      v=self.block.image.origin.y,
-      w=self.block.image.copy_vector.width,
-      h=self.block.image.copy_vector.height,
+    center = self.draw_center
+    image = self.block.image
+    Platform.shared.blt(
+      x=center.x-image.size.width/2,
+      y=center.y-image.size.height/2,
+      img=image.id,
+      u=image.origin.x,
+      v=image.origin.y,
+      w=image.copy_vector.width,
+      h=image.copy_vector.height,
       colkey=transparent_color,
     )
 
-  def hit(self, other: TSprite) -> bool:
-    return self.block.collision.hit(self.center, other.block.collision, other.center)
+  @property
+  def bounds(self) -> tuple[float, float, float, float]:
+    collision = self.block.collision
+    if self.placed_collision is not collision:
+      self.placed_bounds = collision.bounds(self.center)
+      self.placed_collision = collision
+    return self.placed_bounds
+
+
+class CollisionIndex:
+  STATE_FORMAT = '?dddddd'
+
+  def __init__(self) -> None:
+    self.sprites: list[Sprite] = []
+    self.groups: dict[str, int] = {}
+    self.centers: dict[str, Coordinate] = {}
+    self.prev_centers: dict[str, Coordinate] = {}
+    self.bounds: dict[str, tuple[float, float, float, float]] = {}
+    self.prev_bounds: dict[str, tuple[float, float, float, float]] = {}
+    self.lefts: dict[str, float] = {}
+    self.rights: dict[str, float] = {}
+    self.removed = False
+
+  def clear(self) -> None:
+    self.sprites = []
+    self.groups = {}
+    self.centers = {}
+    self.prev_centers = {}
+    self.bounds = {}
+    self.prev_bounds = {}
+    self.lefts = {}
+    self.rights = {}
+    self.removed = False
+
+  def add(self, sprite: Sprite, group: int) -> None:
+    if sprite.id not in self.groups:
+      self.groups[sprite.id] = group
+      self.sprites.append(sprite)
+
+  def remove(self, sprite: Sprite) -> None:
+    if sprite.id in self.groups:
+      del self.groups[sprite.id]
+      self.removed = True
+
+  def state(self, sprite: Sprite) -> tuple:
+    if sprite.id not in self.centers:
+      return (False, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    center = self.centers[sprite.id]
+    return (True, center.x, center.y, *self.bounds[sprite.id])
+
+  def restore(self, sprite: Sprite, state: tuple, index: int) -> int:
+    (indexed, x, y, left, top, right, bottom) = state[index:index+7]
+    if indexed:
+      self.centers[sprite.id] = Coordinate(x, y)
+      self.bounds[sprite.id] = (left, top, right, bottom)
+    return index+7
+
+  def update(self) -> None:
+    if self.removed:
+      self.sprites = [sprite for sprite in self.sprites if sprite.id in self.groups]
+      for states in [self.centers, self.prev_centers, self.bounds, self.prev_bounds, self.lefts, self.rights]:
+        for id in [id for id in states if id not in self.groups]:
+          del states[id]
+      self.removed = False
+
+    for sprite in self.sprites:
+      center = Coordinate(sprite.center.x, sprite.center.y)
+      bounds = sprite.bounds
+      self.prev_centers[sprite.id] = self.centers.get(sprite.id, center)
+      self.prev_bounds[sprite.id] = self.bounds.get(sprite.id, bounds)
+      self.centers[sprite.id] = center
+      self.bounds[sprite.id] = bounds
+
+      prev_bounds = self.prev_bounds[sprite.id]
+      self.lefts[sprite.id] = min(prev_bounds[0], bounds[0])
+      self.rights[sprite.id] = max(prev_bounds[2], bounds[2])
+
+    for index in range(1, len(self.sprites)):
+      sprite = self.sprites[index]
+      left = self.lefts[sprite.id]
+      insert = index
+      while insert > 0 and self.lefts[self.sprites[insert-1].id] > left:
+        self.sprites[insert] = self.sprites[insert-1]
+        insert -= 1
+      self.sprites[insert] = sprite
+
+  def candidates(self, group: int, other_group: int) -> dict[str, list[Sprite]]:
+    pairs: dict[str, list[Sprite]] = {}
+    active: list[Sprite] = []
+    for sprite in self.sprites:
+      left = self.lefts[sprite.id]
+      active = [other for other in active if self.rights[other.id] >= left]
+
+      for other in active:
+        if self.groups[sprite.id] == group and self.groups[other.id] == other_group:
+          pairs.setdefault(sprite.id, []).append(other)
+        elif self.groups[sprite.id] == other_group and self.groups[other.id] == group:
+          pairs.setdefault(other.id, []).append(sprite)
+
+      active.append(sprite)
+
+    return pairs
+
+  def center_at(self, sprite: Sprite, time: float) -> Coordinate:
+    prev_center = self.prev_centers[sprite.id]
+    center = self.centers[sprite.id]
+    return Coordinate(
+      prev_center.x+(center.x-prev_center.x)*time,
+      prev_center.y+(center.y-prev_center.y)*time,
+    )
+
+  def time_of_impact(self, sprite: Sprite, other: Sprite) -> float | None:
+    return Collision.time_of_impact(
+      self.prev_bounds[sprite.id],
+      self.bounds[sprite.id],
+      self.prev_bounds[other.id],
+      self.bounds[other.id],
+    )
 
 
 class FlashSprite(Sprite):
+  STATE_FORMAT = Sprite.STATE_FORMAT+Timer.STATE_FORMAT+'?B?'
+
   def __init__(
     self,
     name: str,
@@ -168,7 +391,17 @@ class FlashSprite(Sprite):
     self.flashing = True
     self.show = False
 
+  def state(self) -> tuple:
+    return (*super().state(), *self.flash_timer.state(), self.flashing, self.flash_count, self.show)
+
+  def restore(self, state: tuple, index: int) -> int:
+    index = self.flash_timer.restore(state, super().restore(state, index))
+    (self.flashing, self.flash_count, self.show) = state[index:index+3]
+    return index+3
+
   def update(self, stopwatch: Stopwatch, snapshot: Any) -> None:
+    super().update(stopwatch, snapshot)
+
     if self.flashing:
       if self.flash_count >= self.max_flash_count:
         self.flashing = False
@@ -192,6 +425,8 @@ class Obstacle:
 
 
 class Field(Variation, Subject):
+  STATE_FORMAT = 'dd'
+
   def __init__(
     self,
     name: str,
@@ -205,12 +440,19 @@ class Field(Variation, Subject):
     self.max_size = max_size
     self.scroll_pos = Coordinate(0, 0)
 
+  def state(self) -> tuple:
+    return (self.scroll_pos.x, self.scroll_pos.y)
+
+  def restore(self, state: tuple, index: int) -> int:
+    self.scroll_pos = Coordinate(state[index], state[index+1])
+    return index+2
+
   def draw(self, transparent_color: int) -> None:
     pos = Coordinate(0, 0)
     distance = Coordinate(0, 0)
     for background in self.backgrounds:
       if self.scroll_pos.x <= distance.x and self.scroll_pos.y <= distance.y:
-        pyxel.bltm(
+        Platform.shared.bltm(
           x=pos.x,
           y=pos.y,
           tm=background.id,
@@ -224,9 +466,10 @@ class Field(Variation, Subject):
       distance = Coordinate(distance.x+background.size.width, distance.y)
 
 
-class Movable(Variation):
+class Movable(Placement, Variation):
   def __init__(self) -> None:
-    self.center = Coordinate(0, 0)
+    super().__init__()
+
     self.move_center: Coordinate | None = None
     self.move_distance = 1.0
 
@@ -235,7 +478,7 @@ class Movable(Variation):
     return self.move_center is not None
 
   def move(self, center: Coordinate, move_distance: float) -> None:
-    self.move_center = center
+    self.move_center = Coordinate(center.x, center.y)
     self.move_distance = move_distance
 
   def update(self, stopwatch: Stopwatch, snapshot: Any) -> None:
@@ -254,12 +497,85 @@ class Movable(Variation):
         else:
           distance_y = self.move_distance
 
-      self.center = Coordinate(self.center.x+distance_x, self.center.y+distance_y)
+      self.place(self.center.x+distance_x, self.center.y+distance_y)
 
       if self.center.x == self.move_center.x and self.center.y == self.move_center.y:
         self.move_center = None
 
 
+class TextCache:
+  PADDING = 2
+
+  def __init__(self, cell_size: Size, cell_count: int) -> None:
+    self.cell_size = cell_size
+    self.cell_count = cell_count
+
+    self.image: Any = None
+    self.image_created = False
+    self.cells: OrderedDict[tuple[str, int, bool, int, int], int] = OrderedDict()
+    self.free_cells = list(reversed(range(cell_count)))
+    self.seen: OrderedDict[tuple[str, int, bool, int, int], None] = OrderedDict()
+
+  @classmethod
+  def area(cls, string: str, font_size: int) -> Size:
+    return Size(len(string)*font_size, font_size+cls.PADDING*2)
+
+  def can_cache(self, string: str, font_size: int, text_color: int, transparent_color: int) -> bool:
+    area = self.area(string, font_size)
+    return area.width <= self.cell_size.width and area.height <= self.cell_size.height and text_color != transparent_color
+
+  def allocate(self) -> int:
+    if len(self.free_cells) > 0:
+      return self.free_cells.pop()
+
+    (key, cell) = self.cells.popitem(last=False)
+    Logger.shared.debug('text cache evict', key[0], cell)
+    return cell
+
+  def find(self, key: tuple[str, int, bool, int, int]) -> int | None:
+    cell = self.cells.get(key)
+    if cell is not None:
+      self.cells.move_to_end(key)
+    return cell
+
+  def admit(self, key: tuple[str, int, bool, int, int]) -> bool:
+    if key in self.seen:
+      del self.seen[key]
+      return True
+
+    self.seen[key] = None
+    if len(self.seen) > self.cell_count:
+      self.seen.popitem(last=False)
+    return False
+
+  def store(self, key: tuple[str, int, bool, int, int], font: Any) -> int:
+    if not self.image_created:
+      self.image = Platform.shared.image(int(self.cell_size.width), int(self.cell_size.height*self.cell_count))
+      self.image_created = True
+
+    (string, _, _, text_color, transparent_color) = key
+    cell = self.allocate()
+    self.cells[key] = cell
+    v = cell*self.cell_size.height
+    Platform.shared.image_rect(self.image, 0, v, self.cell_size.width, self.cell_size.height, transparent_color)
+    Platform.shared.image_text(self.image, 0, v+self.PADDING, string, text_color, font)
+    return cell
+
+  def draw(self, x: float, y: float, cell: int, key: tuple[str, int, bool, int, int]) -> None:
+    (string, font_size, _, _, transparent_color) = key
+    area = self.area(string, font_size)
+    Platform.shared.blt(
+      x=x,
+      y=y-self.PADDING,
+      img=self.image,
+      u=0,
+      v=cell*self.cell_size.height,
+      w=area.width,
+      h=area.height,
+      colkey=transparent_color,
+    )
+
+
 class Typewriter:
   FONT_FOLDER = 'font'
   CUSTOM_FONT_FILES: dict[int, dict[bool, str]] = {
@@ -272,28 +588,57 @@ class Typewriter:
       True: 'PixelMplus12-Bold.bdf',
     },
   }
+  CACHE_WIDTH = 512
+  CACHE_COUNT = 32
 
   def __init__(self, path: Path) -> None:
     self.path = path
 
-    self.fonts: dict[str, pyxel.Font] = {}
+    self.fonts: dict[str, Any] = {}
+    self.cache = TextCache(
+      Size(self.CACHE_WIDTH, TextCache.area('', max(self.CUSTOM_FONT_FILES.keys())).height),
+      self.CACHE_COUNT,
+    )
 
   @classmethod
   def word_size(cls, font_size: int) -> Size:
     return Size(font_size/2, font_size)
 
-  def font(self, font_size: int, bold: bool) -> pyxel.Font:
+  def font(self, font_size: int, bold: bool) -> Any:
     if font_size in self.CUSTOM_FONT_FILES and bold in self.CUSTOM_FONT_FILES[font_size]:
       font_file = self.CUSTOM_FONT_FILES[font_size][bold]
     else:
       font_file = self.CUSTOM_FONT_FILES[10][False]
 
     if font_file not in self.fonts:
-      font = pyxel.Font(os.path.join(self.path.asset_path, self.FONT_FOLDER, font_file)) # type: ignore
-      print('new font', font, font, self.fonts)
+      font_path = os.path.join(self.path.asset_path, self.FONT_FOLDER, font_file)
+      atlas_path = os.path.splitext(font_path)[0]+GlyphAtlas.EXTENSION
+      font = Platform.shared.font(atlas_path if os.path.exists(atlas_path) else font_path)
+      Logger.shared.info('new font', font, font, self.fonts)
       self.fonts[font_file] = font
 
     return self.fonts[font_file]
+
+  def text(
+    self,
+    x: float,
+    y: float,
+    string: str,
+    text_color: int,
+    font_size: int,
+    bold: bool,
+    transparent_color: int,
+  ) -> None:
+    if self.cache.can_cache(string, font_size, text_color, transparent_color):
+      key = (string, font_size, bold, text_color, transparent_color)
+      cell = self.cache.find(key)
+      if cell is None and self.cache.admit(key):
+        cell = self.cache.store(key, self.font(font_size, bold))
+      if cell is not None:
+        self.cache.draw(x, y, cell, key)
+        return
+
+    Platform.shared.text(x=x, y=y, s=string, col=text_color, font=self.font(font_size, bold))
   
   
 class Text(Subject, Movable):
@@ -312,33 +657,29 @@ class Text(Subject, Movable):
 
     self.typewriter = typewriter
     self.string = string
+    self.draw_string = string.upper()
     self.text_color = text_color
     self.font_size = font_size
     self.bold = bold
-
-  @property
-  def size(self) -> Size:
-    return Size(
+    self.size = Size(
       len(self.string)*Typewriter.word_size(self.font_size).width,
       Typewriter.word_size(self.font_size).height,
     )
 
-  @property
-  def origin(self) -> Coordinate:
-    return Coordinate(self.center.x-self.size.width/2, self.center.y-self.size.height/2)
-
-  @origin.setter
-  def origin(self, value: Coordinate) -> None:
-    self.center = Coordinate(value.x+self.size.width/2, value.y+self.size.height/2)
+  def draw_at(self, x: float, y: float, transparent_color: int) -> None:
+    self.typewriter.text(
+      x=x,
+      y=y,
+      string=self.draw_string,
+      text_color=self.text_color,
+      font_size=self.font_size,
+      bold=self.bold,
+      transparent_color=transparent_color,
+    )
 
   def draw(self, transparent_color: int) -> None:
-    pyxel.text(
-      x=self.origin.x,
-      y=self.origin.y,
-      s=self.string.upper(),
-      col=self.text_color,
-      font=self.typewriter.font(self.font_size, self.bold),
-    )
+    origin = self.origin
+    self.draw_at(origin.x, origin.y, transparent_color)
 
 
 class BlinkText(Text):
@@ -429,17 +770,9 @@ class Signboard(Subject, Movable):
 
     self.size = Size(max_width, max_height)
 
-  @property
-  def origin(self) -> Coordinate:
-    return Coordinate(self.center.x-self.size.width/2, self.center.y-self.size.height/2)
-
-  @origin.setter
-  def origin(self, value: Coordinate) -> None:
-    self.center = Coordinate(value.x+self.size.width/2, value.y+self.size.height/2)
-
   def draw(self, transparent_color: int) -> None:
     for poster in self.posters:
-      pyxel.blt(
+      Platform.shared.blt(
         x=poster.origin.x+self.origin.x,
         y=poster.origin.y+self.origin.y,
         img=poster.image.id,
@@ -449,100 +782,243 @@ class Signboard(Subject, Movable):
         h=poster.image.copy_vector.height,
         colkey=transparent_color,
       )
+    origin = self.origin
     for text in self.texts:
-      draw_text = Text(
-        typewriter=text.typewriter,
-        string=text.string,
-        text_color=text.text_color,
-        font_size=text.font_size,
-        bold=text.bold,
-      )
-      draw_text.origin = Coordinate(self.origin.x+text.origin.x, self.origin.y+text.origin.y)
-      draw_text.draw(transparent_color)
+      text_origin = text.origin
+      text.draw_at(origin.x+text_origin.x, origin.y+text_origin.y, transparent_color)
+
+
+class InputReplay:
+  MAGIC = b'JBRP'
+  VERSION = 1
+  HEADER_FORMAT = '<4sBBIQ'
+  RUN_FORMAT = '<HH'
+  MAX_RUN = 0xffff
+
+  def __init__(self, seed: int, button_count: int) -> None:
+    self.seed = seed
+    self.button_count = button_count
+    self.runs: list[list[int]] = []
+    self.frame_count = 0
+
+  def append(self, state: int) -> None:
+    if len(self.runs) > 0 and self.runs[-1][0] == state and self.runs[-1][1] < self.MAX_RUN:
+      self.runs[-1][1] += 1
+    else:
+      self.runs.append([state, 1])
+    self.frame_count += 1
+
+  def states(self) -> Iterator[int]:
+    for (state, count) in self.runs:
+      for _ in range(count):
+        yield state
+
+  def save(self, file_path: str) -> None:
+    with open(file_path, mode='wb') as f:
+      f.write(struct.pack(self.HEADER_FORMAT, self.MAGIC, self.VERSION, self.button_count, self.frame_count, self.seed))
+      for (state, count) in self.runs:
+        f.write(struct.pack(self.RUN_FORMAT, state, count))
+    Logger.shared.info('input replay save', file_path, self.frame_count, len(self.runs))
+
+  @classmethod
+  def load(cls, file_path: str) -> 'InputReplay':
+    with open(file_path, mode='rb') as f:
+      data = f.read()
+
+    header_size = struct.calcsize(cls.HEADER_FORMAT)
+    (magic, version, button_count, frame_count, seed) = struct.unpack_from(cls.HEADER_FORMAT, data)
+    if magic != cls.MAGIC or version != cls.VERSION:
+      raise RuntimeError('invalid input replay {}'.format(file_path))
+
+    replay = InputReplay(seed, button_count)
+    for (state, count) in struct.iter_unpack(cls.RUN_FORMAT, data[header_size:]):
+      replay.runs.append([state, count])
+      replay.frame_count += count
+    if replay.frame_count != frame_count:
+      raise RuntimeError('broken input replay {}'.format(file_path))
+
+    Logger.shared.info('input replay load', file_path, replay.frame_count, len(replay.runs))
+    return replay
 
 
 class GamePad:
   def __init__(self, watch_buttons: dict[int, list[int]]) -> None:
     self.watch_buttons: dict[int, list[int]] = watch_buttons
+    self.buttons = sorted(watch_buttons.keys())
+    self.state = 0
+    self.recording: InputReplay | None = None
+    self.playing: Iterator[int] | None = None
+
+  def record(self, replay: InputReplay) -> None:
+    self.recording = replay
+
+  def play(self, replay: InputReplay) -> None:
+    if replay.button_count != len(self.buttons):
+      raise RuntimeError('input replay button count {}'.format(replay.button_count))
+    self.playing = replay.states()
+
+  def sample(self) -> int:
+    state = 0
+    for (index, button) in enumerate(self.buttons):
+      for key in self.watch_buttons[button]:
+        if Platform.shared.btn(key):
+          state |= 1 << index*2
+        if Platform.shared.btnp(key):
+          state |= 1 << index*2+1
+    return state
+
+  def update(self) -> None:
+    state = next(self.playing, None) if self.playing is not None else None
+    if state is None:
+      self.playing = None
+      state = self.sample()
+    self.state = state
+
+    if self.recording is not None:
+      self.recording.append(state)
 
   def push(self, button: int) -> bool:
-    for key in self.watch_buttons[button]:
-      if pyxel.btnp(key):
-        return True
-
-    return False
+    return self.state & (1 << self.buttons.index(button)*2+1) != 0
 
   def pushing(self, button: int) -> bool:
-    for key in self.watch_buttons[button]:
-      if pyxel.btn(key):
-        return True
+    return self.state & (1 << self.buttons.index(button)*2) != 0
+
+
+class VoiceAllocator:
+  class Voice:
+    def __init__(self, channel: int, id: int, priority: int, order: int) -> None:
+      self.channel = channel
+      self.id = id
+      self.priority = priority
+      self.order = order
+
+  def __init__(self, channel_count: int) -> None:
+    self.channel_count = channel_count
+
+    self.reserved_channels: set[int] = set()
+    self.free_channels = list(range(channel_count))
+    self.voices: dict[int, VoiceAllocator.Voice] = {}
+    self.requests: dict[int, int] = {}
+    self.order = 0
+
+  def reserve(self, channels: list[int]) -> None:
+    self.reserved_channels = set(channels)
+    self.voices = {channel: voice for (channel, voice) in self.voices.items() if channel not in self.reserved_channels}
+    self.free_channels = [
+      channel for channel in range(self.channel_count)
+      if channel not in self.reserved_channels and channel not in self.voices
+    ]
+
+  def request(self, id: int, priority: int) -> None:
+    if id in self.requests:
+      self.requests[id] = max(self.requests[id], priority)
+      Logger.shared.debug('sound effect coalesce', id)
+    else:
+      self.requests[id] = priority
 
-    return False
+  def release(self) -> None:
+    for channel in [channel for channel in self.voices.keys() if Platform.shared.play_pos(channel) is None]:
+      del self.voices[channel]
+      self.free_channels.append(channel)
+
+  def allocate(self, priority: int) -> int | None:
+    if len(self.free_channels) > 0:
+      return self.free_channels.pop()
+
+    if len(self.voices) == 0:
+      return None
+
+    voice = min(self.voices.values(), key=lambda x: (x.priority, x.order))
+    if voice.priority > priority:
+      return None
+
+    del self.voices[voice.channel]
+    Logger.shared.debug('sound effect steal', voice.id, voice.channel)
+    return voice.channel
+
+  def update(self) -> None:
+    if len(self.requests) == 0:
+      return
+
+    self.release()
+    for (id, priority) in sorted(self.requests.items(), key=lambda x: -x[1]):
+      channel = self.allocate(priority)
+      if channel is None:
+        Logger.shared.debug('sound effect drop', id, priority)
+        continue
+
+      SoundEffect(channel, id).play()
+      self.voices[channel] = VoiceAllocator.Voice(channel, id, priority, self.order)
+      self.order += 1
+    self.requests.clear()
 
 
 class MusicBox:
-  def __init__(self, bgm_param: Bgm.Param | None, raw_bgm_param: RawBgm.Param | None) -> None:
+  def __init__(
+    self,
+    bgm_param: Bgm.Param | None,
+    raw_bgm_param: RawBgm.Param | None,
+    se_priorities: dict[int, int],
+  ) -> None:
     self.bgm_param = bgm_param
-    self.raw_bgm_param = raw_bgm_param
+    self.raw_bgm_bank = RawBgmBank(raw_bgm_param) if raw_bgm_param is not None else None
+    self.se_priorities = se_priorities
+    self.voice_allocator = VoiceAllocator(AssetSound.channel_count())
 
     self.can_play_se = True
     self.can_play_bgm = True
     self.bgm: AssetBgm | None = None
 
+  def update(self) -> None:
+    self.voice_allocator.update()
+
   def play_se(self, id: int) -> None:
     if not self.can_play_se:
-      print('sound effect disabled', id)
+      Logger.shared.debug('sound effect disabled', id)
       return
 
-    play_channel = -1
-    for channel in reversed(range(AssetSound.channel_count())):
-      if self.bgm is not None:
-        if channel in self.bgm.channels:
-          continue
-
-      if pyxel.play_pos(channel) is not None:
-        continue
-
-      play_channel = channel
-      break
-
-    if play_channel < 0:
-      play_channel = AssetSound.channel_count()-1
-      print('sound effect no enable channel', play_channel)
-    SoundEffect(play_channel, id).play()
-      
+    self.voice_allocator.request(id, self.se_priorities.get(id, 0))
 
   def play_bgm(self, id: int) -> None:
     if not self.can_play_bgm or self.bgm_param is None:
-      print('bgm disabled', id)
+      Logger.shared.debug('bgm disabled', id)
       return
 
     if self.bgm is not None:
       if self.bgm.name == Bgm.setup_name(id):
-        print('bgm play already', self.bgm.name)
+        Logger.shared.debug('bgm play already', self.bgm.name)
         return
 
       self.bgm.stop()
 
     self.bgm = Bgm(id, self.bgm_param)
     self.bgm.play()
+    self.voice_allocator.reserve(self.bgm.channels)
 
   def play_raw_bgm(self, filename: str) -> None:
-    if not self.can_play_bgm or self.raw_bgm_param is None:
-      print('bgm disabled', filename)
+    if not self.can_play_bgm or self.raw_bgm_bank is None:
+      Logger.shared.debug('bgm disabled', filename)
       return
 
     if self.bgm is not None:
       if self.bgm.name == RawBgm.setup_name(filename):
-        print('raw bgm play already', self.bgm.name)
+        Logger.shared.debug('raw bgm play already', self.bgm.name)
         return
 
       self.bgm.stop()
 
-    self.bgm = RawBgm(filename, self.raw_bgm_param)
+    self.bgm = RawBgm(filename, self.raw_bgm_bank)
     self.bgm.play()
+    self.voice_allocator.reserve(self.bgm.channels)
+
+  def prefetch_raw_bgm(self, filename: str) -> None:
+    if not self.can_play_bgm or self.raw_bgm_bank is None:
+      return
+
+    self.raw_bgm_bank.prefetch(filename)
 
   def stop_bgm(self) -> None:
     if self.bgm is not None:
       self.bgm.stop()
     self.bgm = None
+    self.voice_allocator.reserve([])
@@ -1,30 +1,89 @@
 from typing import Callable
-from core import GameConfig
+from core import Logger, LogLevel, GameConfig, Platform, Profiler
 import os
-import pyxel
+
+
+class FixedTimestep:
+  EPSILON_SEC = 1e-6
+
+  def __init__(self, fps: int, max_update_count: int, max_skip_draw_count: int) -> None:
+    self.step_sec = 1/fps
+    self.max_update_count = max_update_count
+    self.max_skip_draw_count = max_skip_draw_count
+
+    self.last_sec: float | None = None
+    self.accumulator = 0.0
+    self.interpolation = 1.0
+    self.skip_draw = False
+    self.skip_draw_count = 0
+
+  def advance(self, now_sec: float) -> int:
+    if self.last_sec is None:
+      self.last_sec = now_sec
+      return 1
+
+    self.accumulator += now_sec-self.last_sec
+    self.last_sec = now_sec
+
+    count = 0
+    while self.accumulator+self.EPSILON_SEC >= self.step_sec and count < self.max_update_count:
+      self.accumulator -= self.step_sec
+      count += 1
+
+    behind = self.accumulator+self.EPSILON_SEC >= self.step_sec
+    if behind:
+      Logger.shared.warning('timestep behind', self.accumulator, count)
+      self.accumulator %= self.step_sec
+    self.accumulator = max(self.accumulator, 0.0)
+    self.interpolation = min(self.accumulator/self.step_sec, 1.0)
+
+    self.skip_draw = (behind or count > 1) and self.skip_draw_count < self.max_skip_draw_count
+    self.skip_draw_count = self.skip_draw_count+1 if self.skip_draw else 0
+
+    return count
 
 
 class GameEngine:
+  MAX_UPDATE_COUNT = 5
+  MAX_SKIP_DRAW_COUNT = 2
+
   def __init__(
     self,
     config: GameConfig,
+    platform: Platform,
     quit_key: int,
     asset_file: str,
     update: Callable[[], None],
-    draw: Callable[[], None]
+    draw: Callable[[float], None]
   ) -> None:
-    print('engine', vars(config), quit_key, asset_file)
+    Logger.setup(Logger(LogLevel.DEBUG if config.debug else LogLevel.WARNING, Logger.RING_SIZE, config.debug))
+    Logger.shared.info('engine', vars(config), type(platform).__name__, quit_key, asset_file)
     self.update = update
     self.draw = draw
 
-    pyxel.init(
+    Platform.setup(platform)
+    self.platform = platform
+    Profiler.setup(Profiler(config.debug, Profiler.WINDOW_SIZE))
+    self.timestep = FixedTimestep(config.fps, self.MAX_UPDATE_COUNT, self.MAX_SKIP_DRAW_COUNT)
+
+    self.platform.init(
       width=int(config.window_size.width),
       height=int(config.window_size.height),
       title=config.title,
-      fps=config.fps,
+      fps=config.render_fps,
       quit_key=quit_key,
     )
-    pyxel.load(os.path.join(config.path.asset_path, asset_file))
+    self.platform.load(os.path.join(config.path.asset_path, asset_file))
+
+  def update_frame(self) -> None:
+    self.platform.poll()
+    for _ in range(self.timestep.advance(self.platform.time())):
+      self.update()
+      self.platform.consume()
+
+  def draw_frame(self) -> None:
+    if not self.timestep.skip_draw:
+      self.draw(self.timestep.interpolation)
 
   def run(self) -> None:
-    pyxel.run(self.update, self.draw)
+    self.platform.run(self.update_frame, self.draw_frame)
@@ -0,0 +1,142 @@
+from bisect import bisect_left
+from core import Logger
+import struct
+
+
+class Glyph:
+  def __init__(self, advance: int, width: int, height: int, x_offset: int, y_offset: int, rows: list[int]) -> None:
+    self.advance = advance
+    self.width = width
+    self.height = height
+    self.x_offset = x_offset
+    self.y_offset = y_offset
+    self.rows = rows
+
+  def pixel(self, x: int, y: int) -> bool:
+    return self.rows[y] >> (self.row_bits-1-x) & 1 != 0
+
+  @property
+  def row_bytes(self) -> int:
+    return (self.width+7)//8
+
+  @property
+  def row_bits(self) -> int:
+    return self.row_bytes*8
+
+
+class GlyphAtlas:
+  EXTENSION = '.jbf'
+  MAGIC = b'JBGA'
+  VERSION = 1
+  HEADER_FORMAT = '<4sBxbbbbI'
+  METRIC_FORMAT = '<BBBbbxI'
+
+  def __init__(self, data: bytes) -> None:
+    (magic, version, width, height, x_offset, y_offset, count) = struct.unpack_from(self.HEADER_FORMAT, data)
+    if magic != self.MAGIC or version != self.VERSION:
+      raise RuntimeError('invalid glyph atlas')
+
+    self.bounding_box = (width, height, x_offset, y_offset)
+    self.count = count
+
+    self.data = memoryview(data)
+    codepoint_offset = struct.calcsize(self.HEADER_FORMAT)
+    self.metric_offset = codepoint_offset+count*4
+    self.bitmap_offset = self.metric_offset+count*struct.calcsize(self.METRIC_FORMAT)
+    self.codepoints = self.data[codepoint_offset:self.metric_offset].cast('I')
+
+    self.glyphs: dict[int, Glyph | None] = {}
+
+  @classmethod
+  def load(cls, file_path: str) -> 'GlyphAtlas':
+    with open(file_path, mode='rb') as f:
+      atlas = GlyphAtlas(f.read())
+    Logger.shared.info('glyph atlas load', file_path, atlas.count)
+    return atlas
+
+  def glyph(self, codepoint: int) -> Glyph | None:
+    if codepoint in self.glyphs:
+      return self.glyphs[codepoint]
+
+    glyph: Glyph | None = None
+    index = bisect_left(self.codepoints, codepoint)
+    if index < self.count and self.codepoints[index] == codepoint:
+      metric_size = struct.calcsize(self.METRIC_FORMAT)
+      (advance, width, height, x_offset, y_offset, offset) = struct.unpack_from(
+        self.METRIC_FORMAT,
+        self.data,
+        self.metric_offset+index*metric_size,
+      )
+      row_bytes = (width+7)//8
+      start = self.bitmap_offset+offset
+      rows = [
+        int.from_bytes(self.data[start+row*row_bytes:start+(row+1)*row_bytes], 'big')
+        for row in range(height)
+      ]
+      glyph = Glyph(advance, width, height, x_offset, y_offset, rows)
+
+    self.glyphs[codepoint] = glyph
+    return glyph
+
+  @classmethod
+  def parse_bdf(cls, text: str, codepoints: set[int] | None) -> tuple[tuple[int, int, int, int], dict[int, Glyph]]:
+    bounding_box = (0, 0, 0, 0)
+    glyphs: dict[int, Glyph] = {}
+
+    codepoint = -1
+    advance = 0
+    bbx = (0, 0, 0, 0)
+    rows: list[int] | None = None
+    for line in text.splitlines():
+      words = line.split()
+      if len(words) == 0:
+        continue
+
+      if rows is not None:
+        if words[0] == 'ENDCHAR':
+          if codepoint >= 0 and (codepoints is None or codepoint in codepoints):
+            glyphs[codepoint] = Glyph(advance, bbx[0], bbx[1], bbx[2], bbx[3], rows)
+          rows = None
+        else:
+          rows.append(int(words[0], 16))
+      elif words[0] == 'FONTBOUNDINGBOX':
+        bounding_box = (int(words[1]), int(words[2]), int(words[3]), int(words[4]))
+      elif words[0] == 'ENCODING':
+        codepoint = int(words[1])
+      elif words[0] == 'DWIDTH':
+        advance = int(words[1])
+      elif words[0] == 'BBX':
+        bbx = (int(words[1]), int(words[2]), int(words[3]), int(words[4]))
+      elif words[0] == 'BITMAP':
+        rows = []
+
+    return (bounding_box, glyphs)
+
+  @classmethod
+  def compile(cls, bounding_box: tuple[int, int, int, int], glyphs: dict[int, Glyph]) -> bytes:
+    codepoints = sorted(glyphs.keys())
+    metrics = bytearray()
+    bitmaps = bytearray()
+    for codepoint in codepoints:
+      glyph = glyphs[codepoint]
+      metrics += struct.pack(cls.METRIC_FORMAT, glyph.advance, glyph.width, glyph.height, glyph.x_offset, glyph.y_offset, len(bitmaps))
+      for row in glyph.rows:
+        bitmaps += row.to_bytes(glyph.row_bytes, 'big')
+
+    return (
+      struct.pack(cls.HEADER_FORMAT, cls.MAGIC, cls.VERSION, *bounding_box, len(codepoints))
+      +struct.pack('<{}I'.format(len(codepoints)), *codepoints)
+      +bytes(metrics)
+      +bytes(bitmaps)
+    )
+
+  @classmethod
+  def build(cls, bdf_path: str, atlas_path: str, codepoints: set[int] | None) -> int:
+    with open(bdf_path, mode='r') as f:
+      (bounding_box, glyphs) = cls.parse_bdf(f.read(), codepoints)
+
+    with open(atlas_path, mode='wb') as f:
+      f.write(cls.compile(bounding_box, glyphs))
+
+    Logger.shared.info('glyph atlas build', bdf_path, atlas_path, len(glyphs))
+    return len(glyphs)
@@ -0,0 +1,83 @@
+from collections import deque
+from enum import IntEnum
+from typing import Any
+import json
+import time
+
+
+class LogLevel(IntEnum):
+  DEBUG = 10
+  INFO = 20
+  WARNING = 30
+  ERROR = 40
+  NONE = 100
+
+
+class LogRecord:
+  def __init__(self, level: int, sec: float, event: str, values: tuple) -> None:
+    self.level = level
+    self.sec = sec
+    self.event = event
+    self.values = values
+
+  def format(self) -> str:
+    return ' '.join([self.event]+[str(value) for value in self.values])
+
+  def to_json(self) -> dict:
+    return {
+      'level': LogLevel(self.level).name,
+      'sec': self.sec,
+      'message': self.format(),
+    }
+
+
+class Logger:
+  shared: 'Logger'
+
+  RING_SIZE = 1000
+
+  @classmethod
+  def setup(cls, logger: 'Logger') -> None:
+    Logger.shared = logger
+
+  def __init__(self, level: int, ring_size: int, stdout: bool) -> None:
+    self.level = level
+    self.stdout = stdout
+    self.ring: deque[LogRecord] = deque(maxlen=ring_size)
+
+    self.debug_enabled = level <= LogLevel.DEBUG
+    self.info_enabled = level <= LogLevel.INFO
+    self.warning_enabled = level <= LogLevel.WARNING
+    self.error_enabled = level <= LogLevel.ERROR
+
+  def debug(self, event: str, *values: Any) -> None:
+    if self.debug_enabled:
+      self.emit(LogLevel.DEBUG, event, values)
+
+  def info(self, event: str, *values: Any) -> None:
+    if self.info_enabled:
+      self.emit(LogLevel.INFO, event, values)
+
+  def warning(self, event: str, *values: Any) -> None:
+    if self.warning_enabled:
+      self.emit(LogLevel.WARNING, event, values)
+
+  def error(self, event: str, *values: Any) -> None:
+    if self.error_enabled:
+      self.emit(LogLevel.ERROR, event, values)
+
+  def emit(self, level: int, event: str, values: tuple) -> None:
+    record = LogRecord(level, time.perf_counter(), event, values)
+    self.ring.append(record)
+    if self.stdout:
+      print(record.format())
+
+  def records(self, level: int) -> list[LogRecord]:
+    return [record for record in self.ring if record.level >= level]
+
+  def dump(self, file_path: str) -> None:
+    with open(file_path, mode='w') as f:
+      json.dump([record.to_json() for record in self.ring], f, indent=2)
+
+
+Logger.setup(Logger(LogLevel.WARNING, Logger.RING_SIZE, True))
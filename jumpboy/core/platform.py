@@ -0,0 +1,399 @@
+from enum import IntEnum
+from typing import Any, Callable, Sequence
+from core import Logger, GlyphAtlas
+import time
+
+
+class Key(IntEnum):
+  RETURN = 13
+  SPACE = 32
+  L = 108
+  P = 112
+  Q = 113
+  S = 115
+  MOUSE_BUTTON_LEFT = 11004
+  MOUSE_BUTTON_RIGHT = 11006
+  GAMEPAD1_BUTTON_A = 12006
+  GAMEPAD1_BUTTON_B = 12007
+
+
+class Color(IntEnum):
+  BLACK = 0
+  NAVY = 1
+  PURPLE = 2
+  GREEN = 3
+  BROWN = 4
+  DARK_BLUE = 5
+  LIGHT_BLUE = 6
+  WHITE = 7
+  RED = 8
+  ORANGE = 9
+  YELLOW = 10
+  LIME = 11
+  CYAN = 12
+  GRAY = 13
+  PINK = 14
+  PEACH = 15
+
+
+class Platform:
+  shared: 'Platform'
+
+  draw_count = 0
+
+  @classmethod
+  def setup(cls, platform: 'Platform') -> None:
+    Platform.shared = platform
+    Logger.shared.info('platform setup', type(platform).__name__)
+
+  @property
+  def can_save(self) -> bool:
+    return True
+
+  def init(self, width: int, height: int, title: str, fps: int, quit_key: int) -> None:
+    raise RuntimeError()
+
+  def load(self, file_path: str) -> None:
+    raise RuntimeError()
+
+  def run(self, update: Callable[[], None], draw: Callable[[], None]) -> None:
+    raise RuntimeError()
+
+  def quit(self) -> None:
+    raise RuntimeError()
+
+  def time(self) -> float:
+    raise RuntimeError()
+
+  def poll(self) -> None:
+    pass
+
+  def consume(self) -> None:
+    pass
+
+  def cls(self, col: int) -> None:
+    raise RuntimeError()
+
+  def blt(self, x: float, y: float, img: int | Any, u: float, v: float, w: float, h: float, colkey: int) -> None:
+    raise RuntimeError()
+
+  def bltm(self, x: float, y: float, tm: int, u: float, v: float, w: float, h: float, colkey: int) -> None:
+    raise RuntimeError()
+
+  def text(self, x: float, y: float, s: str, col: int, font: Any) -> None:
+    raise RuntimeError()
+
+  def font(self, file_path: str) -> Any:
+    raise RuntimeError()
+
+  def image(self, width: int, height: int) -> Any:
+    raise RuntimeError()
+
+  def image_rect(self, image: Any, x: float, y: float, w: float, h: float, col: int) -> None:
+    raise RuntimeError()
+
+  def image_text(self, image: Any, x: float, y: float, s: str, col: int, font: Any) -> None:
+    raise RuntimeError()
+
+  def btn(self, key: int) -> bool:
+    raise RuntimeError()
+
+  def btnp(self, key: int) -> bool:
+    raise RuntimeError()
+
+  def play(self, ch: int, snd: int, loop: bool, resume: bool) -> None:
+    raise RuntimeError()
+
+  def playm(self, msc: int, loop: bool) -> None:
+    raise RuntimeError()
+
+  def stop(self, ch: int) -> None:
+    raise RuntimeError()
+
+  def play_pos(self, ch: int) -> Any | None:
+    raise RuntimeError()
+
+  def set_sound(self, id: int, notes: str, tones: str, volumes: str, effects: str, speed: int) -> None:
+    raise RuntimeError()
+
+  def set_sound_data(self, id: int, notes: Sequence[int], tones: Sequence[int], volumes: Sequence[int], effects: Sequence[int], speed: int) -> None:
+    raise RuntimeError()
+
+
+class PyxelGlyphFont:
+  SHEET_SIZE = 256
+  GLYPH_COLOR = 1
+  BLANK_COLOR = 0
+
+  def __init__(self, atlas: GlyphAtlas) -> None:
+    self.atlas = atlas
+    (self.cell_width, self.cell_height, self.x_origin, self.y_origin) = atlas.bounding_box
+    self.columns = self.SHEET_SIZE//self.cell_width
+    self.rows = self.SHEET_SIZE//self.cell_height
+
+    self.sheets: list[Any] = []
+    self.cells: dict[int, tuple[Any, int, int, int] | None] = {}
+    self.upload_count = 0
+
+  def upload(self, codepoint: int) -> tuple[Any, int, int, int] | None:
+    glyph = self.atlas.glyph(codepoint)
+    if glyph is None:
+      return None
+
+    index = self.upload_count%(self.columns*self.rows)
+    if index == 0:
+      sheet = Platform.shared.image(self.SHEET_SIZE, self.SHEET_SIZE)
+      sheet.cls(self.BLANK_COLOR)
+      self.sheets.append(sheet)
+    sheet = self.sheets[-1]
+    self.upload_count += 1
+    u = index%self.columns*self.cell_width
+    v = index//self.columns*self.cell_height
+
+    gx = u+glyph.x_offset-self.x_origin
+    gy = v+self.cell_height+self.y_origin-glyph.height-glyph.y_offset
+    for y in range(glyph.height):
+      for x in range(glyph.width):
+        if glyph.pixel(x, y):
+          sheet.pset(gx+x, gy+y, self.GLYPH_COLOR)
+    return (sheet, u, v, glyph.advance)
+
+  def draw(self, target: Any, x: float, y: float, s: str, col: int) -> None:
+    target.pal(self.GLYPH_COLOR, col)
+    for char in s:
+      codepoint = ord(char)
+      if codepoint not in self.cells:
+        self.cells[codepoint] = self.upload(codepoint)
+      cell = self.cells[codepoint]
+      if cell is None:
+        continue
+
+      (sheet, u, v, advance) = cell
+      target.blt(x, y, sheet, u, v, self.cell_width, self.cell_height, self.BLANK_COLOR)
+      x += advance
+    target.pal()
+
+
+class PyxelPlatform(Platform):
+  def __init__(self) -> None:
+    import pyxel
+    for key in Key:
+      name = key.name if key.name.startswith(('MOUSE_', 'GAMEPAD')) else 'KEY_'+key.name
+      if getattr(pyxel, name) != key:
+        raise RuntimeError('pyxel {} {}'.format(name, getattr(pyxel, name)))
+    for color in Color:
+      if getattr(pyxel, 'COLOR_'+color.name) != color:
+        raise RuntimeError('pyxel COLOR_{} {}'.format(color.name, getattr(pyxel, 'COLOR_'+color.name)))
+    self.pyxel = pyxel
+    self.watch_keys: set[int] = set()
+    self.pushed_keys: set[int] = set()
+
+  def init(self, width: int, height: int, title: str, fps: int, quit_key: int) -> None:
+    self.pyxel.init(width=width, height=height, title=title, fps=fps, quit_key=quit_key)
+
+  def load(self, file_path: str) -> None:
+    self.pyxel.load(file_path)
+
+  def run(self, update: Callable[[], None], draw: Callable[[], None]) -> None:
+    self.pyxel.run(update, draw)
+
+  def quit(self) -> None:
+    self.pyxel.quit()
+
+  def time(self) -> float:
+    return time.perf_counter()
+
+  def poll(self) -> None:
+    for key in self.watch_keys:
+      if self.pyxel.btnp(key):
+        self.pushed_keys.add(key)
+
+  def consume(self) -> None:
+    self.pushed_keys.clear()
+
+  def cls(self, col: int) -> None:
+    self.pyxel.cls(col)
+    self.draw_count += 1
+
+  def blt(self, x: float, y: float, img: int | Any, u: float, v: float, w: float, h: float, colkey: int) -> None:
+    self.pyxel.blt(x=x, y=y, img=img, u=u, v=v, w=w, h=h, colkey=colkey)
+    self.draw_count += 1
+
+  def bltm(self, x: float, y: float, tm: int, u: float, v: float, w: float, h: float, colkey: int) -> None:
+    self.pyxel.bltm(x=x, y=y, tm=tm, u=u, v=v, w=w, h=h, colkey=colkey)
+    self.draw_count += 1
+
+  def text(self, x: float, y: float, s: str, col: int, font: Any) -> None:
+    if isinstance(font, PyxelGlyphFont):
+      font.draw(self.pyxel.screen, x, y, s, col)
+    else:
+      self.pyxel.text(x=x, y=y, s=s, col=col, font=font)
+    self.draw_count += 1
+
+  def font(self, file_path: str) -> Any:
+    if file_path.endswith(GlyphAtlas.EXTENSION):
+      return PyxelGlyphFont(GlyphAtlas.load(file_path))
+    return self.pyxel.Font(file_path) # type: ignore
+
+  def image(self, width: int, height: int) -> Any:
+    return self.pyxel.Image(width, height)
+
+  def image_rect(self, image: Any, x: float, y: float, w: float, h: float, col: int) -> None:
+    image.rect(x, y, w, h, col)
+    self.draw_count += 1
+
+  def image_text(self, image: Any, x: float, y: float, s: str, col: int, font: Any) -> None:
+    if isinstance(font, PyxelGlyphFont):
+      font.draw(image, x, y, s, col)
+    else:
+      image.text(x, y, s, col, font)
+    self.draw_count += 1
+
+  def btn(self, key: int) -> bool:
+    return self.pyxel.btn(key)
+
+  def btnp(self, key: int) -> bool:
+    if key not in self.watch_keys:
+      self.watch_keys.add(key)
+      if self.pyxel.btnp(key):
+        self.pushed_keys.add(key)
+    return key in self.pushed_keys
+
+  def play(self, ch: int, snd: int, loop: bool, resume: bool) -> None:
+    self.pyxel.play(ch, snd, loop=loop, resume=resume)
+
+  def playm(self, msc: int, loop: bool) -> None:
+    self.pyxel.playm(msc, loop=loop)
+
+  def stop(self, ch: int) -> None:
+    self.pyxel.stop(ch)
+
+  def play_pos(self, ch: int) -> Any | None:
+    return self.pyxel.play_pos(ch)
+
+  def set_sound(self, id: int, notes: str, tones: str, volumes: str, effects: str, speed: int) -> None:
+    self.pyxel.sounds[id].set(notes, tones, volumes, effects, speed)
+
+  def set_sound_data(self, id: int, notes: Sequence[int], tones: Sequence[int], volumes: Sequence[int], effects: Sequence[int], speed: int) -> None:
+    sound = self.pyxel.sounds[id]
+    sound.notes.from_list(notes)
+    sound.tones.from_list(tones)
+    sound.volumes.from_list(volumes)
+    sound.effects.from_list(effects)
+    sound.speed = speed
+
+
+class HeadlessPlatform(Platform):
+  def __init__(
+    self,
+    max_frame: int | None,
+    input_keys: Callable[[int], list[int]] | None,
+    draw: bool,
+    save: bool,
+  ) -> None:
+    self.max_frame = max_frame
+    self.input_keys = input_keys
+    self.draw = draw
+    self.save = save
+
+    self.fps = 1
+    self.frame_count = 0
+    self.running = False
+    self.keys: set[int] = set()
+    self.prev_keys: set[int] = set()
+    self.loop_channels: dict[int, int] = {}
+    self.draw_count = 0
+
+  @property
+  def can_save(self) -> bool:
+    return self.save
+
+  def init(self, width: int, height: int, title: str, fps: int, quit_key: int) -> None:
+    Logger.shared.info('headless init', width, height, title, fps)
+    self.fps = fps
+
+  def load(self, file_path: str) -> None:
+    pass
+
+  def press(self, keys: list[int]) -> None:
+    self.keys = set(keys)
+
+  def step(self, update: Callable[[], None], draw: Callable[[], None]) -> None:
+    if self.input_keys is not None:
+      self.press(self.input_keys(self.frame_count))
+
+    update()
+    if self.draw:
+      draw()
+
+    self.prev_keys = self.keys
+    self.frame_count += 1
+
+  def run(self, update: Callable[[], None], draw: Callable[[], None]) -> None:
+    self.running = True
+    while self.running:
+      if self.max_frame is not None and self.frame_count >= self.max_frame:
+        break
+      self.step(update, draw)
+    self.running = False
+
+  def quit(self) -> None:
+    self.running = False
+
+  def time(self) -> float:
+    return self.frame_count/self.fps
+
+  def cls(self, col: int) -> None:
+    self.draw_count += 1
+
+  def blt(self, x: float, y: float, img: int | Any, u: float, v: float, w: float, h: float, colkey: int) -> None:
+    self.draw_count += 1
+
+  def bltm(self, x: float, y: float, tm: int, u: float, v: float, w: float, h: float, colkey: int) -> None:
+    self.draw_count += 1
+
+  def text(self, x: float, y: float, s: str, col: int, font: Any) -> None:
+    self.draw_count += 1
+
+  def font(self, file_path: str) -> Any:
+    return None
+
+  def image(self, width: int, height: int) -> Any:
+    return None
+
+  def image_rect(self, image: Any, x: float, y: float, w: float, h: float, col: int) -> None:
+    self.draw_count += 1
+
+  def image_text(self, image: Any, x: float, y: float, s: str, col: int, font: Any) -> None:
+    self.draw_count += 1
+
+  def btn(self, key: int) -> bool:
+    return key in self.keys
+
+  def btnp(self, key: int) -> bool:
+    return key in self.keys and key not in self.prev_keys
+
+  def play(self, ch: int, snd: int, loop: bool, resume: bool) -> None:
+    if loop:
+      self.loop_channels[ch] = snd
+    elif not resume and ch in self.loop_channels:
+      del self.loop_channels[ch]
+
+  def playm(self, msc: int, loop: bool) -> None:
+    pass
+
+  def stop(self, ch: int) -> None:
+    if ch in self.loop_channels:
+      del self.loop_channels[ch]
+
+  def play_pos(self, ch: int) -> Any | None:
+    if ch in self.loop_channels:
+      return (self.loop_channels[ch], 0)
+    return None
+
+  def set_sound(self, id: int, notes: str, tones: str, volumes: str, effects: str, speed: int) -> None:
+    pass
+
+  def set_sound_data(self, id: int, notes: Sequence[int], tones: Sequence[int], volumes: Sequence[int], effects: Sequence[int], speed: int) -> None:
+    pass
+
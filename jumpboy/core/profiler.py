@@ -0,0 +1,66 @@
+from collections import deque
+from core import Logger
+import json
+import time
+
+
+class Profiler:
+  shared: 'Profiler'
+
+  WINDOW_SIZE = 300
+
+  @classmethod
+  def setup(cls, profiler: 'Profiler') -> None:
+    Profiler.shared = profiler
+    Logger.shared.info('profiler setup', profiler.enabled)
+
+  def __init__(self, enabled: bool, window_size: int) -> None:
+    self.enabled = enabled
+    self.window_size = window_size
+    self.samples: dict[str, deque[float]] = {}
+
+  def start(self) -> float | None:
+    if not self.enabled:
+      return None
+    return time.perf_counter()
+
+  def stop(self, key: str, start: float | None) -> None:
+    if start is not None:
+      self.record(key, (time.perf_counter()-start)*1000)
+
+  def record(self, key: str, value: float) -> None:
+    if not self.enabled:
+      return
+
+    if key not in self.samples:
+      self.samples[key] = deque(maxlen=self.window_size)
+    self.samples[key].append(value)
+
+  def percentile(self, key: str, rate: float) -> float:
+    if key not in self.samples or len(self.samples[key]) == 0:
+      return 0
+    values = sorted(self.samples[key])
+    return values[min(int(len(values)*rate), len(values)-1)]
+
+  def keys(self, prefix: str) -> list[str]:
+    return [key for key in self.samples.keys() if key.startswith(prefix)]
+
+  def to_json(self) -> dict:
+    return {
+      key: {
+        'count': len(values),
+        'p50': self.percentile(key, 0.5),
+        'p99': self.percentile(key, 0.99),
+        'max': max(values) if len(values) > 0 else 0,
+        'mean': sum(values)/len(values) if len(values) > 0 else 0,
+      }
+      for (key, values) in self.samples.items()
+    }
+
+  def dump(self, file_path: str) -> None:
+    with open(file_path, mode='w') as f:
+      json.dump(self.to_json(), f, indent=2)
+    Logger.shared.info('profiler dump', file_path)
+
+
+Profiler.setup(Profiler(False, Profiler.WINDOW_SIZE))
@@ -1,16 +1,25 @@
 from datetime import datetime
 from typing import Any, Callable, Generic, Self, TypeVar
-from core import Size, Path, Stopwatch, Timer, StringRes, Typewriter
+from core import Logger, Size, Path, Stopwatch, Timer, Platform, Profiler, StringRes, Typewriter
+import atexit
+import base64
 import json
 import os
-import pyxel
+import struct
+import threading
+import time
+try:
+  import sqlite3
+  sqlite3_import = True
+except:
+  sqlite3_import = False
 try:
   import js
-  print('pyodide loaded')
+  Logger.shared.info('pyodide loaded')
   js_import = True
 except:
   js_import = False
-  print('pyodide no loaded')
+  Logger.shared.info('pyodide no loaded')
 
 
 class GameConfig:
@@ -20,6 +29,7 @@ class GameConfig:
     title: str,
     window_size: Size,
     fps: int,
+    render_fps: int,
     copyright: str,
     released_year: int,
     debug: bool,
@@ -28,14 +38,554 @@ class GameConfig:
     self.title = title
     self.window_size = window_size
     self.fps = fps
+    self.render_fps = render_fps
     self.copyright = copyright
     self.released_year = released_year
     self.debug = debug
 
 
+class Journal:
+  TAIL_EXTENSION = '.jsonl'
+  CHECKPOINT_EXTENSION = '.checkpoint'
+  TEMP_EXTENSION = '.tmp'
+  SEQ_KEY = 'seq'
+
+  def __init__(self, name: str, compact_count: int) -> None:
+    self.name = name
+    self.compact_count = compact_count
+
+    self.seq = 0
+    self.tail_count = 0
+    self.loaded_folder: str | None = None
+
+  def tail_path(self, folder: str) -> str:
+    return os.path.join(folder, self.name+self.TAIL_EXTENSION)
+
+  def checkpoint_path(self, folder: str) -> str:
+    return os.path.join(folder, self.name+self.CHECKPOINT_EXTENSION)
+
+  @classmethod
+  def parse(cls, text: str, seq: int) -> tuple[list[dict], int]:
+    records: list[dict] = []
+    for line in text.splitlines():
+      if line.strip() == '':
+        continue
+
+      try:
+        record = json.loads(line)
+      except ValueError:
+        Logger.shared.warning('journal broken line', line)
+        continue
+
+      record_seq = record.pop(cls.SEQ_KEY, seq+1)
+      if record_seq <= seq:
+        continue
+      records.append(record)
+      seq = record_seq
+
+    return (records, seq)
+
+  @classmethod
+  def lines(cls, records: list[dict], seq: int) -> str:
+    return ''.join(['{}\n'.format(json.dumps({cls.SEQ_KEY: seq+index+1, **record})) for (index, record) in enumerate(records)])
+
+  def load(self, folder: str) -> list[dict]:
+    records: list[dict] = []
+    seq = 0
+
+    checkpoint_path = self.checkpoint_path(folder)
+    if os.path.exists(checkpoint_path):
+      with open(checkpoint_path, mode='r') as f:
+        checkpoint = json.load(f)
+      records = checkpoint['records']
+      seq = checkpoint[self.SEQ_KEY]
+
+    tail_count = 0
+    tail_path = self.tail_path(folder)
+    if os.path.exists(tail_path):
+      with open(tail_path, mode='r') as f:
+        (tail_records, seq) = self.parse(f.read(), seq)
+      records.extend(tail_records)
+      tail_count = len(tail_records)
+
+    self.seq = seq
+    self.tail_count = tail_count
+    self.loaded_folder = folder
+    Logger.shared.info('journal load', self.name, len(records), tail_count)
+    return records
+
+  def load_after(self, folder: str, seq: int) -> list[dict]:
+    text = ''
+    tail_path = self.tail_path(folder)
+    if os.path.exists(tail_path):
+      with open(tail_path, mode='r') as f:
+        text = f.read()
+
+    (records, tail_seq) = self.parse(text, seq)
+    if tail_seq-seq != len(records):
+      Logger.shared.info('journal gap', self.name, seq, tail_seq)
+      return self.load(folder)[seq:]
+
+    self.seq = tail_seq
+    self.tail_count = len([line for line in text.splitlines() if line.strip() != ''])
+    self.loaded_folder = folder
+    Logger.shared.info('journal load after', self.name, seq, len(records))
+    return records
+
+  def append(self, folder: str, records: list[dict]) -> None:
+    if self.loaded_folder != folder:
+      self.load(folder)
+
+    tail_path = self.tail_path(folder)
+    torn = False
+    if os.path.exists(tail_path) and os.path.getsize(tail_path) > 0:
+      with open(tail_path, mode='rb') as f:
+        f.seek(-1, os.SEEK_END)
+        torn = f.read(1) != b'\n'
+
+    with open(tail_path, mode='a') as f:
+      f.write(('\n' if torn else '')+self.lines(records, self.seq))
+      f.flush()
+      os.fsync(f.fileno())
+    self.seq += len(records)
+    self.tail_count += len(records)
+    Logger.shared.info('journal append', self.name, len(records), self.seq)
+
+    if self.tail_count >= self.compact_count:
+      self.compact(folder)
+
+  def compact(self, folder: str) -> None:
+    records = self.load(folder)
+    self.checkpoint(folder, records)
+    Logger.shared.info('journal compact', self.name, len(records), self.seq)
+
+  def rewrite(self, folder: str, records: list[dict]) -> None:
+    self.seq = len(records)
+    self.checkpoint(folder, records)
+    self.loaded_folder = folder
+    Logger.shared.info('journal rewrite', self.name, len(records))
+
+  def checkpoint(self, folder: str, records: list[dict]) -> None:
+    checkpoint_path = self.checkpoint_path(folder)
+    temp_path = checkpoint_path+self.TEMP_EXTENSION
+    with open(temp_path, mode='w') as f:
+      json.dump({self.SEQ_KEY: self.seq, 'records': records}, f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+    with open(self.tail_path(folder), mode='w') as f:
+      f.flush()
+      os.fsync(f.fileno())
+    self.tail_count = 0
+
+
+class SnapshotDocument:
+  EXTENSION = '.jbs'
+  MAGIC = b'JBSN'
+  HEADER_FORMAT = '<4sBxxxI'
+
+  def __init__(self, version: int, seq: int, payload: bytes | memoryview) -> None:
+    self.version = version
+    self.seq = seq
+    self.payload = payload
+
+  def encode(self) -> bytes:
+    return struct.pack(self.HEADER_FORMAT, self.MAGIC, self.version, self.seq)+self.payload
+
+  @classmethod
+  def file_name(cls) -> str:
+    return '{}{}'.format(datetime.now().timestamp(), cls.EXTENSION)
+
+  @classmethod
+  def decode(cls, data: bytes) -> 'SnapshotDocument | None':
+    header_size = struct.calcsize(cls.HEADER_FORMAT)
+    if len(data) < header_size:
+      return None
+    (magic, version, seq) = struct.unpack_from(cls.HEADER_FORMAT, data)
+    if magic != cls.MAGIC:
+      return None
+    return SnapshotDocument(version, seq, memoryview(data)[header_size:])
+
+
+class SnapshotStore:
+  def load(self, folder: str) -> tuple[SnapshotDocument | dict | None, list[dict]]:
+    raise RuntimeError()
+
+  def save(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    raise RuntimeError()
+
+  def migrate(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    raise RuntimeError()
+
+  def migrating(self, folder: str) -> bool:
+    return False
+
+  def records(self, folder: str, start: int, end: int) -> list[dict]:
+    raise RuntimeError()
+
+
+class FileSnapshotStore(SnapshotStore):
+  FILE_EXTENSIONS = [SnapshotDocument.EXTENSION, '.json']
+  TEMP_EXTENSION = '.tmp'
+
+  def __init__(self, max_file_count: int, journal: Journal) -> None:
+    self.max_file_count = max_file_count
+    self.journal = journal
+
+  @classmethod
+  def is_snapshot_file(cls, file: str) -> bool:
+    return os.path.splitext(file)[1] in cls.FILE_EXTENSIONS
+
+  def load(self, folder: str) -> tuple[SnapshotDocument | dict | None, list[dict]]:
+    if not os.path.exists(folder):
+      return (None, [])
+
+    files = sorted([file for file in os.listdir(folder) if self.is_snapshot_file(file)], reverse=True)
+    if len(files) > 0:
+      file_path = os.path.join(folder, files[0])
+      if file_path.endswith(SnapshotDocument.EXTENSION):
+        with open(file_path, mode='rb') as f:
+          document = SnapshotDocument.decode(f.read())
+        if document is not None:
+          Logger.shared.info('snapshot load', file_path, document.version, document.seq)
+          return (document, self.journal.load_after(folder, document.seq))
+        Logger.shared.warning('snapshot broken file', file_path)
+      else:
+        with open(file_path, mode='r') as f:
+          json_data = json.load(f)
+        Logger.shared.info('snapshot load', file_path, json_data)
+        return (json_data, self.journal.load(folder))
+
+    return (None, self.journal.load(folder))
+
+  def save(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    if len(records) > 0:
+      self.journal.append(folder, records)
+    elif self.journal.loaded_folder != folder:
+      self.journal.load(folder)
+    document.seq = self.journal.seq
+
+    files = os.listdir(folder)
+    for file in files:
+      if file.endswith(self.TEMP_EXTENSION):
+        Logger.shared.info('delete snapshot temp file', file)
+        os.remove(os.path.join(folder, file))
+    files = sorted([file for file in files if self.is_snapshot_file(file)])
+    delta_file_count = len(files)-self.max_file_count
+    for index in range(max(delta_file_count, 0)):
+      Logger.shared.info('delete snapshot old file', files[index])
+      os.remove(os.path.join(folder, files[index]))
+
+    file_path = os.path.join(folder, file_name)
+    temp_path = file_path+self.TEMP_EXTENSION
+    with open(temp_path, mode='wb') as f:
+      f.write(document.encode())
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+    Logger.shared.info('snapshot save', file_path, document.version, document.seq, len(document.payload))
+
+  def migrate(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    self.journal.rewrite(folder, records)
+    self.save(folder, file_name, document, [])
+
+  def records(self, folder: str, start: int, end: int) -> list[dict]:
+    records = self.journal.load(folder)
+    offset = self.journal.seq-len(records)
+    return records[max(start-offset, 0):max(end-offset, 0)]
+
+
+class SqliteSnapshotStore(SnapshotStore):
+  DATABASE_FILE = 'snapshot.sqlite3'
+  SESSION_TABLE = 'session'
+  SESSION_KEY = 'snapshot'
+
+  def __init__(
+    self,
+    table: str,
+    columns: dict[str, str],
+    indexes: list[list[str]],
+    legacy_store: FileSnapshotStore | None,
+  ) -> None:
+    self.table = table
+    self.columns = columns
+    self.indexes = indexes
+    self.legacy_store = legacy_store
+
+    self.lock = threading.Lock()
+    self.connection: Any = None
+    self.folder: str | None = None
+    self.legacy_folder: str | None = None
+
+  def connect(self, folder: str) -> Any:
+    if self.connection is not None and self.folder == folder:
+      return self.connection
+
+    if not os.path.exists(folder):
+      os.mkdir(folder)
+    connection = sqlite3.connect(os.path.join(folder, self.DATABASE_FILE), check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute('CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value BLOB NOT NULL)'.format(self.SESSION_TABLE))
+    connection.execute(
+      'CREATE TABLE IF NOT EXISTS {} (id INTEGER PRIMARY KEY, {})'.format(
+        self.table,
+        ', '.join(['{} {} NOT NULL'.format(name, type) for (name, type) in self.columns.items()]),
+      )
+    )
+    for index in self.indexes:
+      connection.execute(
+        'CREATE INDEX IF NOT EXISTS {}_{} ON {} ({})'.format(
+          self.table,
+          '_'.join([column.split()[0] for column in index]),
+          self.table,
+          ', '.join(index),
+        )
+      )
+    connection.commit()
+    Logger.shared.info('snapshot database connect', folder)
+
+    self.connection = connection
+    self.folder = folder
+    return connection
+
+  def load(self, folder: str) -> tuple[SnapshotDocument | dict | None, list[dict]]:
+    with self.lock:
+      connection = self.connect(folder)
+      row = connection.execute(
+        'SELECT value FROM {} WHERE key = ?'.format(self.SESSION_TABLE),
+        (self.SESSION_KEY,),
+      ).fetchone()
+
+    if row is not None:
+      if isinstance(row[0], bytes):
+        document = SnapshotDocument.decode(row[0])
+        if document is not None:
+          Logger.shared.info('snapshot load', self.DATABASE_FILE, document.version, document.seq)
+        return (document, [])
+
+      json_data = json.loads(row[0])
+      Logger.shared.info('snapshot load', self.DATABASE_FILE, json_data)
+      return (json_data, [])
+
+    if self.legacy_store is not None:
+      (data, records) = self.legacy_store.load(folder)
+      if data is not None or len(records) > 0:
+        Logger.shared.info('snapshot database legacy', len(records))
+        self.legacy_folder = folder
+        return (data, records)
+
+    return (None, [])
+
+  def save(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    self.write(folder, document, records, False)
+    Logger.shared.info('snapshot save', self.DATABASE_FILE, len(records), document.version, document.seq, len(document.payload))
+
+  def migrate(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    self.write(folder, document, records, True)
+    self.legacy_folder = None
+    Logger.shared.info('snapshot database migrate', len(records), document.seq)
+
+  def migrating(self, folder: str) -> bool:
+    return self.legacy_folder == folder
+
+  def write(self, folder: str, document: SnapshotDocument, records: list[dict], merge: bool) -> None:
+    names = list(self.columns.keys())
+    with self.lock:
+      connection = self.connect(folder)
+      with connection:
+        if merge:
+          connection.executemany(
+            'INSERT INTO {} ({}) SELECT {} WHERE NOT EXISTS (SELECT 1 FROM {} WHERE {})'.format(
+              self.table,
+              ', '.join(names),
+              ', '.join(['?']*len(names)),
+              self.table,
+              ' AND '.join(['{} = ?'.format(name) for name in names]),
+            ),
+            [[record[name] for name in names]*2 for record in records],
+          )
+        elif len(records) > 0:
+          connection.executemany(
+            'INSERT INTO {} ({}) VALUES ({})'.format(self.table, ', '.join(names), ', '.join(['?']*len(names))),
+            [[record[name] for name in names] for record in records],
+          )
+
+        (document.seq,) = connection.execute('SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()
+        connection.execute(
+          'INSERT OR REPLACE INTO {} (key, value) VALUES (?, ?)'.format(self.SESSION_TABLE),
+          (self.SESSION_KEY, document.encode()),
+        )
+
+  def records(self, folder: str, start: int, end: int) -> list[dict]:
+    if self.legacy_store is not None and self.migrating(folder):
+      return self.legacy_store.records(folder, start, end)
+
+    names = list(self.columns.keys())
+    with self.lock:
+      rows = self.connect(folder).execute(
+        'SELECT {} FROM {} ORDER BY id LIMIT ? OFFSET ?'.format(', '.join(names), self.table),
+        [max(end-start, 0), start],
+      ).fetchall()
+    return [dict(zip(names, row)) for row in rows]
+
+  def conditions(self, where: dict[str, Any], end: int | None) -> tuple[str, list[Any]]:
+    conditions = ['{} = ?'.format(name) for name in where.keys()]
+    values = list(where.values())
+    if end is not None:
+      conditions.append('id <= ?')
+      values.append(end)
+    return (' WHERE '+' AND '.join(conditions) if len(conditions) > 0 else '', values)
+
+  def select(self, folder: str, where: dict[str, Any], order: list[str], limit: int, offset: int, end: int | None = None) -> list[dict]:
+    names = list(self.columns.keys())
+    (conditions, values) = self.conditions(where, end)
+    with self.lock:
+      rows = self.connect(folder).execute(
+        'SELECT {} FROM {}{} ORDER BY {} LIMIT ? OFFSET ?'.format(
+          ', '.join(names),
+          self.table,
+          conditions,
+          ', '.join(order+['id']),
+        ),
+        [*values, limit, offset],
+      ).fetchall()
+    return [dict(zip(names, row)) for row in rows]
+
+  def count(self, folder: str, where: dict[str, Any], end: int | None = None) -> int:
+    (conditions, values) = self.conditions(where, end)
+    with self.lock:
+      row = self.connect(folder).execute(
+        'SELECT COUNT(*) FROM {}{}'.format(self.table, conditions),
+        values,
+      ).fetchone()
+    return row[0]
+
+
+class SnapshotWriter:
+  shared: 'SnapshotWriter'
+
+  @classmethod
+  def setup(cls, writer: 'SnapshotWriter') -> None:
+    if hasattr(SnapshotWriter, 'shared'):
+      SnapshotWriter.shared.flush()
+    else:
+      atexit.register(lambda: SnapshotWriter.shared.flush())
+    SnapshotWriter.shared = writer
+    Logger.shared.info('snapshot writer setup', type(writer.store).__name__)
+
+  def __init__(self, store: SnapshotStore) -> None:
+    self.store = store
+
+    self.condition = threading.Condition()
+    self.pending: tuple[str, str, Callable[[], SnapshotDocument], list[dict], Callable[[], None]] | None = None
+    self.failed: list[dict] = []
+    self.writing = False
+    self.worker: threading.Thread | None = None
+    self.worker_enabled = True
+
+  def submit(
+    self,
+    folder: str,
+    file_name: str,
+    document: Callable[[], SnapshotDocument],
+    records: list[dict],
+    saved: Callable[[], None],
+  ) -> None:
+    with self.condition:
+      if self.pending is not None:
+        Logger.shared.debug('snapshot save coalesce', self.pending[1], file_name)
+        records = self.pending[3]+records
+      elif len(self.failed) > 0:
+        Logger.shared.info('snapshot save retry', len(self.failed))
+        records = self.failed+records
+        self.failed = []
+      self.pending = (folder, file_name, document, records, saved)
+      self.condition.notify_all()
+
+    if self.worker is None and self.worker_enabled:
+      try:
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+      except RuntimeError:
+        self.worker = None
+        self.worker_enabled = False
+        Logger.shared.info('snapshot writer thread disabled')
+
+    if self.worker is None:
+      self.write_pending()
+
+  def run(self) -> None:
+    while True:
+      with self.condition:
+        while self.pending is None:
+          self.condition.wait()
+      self.write_pending()
+
+  def write_pending(self) -> None:
+    with self.condition:
+      if self.pending is None:
+        return
+      (folder, file_name, document, records, saved) = self.pending
+      self.pending = None
+      self.writing = True
+
+    try:
+      if not os.path.exists(folder):
+        os.mkdir(folder)
+      self.store.save(folder, file_name, document(), records)
+      saved()
+    except Exception as e:
+      Logger.shared.error('snapshot save failed', file_name, e)
+      with self.condition:
+        if self.pending is not None:
+          self.pending = (*self.pending[:3], records+self.pending[3], self.pending[4])
+        else:
+          self.failed = records
+    finally:
+      with self.condition:
+        self.writing = False
+        self.condition.notify_all()
+
+  def flush(self) -> None:
+    with self.condition:
+      while self.pending is not None or self.writing:
+        self.condition.wait()
+
+  def load(self, folder: str) -> tuple[SnapshotDocument | dict | None, list[dict]]:
+    self.flush()
+    return self.store.load(folder)
+
+  def migrate(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    self.flush()
+    try:
+      if not os.path.exists(folder):
+        os.mkdir(folder)
+      self.store.migrate(folder, file_name, document, records)
+    except Exception as e:
+      Logger.shared.error('snapshot migrate failed', file_name, e)
+
+  def records(self, folder: str, start: int, end: int) -> list[dict]:
+    self.flush()
+    return self.store.records(folder, start, end)
+
+
 class Snapshot:
   SNAPSHOT_NAME = 'snapshot'
   FILE_MAX_COUNT = 5
+  JOURNAL_NAME = 'journal'
+  JOURNAL_COMPACT_COUNT = 100
+  VERSION = 1
+  MIGRATIONS: dict[int, Callable[[bytes], bytes]] = {}
+
+  def __init__(self) -> None:
+    self.journal_count = 0
+    self.submitted_count = 0
+
+  @classmethod
+  def file_store(cls) -> FileSnapshotStore:
+    return FileSnapshotStore(cls.FILE_MAX_COUNT, Journal(cls.JOURNAL_NAME, cls.JOURNAL_COMPACT_COUNT))
 
   def folder(self, path: Path) -> str:
     return os.path.join(path.root, self.SNAPSHOT_NAME)
@@ -46,57 +596,123 @@ class Snapshot:
   def from_json(self, data: dict) -> None:
     raise RuntimeError()
 
+  def encoder(self, history: bool) -> Callable[[], bytes]:
+    raise RuntimeError()
+
+  def from_bytes(self, data: memoryview, seq: int) -> None:
+    raise RuntimeError()
+
+  def journal(self, start: int) -> list[dict]:
+    return []
+
+  def journal_end(self) -> int:
+    return 0
+
+  def from_journal(self, records: list[dict]) -> None:
+    pass
+
+  def journaled(self) -> bool:
+    return True
+
+  def document(self, history: bool) -> SnapshotDocument:
+    return SnapshotDocument(self.VERSION, self.submitted_count, self.encoder(history)())
+
+  def from_document(self, document: SnapshotDocument) -> None:
+    if document.version > self.VERSION:
+      Logger.shared.warning('snapshot version unsupported', document.version, self.VERSION)
+      return
+
+    payload = document.payload
+    for version in range(document.version, self.VERSION):
+      if version not in self.MIGRATIONS:
+        Logger.shared.warning('snapshot migration missing', version, self.VERSION)
+        return
+      payload = self.MIGRATIONS[version](bytes(payload))
+      Logger.shared.info('snapshot migrate', version, version+1)
+    self.from_bytes(memoryview(payload), document.seq)
+
   def save(self, path: Path) -> None:
+    if not Platform.shared.can_save:
+      Logger.shared.debug('snapshot save skipped')
+      return
+
+    records = self.journal(self.submitted_count)
+    self.submitted_count += len(records)
+    end = self.submitted_count
+
     if js_import:
-      json_data = self.to_json()
-      print('snapshot save', json_data)
-      js.window.localStorage.setItem(self.SNAPSHOT_NAME, json.dumps(json_data))
+      document = self.document(True)
+      Logger.shared.info('snapshot save', document.version, document.seq, len(document.payload))
+      js.window.localStorage.setItem(self.SNAPSHOT_NAME, base64.b64encode(document.encode()).decode('ascii'))
+      js.window.localStorage.removeItem('{}.{}'.format(self.SNAPSHOT_NAME, self.JOURNAL_NAME))
+      self.saved(end)
     else:
-      folder = self.folder(path)
-      print('snapshot folder', folder)
-      if not os.path.exists(folder):
-        os.mkdir(folder)
-
-      if os.path.exists(folder):
-        files = os.listdir(folder)
-        delta_file_count = len(files)-self.FILE_MAX_COUNT
-        if delta_file_count > 0:
-          files = sorted(files)
-          for index in range(delta_file_count):
-            print('delete snapshot old file', files[index])
-            os.remove(os.path.join(folder, files[index]))
-
-      file_path = os.path.join(folder, '{}.json'.format(datetime.now().timestamp()))
-      with open(file_path, mode='w') as f:
-        json_data = self.to_json()
-        print('snapshot save', file_path, json_data)
-        json.dump(json_data, f)
+      encode = self.encoder(False)
+      SnapshotWriter.shared.submit(
+        self.folder(path),
+        SnapshotDocument.file_name(),
+        lambda: SnapshotDocument(self.VERSION, end, encode()),
+        records,
+        lambda: self.saved(end),
+      )
+
+  def saved(self, end: int) -> None:
+    self.journal_count = end
 
   def load(self, path: Path) -> None:
+    if not Platform.shared.can_save:
+      Logger.shared.debug('snapshot load skipped')
+      return
+
+    data: SnapshotDocument | dict | None = None
+    records: list[dict] = []
     if js_import:
-      json_str = js.window.localStorage.getItem(self.SNAPSHOT_NAME)
-      if json_str is not None and json_str != '':
-        json_data = json.loads(json_str)
-        print('snapshot load', json_data)
-        self.from_json(json_data)
+      data_str = js.window.localStorage.getItem(self.SNAPSHOT_NAME)
+      if data_str is not None and data_str.startswith('{'):
+        data = json.loads(data_str)
+      elif data_str is not None and data_str != '':
+        data = SnapshotDocument.decode(base64.b64decode(data_str))
+
+      journal_str = js.window.localStorage.getItem('{}.{}'.format(self.SNAPSHOT_NAME, self.JOURNAL_NAME))
+      if journal_str is not None:
+        (records, _) = Journal.parse(journal_str, data.seq if isinstance(data, SnapshotDocument) else 0)
     else:
-      files = []
       folder = self.folder(path)
-      print('snapshot folder', folder)
+      Logger.shared.info('snapshot folder', folder)
+      (data, records) = SnapshotWriter.shared.load(folder)
 
-      if os.path.exists(folder):
-        files = os.listdir(folder)
+    if isinstance(data, SnapshotDocument):
+      Logger.shared.info('snapshot load', data.version, data.seq, len(data.payload))
+      self.from_document(data)
+    elif data is not None:
+      Logger.shared.info('snapshot load', data)
+      self.from_json(data)
 
-      if len(files) > 0:
-        files = sorted(files, reverse=True)
-        file_path = os.path.join(self.folder(path), files[0])
-        with open(file_path, mode='r') as f:
-          json_data = json.load(f)
-          print('snapshot load', file_path, json_data)
-          self.from_json(json_data)
+    self.from_journal(records)
+    self.journal_count = self.submitted_count = self.journal_end()
+
+    if not js_import and (not self.journaled() or SnapshotWriter.shared.store.migrating(self.folder(path))):
+      Logger.shared.info('snapshot history migrate', self.journal_count)
+      SnapshotWriter.shared.migrate(self.folder(path), SnapshotDocument.file_name(), self.document(False), self.journal(0))
+
+  def export_json(self, file_path: str) -> None:
+    with open(file_path, mode='w') as f:
+      json.dump(self.to_json(), f)
+    Logger.shared.info('snapshot export', file_path)
+
+  def import_json(self, file_path: str) -> None:
+    with open(file_path, mode='r') as f:
+      self.from_json(json.load(f))
+    self.journal_count = self.submitted_count = self.journal_end()
+    Logger.shared.info('snapshot import', file_path)
+
+
+SnapshotWriter.setup(SnapshotWriter(Snapshot.file_store()))
 
 
 class Seq:
+  STATE_FORMAT = '??'+Timer.STATE_FORMAT
+
   def __init__(
     self,
     stopwatch: Stopwatch,
@@ -119,6 +735,19 @@ class TimeSeq:
   def ended(self) -> bool:
     return len(list(filter(lambda x: not x.ended, self.seqs))) == 0
 
+  @property
+  def state_format(self) -> str:
+    return Seq.STATE_FORMAT*len(self.seqs)
+
+  def state(self) -> tuple:
+    return tuple([value for seq in self.seqs for value in (seq.started, seq.ended, *seq.timer.state())])
+
+  def restore(self, state: tuple, index: int) -> int:
+    for seq in self.seqs:
+      (seq.started, seq.ended) = state[index:index+2]
+      index = seq.timer.restore(state, index+2)
+    return index
+
   def update(self) -> Any | None:
     for seq in self.seqs:
       if not seq.ended:
@@ -138,6 +767,38 @@ class TimeSeq:
     return None
 
 
+class SceneNode:
+  def __init__(self, inputs: Callable[[], Any], build: Callable[[Any], Any | None]) -> None:
+    self.inputs = inputs
+    self.build = build
+
+    self.built = False
+    self.last_inputs: Any = None
+    self.subject: Any | None = None
+
+  def invalidate(self) -> None:
+    self.built = False
+
+  def draw(self, transparent_color: int) -> None:
+    inputs = self.inputs()
+    if not self.built or inputs != self.last_inputs:
+      self.subject = self.build(inputs)
+      self.last_inputs = inputs
+      self.built = True
+
+    if self.subject is not None:
+      self.subject.draw(transparent_color)
+
+
+class SubjectGroup:
+  def __init__(self, subjects: Callable[[], list[Any]]) -> None:
+    self.subjects = subjects
+
+  def draw(self, transparent_color: int) -> None:
+    for subject in self.subjects():
+      subject.draw(transparent_color)
+
+
 TSnapshot = TypeVar('TSnapshot', bound='Snapshot')
 
 class Scene(Generic[TSnapshot]):
@@ -163,13 +824,25 @@ class Scene(Generic[TSnapshot]):
   def update(self) -> Self | Any:
     self.stopwatch.update()
 
+    start = Profiler.shared.start()
     res = self.time_seq.update()
+    Profiler.shared.stop('time_seq', start)
     if res is not None:
-      print('next scene', vars(res))
+      Logger.shared.debug('next scene', type(res).__name__)
       return res
 
-    for variation in self.updating_variations:
-      variation.update(self.stopwatch, self.snapshot)
+    if Profiler.shared.enabled:
+      costs: dict[str, float] = {}
+      for variation in self.updating_variations:
+        start_sec = time.perf_counter()
+        variation.update(self.stopwatch, self.snapshot)
+        name = 'variation.{}'.format(type(variation).__name__)
+        costs[name] = costs.get(name, 0)+(time.perf_counter()-start_sec)*1000
+      for (name, cost) in costs.items():
+        Profiler.shared.record(name, cost)
+    else:
+      for variation in self.updating_variations:
+        variation.update(self.stopwatch, self.snapshot)
 
     return self
 
@@ -178,7 +851,13 @@ class Scene(Generic[TSnapshot]):
     raise RuntimeError()
 
   def draw(self, transparent_color: int) -> None:
-    pyxel.cls(transparent_color)
+    start = Profiler.shared.start()
+    draw_count = Platform.shared.draw_count
+
+    Platform.shared.cls(transparent_color)
 
     for subject in self.drawing_subjects:
       subject.draw(transparent_color)
+
+    Profiler.shared.stop('draw.{}'.format(type(self).__name__), start)
+    Profiler.shared.record('draw_call', Platform.shared.draw_count-draw_count)
@@ -1,29 +1,37 @@
-from random import randint
+from random import Random
 from typing import Self
+from core import Logger
 import os
 
 
 class Coordinate:
+  __slots__ = ('x', 'y')
+
   def __init__(self, x: float, y: float) -> None:
     self.x = x
     self.y = y
 
 
 class Size:
+  __slots__ = ('width', 'height', 'half')
+
   def __init__(self, width: float, height: float) -> None:
     self.width = width
     self.height = height
+    self.half: Coordinate | None = None
 
   @property
   def center(self) -> Coordinate:
-    return Coordinate(self.width/2, self.height/2)
+    if self.half is None:
+      self.half = Coordinate(self.width/2, self.height/2)
+    return self.half
 
 
 class Path:
   def __init__(self, file_path: str, asset_folder: str) -> None:
     self.root = os.path.abspath(os.path.join(os.path.abspath(file_path), os.pardir))
     self.asset_folder = asset_folder
-    print('root path', self.root, self.asset_folder)
+    Logger.shared.info('root path', self.root, self.asset_folder)
 
   @property
   def asset_path(self) -> str:
@@ -31,9 +39,19 @@ class Path:
 
 
 class Stopwatch:
+  STATE_FORMAT = 'I'
+
   def __init__(self, fps: int) -> None:
     self.fps = fps
     self.frame = 0
+    self.interpolation = 1.0
+
+  def state(self) -> tuple:
+    return (self.frame,)
+
+  def restore(self, state: tuple, index: int) -> int:
+    self.frame = state[index]
+    return index+1
 
   def msec_from_frame(self, frame: int) -> int:
     return int(1/self.fps*frame*1000)
@@ -51,12 +69,30 @@ class Stopwatch:
 
 
 class Timer:
+  STATE_FORMAT = '?i?ii'
+
   def __init__(self, stopwatch: Stopwatch) -> None:
     self.stopwatch = stopwatch
     self.first_frame: int | None = None
     self.limit_msec: int | None = None
     self.offset_msec = 0
 
+  def state(self) -> tuple:
+    return (
+      self.first_frame is not None,
+      self.first_frame if self.first_frame is not None else 0,
+      self.limit_msec is not None,
+      self.limit_msec if self.limit_msec is not None else 0,
+      self.offset_msec,
+    )
+
+  def restore(self, state: tuple, index: int) -> int:
+    (running, first_frame, limited, limit_msec, offset_msec) = state[index:index+5]
+    self.first_frame = first_frame if running else None
+    self.limit_msec = limit_msec if limited else None
+    self.offset_msec = offset_msec
+    return index+5
+
   @classmethod
   def set_timer(cls, stopwatch: Stopwatch, start: bool) -> Self:
     timer = cls(stopwatch)
@@ -112,8 +148,39 @@ class Timer:
 
 
 class Dice:
+  RANDOM_STATE_SIZE = 625
+  STATE_FORMAT = '{}I?d'.format(RANDOM_STATE_SIZE)
+
+  seed = 0
+  random = Random(0)
+
+  @classmethod
+  def setup(cls, seed: int) -> None:
+    Dice.seed = seed
+    Dice.random = Random(seed)
+    Logger.shared.info('dice setup', seed)
+
+  @classmethod
+  def new_seed(cls) -> int:
+    return int.from_bytes(os.urandom(4), 'little')
+
+  @classmethod
+  def state(cls) -> tuple:
+    (_, random_state, gauss_next) = cls.random.getstate()
+    return (*random_state, gauss_next is not None, gauss_next if gauss_next is not None else 0.0)
+
+  @classmethod
+  def restore(cls, state: tuple, index: int) -> int:
+    random_state = state[index:index+cls.RANDOM_STATE_SIZE]
+    (gaussed, gauss_next) = state[index+cls.RANDOM_STATE_SIZE:index+cls.RANDOM_STATE_SIZE+2]
+    cls.random.setstate((Random.VERSION, random_state, gauss_next if gaussed else None))
+    return index+cls.RANDOM_STATE_SIZE+2
+
   @classmethod
   def spin(cls, max: int) -> int:
-    value = randint(0, max)
-    print('dice roll', max, value)
+    value = cls.random.randint(0, max)
+    Logger.shared.debug('dice roll', max, value)
     return value
+
+
+Dice.setup(Dice.new_seed())
@@ -3,7 +3,7 @@ from core import (
   Coordinate, Size, Stopwatch, Dice,
   AssetImageId, Image, TileMap,
   Collision, Block, Obstacle,
-  GameConfig,
+  GameConfig, Color,
 )
 from component import (
   GameLevel, Field, Jumper, Ball,
@@ -11,6 +11,14 @@ from component import (
 import math
 
 
+GAME_WINDOW_SIZE = Size(160, 120)
+FPS = 30
+RENDER_FPS = 30
+ASSET_FOLDER = 'assets'
+ASSET_FILE = 'jumpboy.pyxres'
+TRANSPARENT_COLOR = Color.BLACK
+
+
 class TileId:
   FIELD = AssetImageId(0, 0)
 
@@ -25,6 +33,11 @@ class SoundId:
   SCENE = 20
   BGM = 60
 
+class SoundPriority(IntEnum):
+  BALL = 0
+  JUMPER = 1
+  SCENE = 2
+
 class GameLevelMode(IntEnum):
   # boy
   NORMAL = 0
@@ -59,12 +72,30 @@ class GameDesign:
     CLAY = 2
     WOOD = 3
 
+  PREV_PARAM_STATE_COUNT = 2
+  STATE_FORMAT = 'B'+Ball.Param.STATE_FORMAT*PREV_PARAM_STATE_COUNT
+
   def __init__(self) -> None:
     self.prev_params: list[Ball.Param] = []
 
   def clear(self) -> None:
     self.prev_params = []
 
+  def state(self) -> tuple:
+    prev_params = self.prev_params[-self.PREV_PARAM_STATE_COUNT:]
+    empty_params = [Ball.Param(0, 0, 0, 0, {})]*(self.PREV_PARAM_STATE_COUNT-len(prev_params))
+    return (len(prev_params), *[value for param in prev_params+empty_params for value in param.state()])
+
+  def restore(self, state: tuple, index: int) -> int:
+    count = state[index]
+    index += 1
+    self.prev_params = []
+    for param_index in range(self.PREV_PARAM_STATE_COUNT):
+      (param, index) = Ball.Param.from_state(state, index)
+      if param_index < count:
+        self.prev_params.append(param)
+    return index
+
   def first_level(self, config: GameConfig) -> GameLevel:
     if config.debug:
       return GameLevel(GameLevelMode.NORMAL, GameLevelStage.STAGE_1)
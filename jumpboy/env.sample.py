@@ -1,3 +1,4 @@
 DEBUG = False
 COPYRIGHT = 'MY NAME'
 RELEASED_YEAR = 2024
+SQLITE = False
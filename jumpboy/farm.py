@@ -0,0 +1,230 @@
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from random import Random
+from statistics import mean, median, quantiles
+import json
+from core import Key
+from component import GameLevel
+from design import FPS, GameLevelMode, GameLevelStage
+from scene import GameOverScene, StageClearScene
+from simulator import Simulator
+
+
+FARM_MARGIN_SEC = 20
+
+
+class InputPolicy:
+  def keys(self, frame: int) -> list[int]:
+    raise RuntimeError()
+
+
+class ScriptedPolicy(InputPolicy):
+  def __init__(self, interval: int, hold: int) -> None:
+    self.interval = max(interval, 2)
+    self.hold = min(max(hold, 1), self.interval-1)
+
+  def keys(self, frame: int) -> list[int]:
+    return [Key.RETURN] if frame%self.interval < self.hold else []
+
+
+class RandomPolicy(InputPolicy):
+  def __init__(self, rate: float, hold: int, seed: int) -> None:
+    self.rate = rate
+    self.hold = max(hold, 1)
+    self.random = Random(seed)
+    self.remain = 0
+
+  def keys(self, frame: int) -> list[int]:
+    if self.remain > 0:
+      self.remain -= 1
+      return [Key.RETURN]
+
+    if self.random.random() < self.rate:
+      self.remain = self.hold-1
+      return [Key.RETURN]
+
+    return []
+
+
+class AttemptTask:
+  def __init__(self, mode: int, stage: int, seed: int, policy: InputPolicy, verbose: bool) -> None:
+    self.mode = mode
+    self.stage = stage
+    self.seed = seed
+    self.policy = policy
+    self.verbose = verbose
+
+
+class AttemptResult:
+  def __init__(self, mode: int, stage: int, survived: bool, point: int, damage: int, play_msec: int) -> None:
+    self.mode = mode
+    self.stage = stage
+    self.survived = survived
+    self.point = point
+    self.damage = damage
+    self.play_msec = play_msec
+
+
+def play_attempt(task: AttemptTask) -> AttemptResult | None:
+  simulator = Simulator(
+    max_frame=None,
+    input_keys=task.policy.keys,
+    draw=False,
+    save=False,
+    debug=task.verbose,
+    seed=task.seed,
+    rollback_interval=None,
+  )
+  simulator.start_level(GameLevel(task.mode, task.stage))
+
+  limit_msec = simulator.scene.snapshot.design.play_limit_msec(simulator.scene.snapshot.level)
+  max_frame = int((limit_msec/1000+FARM_MARGIN_SEC)*FPS)
+  for _ in range(max_frame):
+    simulator.step(1)
+
+    scene = simulator.scene
+    if isinstance(scene, GameOverScene) or isinstance(scene, StageClearScene):
+      jumper = scene.snapshot.jumper
+      return AttemptResult(
+        mode=task.mode,
+        stage=task.stage,
+        survived=isinstance(scene, StageClearScene),
+        point=scene.point,
+        damage=jumper.param.max_life-jumper.life,
+        play_msec=scene.play_timer.msec if scene.play_timer is not None else 0,
+      )
+
+  return None
+
+
+class StageReport:
+  def __init__(self, mode: int, stage: int) -> None:
+    self.mode = mode
+    self.stage = stage
+    self.results: list[AttemptResult] = []
+    self.timeouts = 0
+
+  @property
+  def name(self) -> str:
+    return '{}.{:02}'.format(GameLevelMode(self.mode).name, self.stage+1)
+
+  @classmethod
+  def distribution(cls, values: list[float]) -> dict:
+    if len(values) == 0:
+      return {}
+
+    points = quantiles(values, n=10) if len(values) > 1 else [values[0]]*9
+    return {
+      'min': min(values),
+      'p10': points[0],
+      'median': median(values),
+      'p90': points[-1],
+      'max': max(values),
+      'mean': mean(values),
+    }
+
+  def to_json(self) -> dict:
+    deaths = [result for result in self.results if not result.survived]
+    return {
+      'mode': self.mode,
+      'stage': self.stage,
+      'attempts': len(self.results),
+      'timeouts': self.timeouts,
+      'survival_rate': (len(self.results)-len(deaths))/len(self.results) if len(self.results) > 0 else 0,
+      'point': self.distribution([result.point for result in self.results]),
+      'damage': self.distribution([result.damage for result in self.results]),
+      'death_msec': self.distribution([result.play_msec for result in deaths]),
+    }
+
+
+class SimulationFarm:
+  def __init__(
+    self,
+    attempts: int,
+    policy: str,
+    interval: int,
+    rate: float,
+    hold: int,
+    seed: int,
+    processes: int | None,
+    verbose: bool,
+  ) -> None:
+    self.attempts = attempts
+    self.policy = policy
+    self.interval = interval
+    self.rate = rate
+    self.hold = hold
+    self.seed = seed
+    self.processes = processes
+    self.verbose = verbose
+
+  def input_policy(self, seed: int) -> InputPolicy:
+    if self.policy == 'random':
+      return RandomPolicy(self.rate, self.hold, seed)
+    return ScriptedPolicy(self.interval, self.hold)
+
+  def tasks(self) -> list[AttemptTask]:
+    tasks: list[AttemptTask] = []
+    for mode in GameLevelMode:
+      for stage in GameLevelStage:
+        for attempt in range(self.attempts):
+          seed = self.seed+(mode*len(GameLevelStage)+stage)*self.attempts+attempt
+          tasks.append(AttemptTask(mode, stage, seed, self.input_policy(seed), self.verbose))
+    return tasks
+
+  def run(self) -> list[StageReport]:
+    reports: dict[tuple[int, int], StageReport] = {}
+    for mode in GameLevelMode:
+      for stage in GameLevelStage:
+        reports[(mode, stage)] = StageReport(mode, stage)
+
+    tasks = self.tasks()
+    with Pool(processes=self.processes) as pool:
+      for (task, result) in zip(tasks, pool.imap(play_attempt, tasks, chunksize=max(self.attempts//4, 1))):
+        report = reports[(task.mode, task.stage)]
+        if result is None:
+          report.timeouts += 1
+        else:
+          report.results.append(result)
+
+    return list(reports.values())
+
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='play every stage many times to balance game design')
+  parser.add_argument('--attempts', type=int, default=20)
+  parser.add_argument('--policy', choices=['scripted', 'random'], default='random')
+  parser.add_argument('--interval', type=int, default=FPS)
+  parser.add_argument('--rate', type=float, default=0.05)
+  parser.add_argument('--hold', type=int, default=4)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--processes', type=int, default=None)
+  parser.add_argument('--output', type=str, default=None)
+  parser.add_argument('--verbose', action='store_true')
+  args = parser.parse_args()
+
+  farm = SimulationFarm(
+    attempts=args.attempts,
+    policy=args.policy,
+    interval=args.interval,
+    rate=args.rate,
+    hold=args.hold,
+    seed=args.seed,
+    processes=args.processes,
+    verbose=args.verbose,
+  )
+  reports = farm.run()
+
+  for report in reports:
+    data = report.to_json()
+    print('{:10} survival {:6.1%} point {:8.1f} damage {:4.2f} death {:8.0f} msec'.format(
+      report.name,
+      data['survival_rate'],
+      data['point']['mean'] if 'mean' in data['point'] else 0,
+      data['damage']['mean'] if 'mean' in data['damage'] else 0,
+      data['death_msec']['mean'] if 'mean' in data['death_msec'] else 0,
+    ))
+
+  if args.output is not None:
+    with open(args.output, mode='w') as f:
+      json.dump([report.to_json() for report in reports], f, indent=2)
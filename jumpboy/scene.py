@@ -2,28 +2,28 @@ from datetime import datetime
 from enum import IntEnum
 from typing import Any, Self
 from core import (
-  Coordinate, Size, Stopwatch, Timer,
+  Logger, Coordinate, Size, Dice, Stopwatch, Timer, Profiler, Color,
   Language, StringRes, Image, AssetSound, RawBgm,
   Typewriter, Text, BlinkText,
   Poster, Signboard,
-  GameConfig, Seq, TimeSeq, MusicBox, Scene,
+  GameConfig, Seq, TimeSeq, MusicBox, Scene, SceneNode, SubjectGroup, CollisionIndex,
 )
 from component import (
   GamePad,
   GameLevel, Score, ScoreBoard,
-  Ball, Jumper, Field,
+  Ball, Jumper, Field, CollisionGroup,
   Snapshot as BaseSnapshot,
 )
 from design import (
-  ImageId, SoundId,
+  ImageId, SoundId, SoundPriority,
   GameLevelMode, GameLevelStage,
   GameDesign,
 )
-import pyxel
+import struct
 
 
 TEXT_FONT_SIZE = 10
-TEXT_COLOR = pyxel.COLOR_WHITE
+TEXT_COLOR = Color.WHITE
 
 GAME_TITLE: dict[int, str] = {
   GameLevelMode.NORMAL: 'game_title_1',
@@ -35,6 +35,8 @@ SCORE: dict[int, str] = {
 }
 
 SCORE_RANKING_NUM = 3
+SCORE_HISTORY_RETENTION = 10000
+PROFILER_VARIATION_NUM = 4
 
 BGM_FOLDER = 'bgm'
 BGM_EXCLUDE_PLAY_CHANNEL = [AssetSound.channel_count()-1]
@@ -52,6 +54,12 @@ class SceneSound:
   TITLE = SoundId.SCENE+9
   POINT = SoundId.SCENE+10
 
+SE_PRIORITIES: dict[int, int] = {
+  **{id: SoundPriority.JUMPER for id in range(SoundId.JUMPER, SoundId.BALL)},
+  **{id: SoundPriority.BALL for id in range(SoundId.BALL, SoundId.SCENE)},
+  **{id: SoundPriority.SCENE for id in range(SoundId.SCENE, SoundId.BGM)},
+}
+
 TITLE_BGM: dict[int, str] = {
   GameLevelMode.NORMAL: 'title1',
   GameLevelMode.HARD: 'title2',
@@ -112,6 +120,16 @@ class BaseScene(Scene[Snapshot]):
       snapshot=snapshot,
     )
 
+    self.nodes: list[Any] = [
+      SceneNode(lambda: self.snapshot.field, lambda field: field),
+      SubjectGroup(lambda: self.snapshot.balls),
+      SceneNode(lambda: self.snapshot.jumper, lambda jumper: jumper),
+    ]
+
+    if self.config.debug:
+      self.nodes.append(SceneNode(lambda: self.stopwatch.msec, self.stopwatch_text))
+      self.nodes.append(SceneNode(self.profiler_lines, self.profiler_texts))
+
   def menu_left_top_origin(self) -> Coordinate:
     return Coordinate(0, 0)
 
@@ -141,7 +159,8 @@ class BaseScene(Scene[Snapshot]):
     )
 
   def menu_middle_center(self) -> Coordinate:
-    return self.config.window_size.center
+    center = self.config.window_size.center
+    return Coordinate(center.x, center.y)
 
   def menu_middle_low_center(self) -> Coordinate:
     return Coordinate(
@@ -179,6 +198,14 @@ class BaseScene(Scene[Snapshot]):
       bold=False,
     )
 
+  def centered_text(self, string: str | None, center: Coordinate) -> Text | None:
+    if string is None:
+      return None
+
+    text = self.text(string)
+    text.center = center
+    return text
+
   def blink_text(self, string: str, blink_msec: int, show: bool) -> BlinkText:
     return BlinkText(
       typewriter=self.typewriter,
@@ -193,7 +220,7 @@ class BaseScene(Scene[Snapshot]):
 
   def initial_sprites(self, reset: bool) -> None:
     self.snapshot.field = self.snapshot.design.field(self.snapshot.level, self.config)
-    print('field', self.snapshot.field.id)
+    Logger.shared.debug('field', self.snapshot.field.id)
 
     self.snapshot.balls = []
 
@@ -202,7 +229,7 @@ class BaseScene(Scene[Snapshot]):
     if not reset:
       self.snapshot.jumper.life = life
 
-    print('jumper', self.snapshot.jumper.id)
+    Logger.shared.debug('jumper', self.snapshot.jumper.id)
     self.snapshot.jumper.origin = self.jumper_ready_origin(self.snapshot.jumper)
 
   def to_next_level(cls, level: GameLevel) -> GameLevel | None:
@@ -212,7 +239,7 @@ class BaseScene(Scene[Snapshot]):
         index += 1
         if index < len(stages):
           next_stage = stages[index]
-          print('next stage', next_stage)
+          Logger.shared.info('next stage', next_stage)
           return GameLevel(level.mode, next_stage)
 
     levels = [e for e in GameLevelMode]
@@ -221,10 +248,10 @@ class BaseScene(Scene[Snapshot]):
         index += 1
         if index < len(levels):
           next_level = levels[index]
-          print('next stage', next_level)
+          Logger.shared.info('next stage', next_level)
           return GameLevel(next_level, GameLevelStage.STAGE_1)
 
-    print('next level none')
+    Logger.shared.info('next level none')
     return None
 
   def string(self, key: str) -> str:
@@ -232,36 +259,72 @@ class BaseScene(Scene[Snapshot]):
 
   @property
   def updating_variations(self) -> list[Any]:
-    variations: list[Any] = [ball for ball in self.snapshot.balls]
+    variations: list[Any] = [self.snapshot.ball_physics]
     variations.append(self.snapshot.jumper)
     return variations
 
   @property
   def drawing_subjects(self) -> list[Any]:
-    subjects: list[Any] = [self.snapshot.field]
-    subjects += [ball for ball in self.snapshot.balls]
-    subjects.append(self.snapshot.jumper)
+    return self.nodes
 
-    if self.config.debug:
-      stopwatch_text = Text(
+  def stopwatch_text(self, msec: int) -> Text:
+    sec = int(msec/1000)
+    text = Text(
+      typewriter=self.typewriter,
+      string='{:02}:{:02}:{:02}:{:03}'.format(
+        int(sec/60/60),
+        int(sec/60%60),
+        int(sec%60),
+        msec%1000,
+      ),
+      text_color=Color.BLACK,
+      font_size=10,
+      bold=False,
+    )
+    text.origin = Coordinate(
+      self.config.window_size.width-text.size.width,
+      self.config.window_size.height-text.size.height,
+    )
+    return text
+
+  def profiler_lines(self) -> list[str]:
+    def _line(label: str, key: str) -> str:
+      return '{} {:.1f}/{:.1f}'.format(
+        label,
+        Profiler.shared.percentile(key, 0.5),
+        Profiler.shared.percentile(key, 0.99),
+      )
+
+    lines = [
+      _line('UPD', 'update.{}'.format(type(self).__name__)),
+      _line('DRW', 'draw.{}'.format(type(self).__name__)),
+      _line('SEQ', 'time_seq'),
+    ]
+    variation_keys = sorted(
+      Profiler.shared.keys('variation.'),
+      key=lambda x: Profiler.shared.percentile(x, 0.99),
+      reverse=True,
+    )
+    for key in variation_keys[:PROFILER_VARIATION_NUM]:
+      lines.append(_line(key.split('.')[-1][:8], key))
+    lines.append(_line('CALL', 'draw_call'))
+
+    return lines
+
+  def profiler_texts(self, lines: list[str]) -> SubjectGroup:
+    texts: list[Text] = []
+    for (index, line) in enumerate(lines):
+      text = Text(
         typewriter=self.typewriter,
-        string='{:02}:{:02}:{:02}:{:03}'.format(
-          int(self.stopwatch.sec/60/60),
-          int(self.stopwatch.sec/60%60),
-          int(self.stopwatch.sec%60),
-          self.stopwatch.msec%1000,
-        ),
-        text_color=pyxel.COLOR_BLACK,
+        string=line,
+        text_color=Color.BLACK,
         font_size=10,
         bold=False,
       )
-      stopwatch_text.origin = Coordinate(
-        self.config.window_size.width-stopwatch_text.size.width,
-        self.config.window_size.height-stopwatch_text.size.height,
-      )
-      subjects.append(stopwatch_text)
+      text.origin = Coordinate(0, Typewriter.word_size(text.font_size).height*(index+2))
+      texts.append(text)
 
-    return subjects
+    return SubjectGroup(lambda: texts)
 
 
 class OpeningScene(BaseScene):
@@ -287,8 +350,9 @@ class OpeningScene(BaseScene):
             start_id=SoundId.BGM,
             exclude_play_channels=BGM_EXCLUDE_PLAY_CHANNEL,
           ),
+          se_priorities=SE_PRIORITIES,
         ),
-        score_board=ScoreBoard(),
+        score_board=ScoreBoard(SCORE_RANKING_NUM, SCORE_HISTORY_RETENTION, False),
         level=level,
         field=design.field(level, config),
         balls=[],
@@ -298,11 +362,15 @@ class OpeningScene(BaseScene):
 
     self.snapshot.load(self.config.path)
     self.config.title = self.string(GAME_TITLE[self.snapshot.level.mode])
-    print('snapshot', vars(self.snapshot), vars(self.snapshot.level))
+    self.snapshot.music_box.prefetch_raw_bgm(TITLE_BGM[self.snapshot.level.mode])
+    if Logger.shared.debug_enabled:
+      Logger.shared.debug('snapshot', dict(vars(self.snapshot)), dict(vars(self.snapshot.level)))
 
     self.title_text: Text | None = None
     self.play_title = False
 
+    self.nodes.append(SceneNode(lambda: self.title_text, lambda text: text))
+
     self.initial_sprites(True)
 
     def _walk_jumper(start: bool, timer: Timer) -> bool:
@@ -358,15 +426,6 @@ class OpeningScene(BaseScene):
 
     return super().update()
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    if self.title_text is not None:
-      subjects.append(self.title_text)
-
-    return subjects
-
 
 class TitleScene(BaseScene):
   def __init__(self, scene: Scene) -> None:
@@ -391,6 +450,15 @@ class TitleScene(BaseScene):
     self.score = self.scoreboard()
     self.score.center = Coordinate(self.menu_middle_top_center(None).x, -self.score.size.height/2)
 
+    self.nodes.append(SceneNode(lambda: self.show_score, lambda show: self.score if show else self.title_text))
+    self.nodes.append(SceneNode(lambda: self.show_start, lambda show: self.start_text if show else None))
+    self.nodes.append(
+      SceneNode(
+        lambda: (self.config.released_year, self.config.copyright),
+        lambda x: self.centered_text('© {} {}'.format(*x), self.menu_middle_bottom_center()),
+      )
+    )
+
     self.snapshot.music_box.play_raw_bgm(TITLE_BGM[self.snapshot.level.mode])
 
     def _walk_jumper(start: bool, timer: Timer) -> bool:
@@ -495,24 +563,6 @@ class TitleScene(BaseScene):
 
     return super().update()
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    if self.show_score:
-      subjects.append(self.score)
-    else:
-      subjects.append(self.title_text)
-
-    if self.show_start:
-      subjects.append(self.start_text)
-
-    copyright_text = self.text('© {} {}'.format(self.config.released_year, self.config.copyright))
-    copyright_text.center = self.menu_middle_bottom_center()
-    subjects.append(copyright_text)
-
-    return subjects
-
 
 class BaseStageScene(BaseScene):
   def __init__(self, scene: Scene, point: int, play_timer: Timer | None) -> None:
@@ -529,15 +579,63 @@ class BaseStageScene(BaseScene):
 
     self.show_stage = True
 
-  def record_score(self) -> None:
-    self.snapshot.score_board.scores.append(
-      Score(
-        created_at=datetime.now(),
-        level=self.snapshot.level,
-        point=self.point,
+    def _stage_text(inputs: tuple[bool, int]) -> Text | None:
+      (show, stage) = inputs
+      if not show:
+        return None
+
+      text = self.text('{}.{:02}'.format(self.string('stage_title'), stage+1))
+      text.origin = self.menu_left_top_origin()
+      return text
+
+    def _remain_msec() -> int | None:
+      if not self.show_stage or self.play_timer is None:
+        return None
+
+      limit_msec = self.play_timer.limit_msec if self.play_timer.limit_msec is not None else 0
+      return limit_msec-self.play_timer.msec
+
+    def _play_time_text(remain_msec: int | None) -> Text | None:
+      if remain_msec is None:
+        return None
+
+      return self.centered_text(
+        '{:02}:{:02}.{:03}'.format(
+          int(int(remain_msec/1000)/60),
+          int(int(remain_msec/1000)%60),
+          remain_msec%1000,
+        ),
+        self.menu_middle_top_center(None),
       )
+
+    def _score_text(inputs: tuple[int, int]) -> Text:
+      (mode, point) = inputs
+      text = self.text('{}:{:04}'.format(self.string(SCORE[mode]), point))
+      text.origin = self.menu_right_top_origin(text.size)
+      return text
+
+    def _life_gauge(inputs: tuple[int, int]) -> Signboard:
+      life = self.life_gauge()
+      life.origin = Coordinate(
+        self.menu_right_top_origin(life.size).x,
+        self.menu_right_top_origin(life.size).y+Typewriter.word_size(TEXT_FONT_SIZE).height,
+      )
+      return life
+
+    self.nodes.append(SceneNode(lambda: (self.show_stage, self.snapshot.level.stage), _stage_text))
+    self.nodes.append(SceneNode(_remain_msec, _play_time_text))
+    self.nodes.append(SceneNode(lambda: (self.snapshot.level.mode, self.point), _score_text))
+    self.nodes.append(SceneNode(lambda: (self.snapshot.jumper.life, self.snapshot.jumper.param.max_life), _life_gauge))
+
+  def record_score(self) -> None:
+    score = Score(
+      created_at=datetime.now(),
+      level=self.snapshot.level,
+      point=self.point,
     )
-    print('score record', vars(self.snapshot.score_board.scores[-1]))
+    self.snapshot.score_board.add(score)
+    if Logger.shared.info_enabled:
+      Logger.shared.info('score record', score.to_json())
 
   def life_gauge(self) -> Signboard:
     return Signboard(
@@ -561,41 +659,6 @@ class BaseStageScene(BaseScene):
       height=None,
     )
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    if self.show_stage:
-      stage_text = self.text('{}.{:02}'.format(self.string('stage_title'), self.snapshot.level.stage+1))
-      stage_text.origin = self.menu_left_top_origin()
-      subjects.append(stage_text)
-
-      if self.play_timer is not None:
-        limit_msec = self.play_timer.limit_msec if self.play_timer.limit_msec is not None else 0
-        remain_msec = limit_msec-self.play_timer.msec
-        play_time_text = self.text(
-          '{:02}:{:02}.{:03}'.format(
-            int(int(remain_msec/1000)/60),
-            int(int(remain_msec/1000)%60),
-            remain_msec%1000,
-          ),
-        )
-        play_time_text.center = self.menu_middle_top_center(None)
-        subjects.append(play_time_text)
-
-    score_text = self.text('{}:{:04}'.format(self.string(SCORE[self.snapshot.level.mode]), self.point))
-    score_text.origin = self.menu_right_top_origin(score_text.size)
-    subjects.append(score_text)
-
-    life = self.life_gauge()
-    life.origin = Coordinate(
-      self.menu_right_top_origin(life.size).x,
-      self.menu_right_top_origin(life.size).y+score_text.size.height,
-    )
-    subjects.append(life)
-
-    return subjects
-
 
 class ReadyScene(BaseStageScene):
   class Describe(IntEnum):
@@ -612,8 +675,10 @@ class ReadyScene(BaseStageScene):
     super().__init__(scene, point, play_timer)
 
     self.snapshot.music_box.stop_bgm()
+    self.snapshot.music_box.prefetch_raw_bgm(FIELD_BGM[self.snapshot.field.surface])
 
-    print('ready', vars(self.snapshot.level))
+    if Logger.shared.debug_enabled:
+      Logger.shared.debug('ready', dict(vars(self.snapshot.level)))
 
     self.snapshot.design.clear()
     self.play_timer = Timer.set_msec(
@@ -627,7 +692,7 @@ class ReadyScene(BaseStageScene):
     if self.snapshot.jumper.life < self.snapshot.jumper.param.max_life:
       self.max_add_life = self.snapshot.design.recovery_life_count(self.snapshot.level)
       self.max_add_life = min(self.max_add_life, self.snapshot.jumper.param.max_life-self.snapshot.jumper.life)
-    print('recovery life', self.max_add_life, self.snapshot.jumper.life, self.snapshot.jumper.param.max_life)
+    Logger.shared.debug('recovery life', self.max_add_life, self.snapshot.jumper.life, self.snapshot.jumper.param.max_life)
     self.add_life = 0
 
     self.show_stage = False
@@ -636,6 +701,20 @@ class ReadyScene(BaseStageScene):
     self.ready_timer: Timer | None = None
     self.last_sec = -1
 
+    def _describe(inputs: tuple[int | None, int | None]) -> Text | None:
+      (describe, wait_sec) = inputs
+      string: str | None = None
+      if describe == self.Describe.STAGE:
+        string = '{}.{:02}'.format(self.string('stage_title'), self.snapshot.level.stage+1)
+      elif describe == self.Describe.READY:
+        string = self.string('ready_title_1')
+      elif wait_sec is not None:
+        string = str(wait_sec)
+
+      return self.centered_text(string, self.subtitle_center())
+
+    self.nodes.append(SceneNode(self.describe_inputs, _describe))
+
     def _walk_jumper(start: bool, timer: Timer) -> bool:
       if start:
         self.snapshot.jumper.walk(self.snapshot.field.start_x)
@@ -706,32 +785,21 @@ class ReadyScene(BaseStageScene):
       Seq(self.stopwatch, 0, _start_play, lambda: PlayScene(self, self.point, self.play_timer)),
     ])
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
+  def describe_inputs(self) -> tuple[int | None, int | None]:
     if self.describe is not None:
-      if self.describe == self.Describe.STAGE:
-        describe_text = self.text('{}.{:02}'.format(self.string('stage_title'), self.snapshot.level.stage+1))
-        describe_text.center = self.subtitle_center()
-        subjects.append(describe_text)
+      return (self.describe, None)
 
-      elif self.describe == self.Describe.READY:
-        describe_text = self.text(self.string('ready_title_1'))
-        describe_text.center = self.subtitle_center()
-        subjects.append(describe_text)
-
-    elif self.ready_timer is not None:
+    if self.ready_timer is not None:
       wait_sec = max(int(self.START_MSEC/1000)-int(self.ready_timer.msec/1000), 1)
-      wait_sec = min(wait_sec, int(self.START_MSEC/1000))
-      start_wait_time_text = self.text(str(wait_sec))
-      start_wait_time_text.center = self.subtitle_center()
-      subjects.append(start_wait_time_text)
+      return (None, min(wait_sec, int(self.START_MSEC/1000)))
 
-    return subjects
+    return (None, None)
 
 
 class PlayScene(BaseStageScene):
+  STATE_HEADER_FORMAT = '<BBIH'
+  state_structs: dict[tuple[int, int], struct.Struct] = {}
+
   def __init__(self, scene: Scene, point: int, play_timer: Timer | None) -> None:
     super().__init__(scene, point, play_timer)
 
@@ -739,48 +807,168 @@ class PlayScene(BaseStageScene):
       ball.resume()
     self.snapshot.jumper.resume()
 
+    self.snapshot.collision_index.clear()
+    for ball in self.snapshot.balls:
+      self.snapshot.collision_index.add(ball, CollisionGroup.BALL)
+    self.snapshot.collision_index.add(self.snapshot.jumper, CollisionGroup.JUMPER)
+
     if self.play_timer is not None:
       self.play_timer.resume()
 
     self.snapshot.music_box.play_raw_bgm(FIELD_BGM[self.snapshot.field.surface])
 
+  def state_struct(self, ball_count: int) -> struct.Struct:
+    key = (ball_count, len(self.time_seq.seqs))
+    if key not in PlayScene.state_structs:
+      PlayScene.state_structs[key] = struct.Struct(
+        self.STATE_HEADER_FORMAT
+        +'I'
+        +Stopwatch.STATE_FORMAT
+        +Dice.STATE_FORMAT
+        +Timer.STATE_FORMAT
+        +self.time_seq.state_format
+        +GameDesign.STATE_FORMAT
+        +Field.STATE_FORMAT
+        +Jumper.STATE_FORMAT
+        +CollisionIndex.STATE_FORMAT
+        +(Ball.STATE_FORMAT+CollisionIndex.STATE_FORMAT)*ball_count
+      )
+    return PlayScene.state_structs[key]
+
+  def savestate(self) -> bytes:
+    if self.play_timer is None:
+      raise RuntimeError('savestate without play timer')
+
+    state: list[Any] = [
+      self.snapshot.level.mode,
+      self.snapshot.level.stage,
+      len(self.snapshot.balls),
+      len(self.time_seq.seqs),
+      self.point,
+      *self.stopwatch.state(),
+      *Dice.state(),
+      *self.play_timer.state(),
+      *self.time_seq.state(),
+      *self.snapshot.design.state(),
+      *self.snapshot.field.state(),
+      *self.snapshot.jumper.state(),
+      *self.snapshot.collision_index.state(self.snapshot.jumper),
+    ]
+    for ball in self.snapshot.balls:
+      state.extend(ball.state())
+      state.extend(self.snapshot.collision_index.state(ball))
+    return self.state_struct(len(self.snapshot.balls)).pack(*state)
+
+  def restore(self, data: bytes) -> None:
+    (mode, stage, ball_count, seq_count) = struct.unpack_from(self.STATE_HEADER_FORMAT, data)
+    if mode != self.snapshot.level.mode or stage != self.snapshot.level.stage or seq_count != len(self.time_seq.seqs):
+      raise RuntimeError('savestate level mismatch')
+    if self.play_timer is None:
+      self.play_timer = Timer(self.stopwatch)
+
+    balls = self.snapshot.balls[:ball_count]
+    while len(balls) < ball_count:
+      balls.append(self.snapshot.design.ball(self.snapshot.level, self.stopwatch))
+    self.snapshot.balls = balls
+
+    state = self.state_struct(ball_count).unpack(data)
+    self.point = state[4]
+    index = self.stopwatch.restore(state, 5)
+    index = Dice.restore(state, index)
+    index = self.play_timer.restore(state, index)
+    index = self.time_seq.restore(state, index)
+    index = self.snapshot.design.restore(state, index)
+    index = self.snapshot.field.restore(state, index)
+    index = self.snapshot.jumper.restore(state, index)
+
+    collision_index = self.snapshot.collision_index
+    collision_index.clear()
+    for ball in self.snapshot.balls:
+      collision_index.add(ball, CollisionGroup.BALL)
+    collision_index.add(self.snapshot.jumper, CollisionGroup.JUMPER)
+    index = collision_index.restore(self.snapshot.jumper, state, index)
+    for ball in self.snapshot.balls:
+      index = collision_index.restore(ball, state, ball.restore(state, index))
+
+  @classmethod
+  def resume(cls, scene: BaseScene, data: bytes) -> 'PlayScene':
+    (mode, stage, _, _) = struct.unpack_from(cls.STATE_HEADER_FORMAT, data)
+    scene.snapshot.level = GameLevel(mode, stage)
+    scene.initial_sprites(True)
+    scene.snapshot.design.clear()
+
+    play_scene = PlayScene(scene, 0, Timer(scene.stopwatch))
+    play_scene.restore(data)
+    return play_scene
+
+  @classmethod
+  def stomp(cls, ball_center: Coordinate, ball_size: Size, jumper_center: Coordinate, jumper_size: Size) -> bool:
+    ball_top = ball_center.y-ball_size.height/2
+    ball_left = ball_center.x-ball_size.width/2
+    jumper_bottom = jumper_center.y-jumper_size.height/2+jumper_size.height
+    return (
+      ball_top <= jumper_bottom <= ball_top+ball_size.height and
+      ball_left <= jumper_center.x <= ball_left+ball_size.width
+    )
+
+  def attack(self, ball: Ball, impact_time: float) -> bool:
+    jumper = self.snapshot.jumper
+    if not jumper.jumping(up=False):
+      return False
+
+    if self.stomp(ball.center, ball.size, jumper.center, jumper.size):
+      Logger.shared.debug('attack', ball.id, ball.top, jumper.bottom, jumper.center.x)
+      return True
+
+    collision_index = self.snapshot.collision_index
+    ball_center = collision_index.center_at(ball, impact_time)
+    jumper_center = collision_index.center_at(jumper, impact_time)
+    if self.stomp(ball_center, ball.size, jumper_center, jumper.size):
+      Logger.shared.debug('attack', ball.id, ball_center.y, jumper_center.y, impact_time)
+      return True
+
+    return False
+
   def update(self) -> Self | Any:
     if self.play_timer is not None:
       if self.snapshot.game_pad.cancel():
         self.snapshot.music_box.play_se(SceneSound.PAUSE)
         return PauseScene(self, self.point, self.play_timer)
 
+      self.snapshot.collision_index.update()
+      candidates = self.snapshot.collision_index.candidates(CollisionGroup.JUMPER, CollisionGroup.BALL)
+      impact_times: dict[str, float] = {}
+      for ball in candidates.get(self.snapshot.jumper.id, []):
+        impact_time = self.snapshot.collision_index.time_of_impact(ball, self.snapshot.jumper)
+        if impact_time is not None:
+          impact_times[ball.id] = impact_time
+
       next_balls: list[Ball] = []
       for ball in [ball for ball in self.snapshot.balls]:
         if ball.dead:
-          print('ball dead', ball.id)
+          Logger.shared.debug('ball dead', ball.id)
+          self.snapshot.collision_index.remove(ball)
           continue
 
         if ball.spin_direction:
           if ball.left >= self.snapshot.field.right:
-            print('ball over left', ball.id, ball.left, self.snapshot.field.right)
+            Logger.shared.debug('ball over left', ball.id, ball.left, self.snapshot.field.right)
             self.point += ball.point
+            self.snapshot.collision_index.remove(ball)
             continue
         else:
           if ball.right <= self.snapshot.field.left:
-            print('ball over right', ball.id, ball.right, self.snapshot.field.left)
+            Logger.shared.debug('ball over right', ball.id, ball.right, self.snapshot.field.left)
             self.point += ball.point
+            self.snapshot.collision_index.remove(ball)
             continue
 
         next_balls.append(ball)
 
         if not self.snapshot.jumper.damaging:
           if ball.spinning:
-            if ball.hit(self.snapshot.jumper):
-              attack = False
-              if self.snapshot.jumper.jumping(up=False):
-                if ball.top <= self.snapshot.jumper.bottom <= ball.bottom:
-                  if ball.left <= self.snapshot.jumper.center.x <= ball.right:
-                    print('attack y', ball.top, self.snapshot.jumper.bottom, ball.bottom)
-                    print('attack x', ball.left, self.snapshot.jumper.center.x, ball.right)
-                    attack = True
-
-              if attack:
+            if ball.id in impact_times:
+              if self.attack(ball, impact_times[ball.id]):
                 ball.burst()
                 self.point += ball.point
               else:
@@ -789,7 +977,7 @@ class PlayScene(BaseStageScene):
 
           if not self.snapshot.jumper.falling_down:
             if ball.bounced:
-              print('ball bounced', ball.id)
+              Logger.shared.debug('ball bounced', ball.id)
               self.point += ball.point
 
       self.snapshot.balls = next_balls
@@ -804,8 +992,7 @@ class PlayScene(BaseStageScene):
       stopped = False
       if len(self.snapshot.balls) > 0:
         last_ball: Ball | None = None
-        balls = sorted([ball for ball in self.snapshot.balls], key=lambda x: x.elapsed_msec, reverse=True)
-        for ball in balls:
+        for ball in self.snapshot.balls:
           if ball.stopping:
             if self.snapshot.design.can_spin_ball(self.snapshot.level, self.snapshot.field, ball, last_ball):
               ball.spin()
@@ -821,6 +1008,7 @@ class PlayScene(BaseStageScene):
           stopping_ball.origin = self.ball_ready_origin(stopping_ball)
           stopping_ball.spin_after_msec(self.stopwatch, next_msec)
           self.snapshot.balls.append(stopping_ball)
+          self.snapshot.collision_index.add(stopping_ball, CollisionGroup.BALL)
 
     return super().update()
 
@@ -837,6 +1025,9 @@ class PauseScene(BaseStageScene):
 
     self.pause_text = self.blink_text(self.string('game_pause_text'), 1000, True)
     self.pause_text.resume()
+    self.pause_text.center = self.subtitle_center()
+
+    self.nodes.append(self.pause_text)
 
   @property
   def updating_variations(self) -> list[Any]:
@@ -849,15 +1040,6 @@ class PauseScene(BaseStageScene):
 
     return super().update()
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    self.pause_text.center = self.subtitle_center()
-    subjects.append(self.pause_text)
-
-    return subjects
-
 
 class GameOverScene(BaseStageScene):
   def __init__(self, scene: Scene, point: int, play_timer: Timer | None) -> None:
@@ -878,6 +1060,21 @@ class GameOverScene(BaseStageScene):
     self.show_game_end = False
 
     self.restart_text = self.blink_text(self.string('game_restart_text'), 1000, False)
+    self.restart_text.center = self.menu_middle_low_center()
+
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_game_over,
+        lambda show: self.centered_text(self.string('game_over_title') if show else None, self.subtitle_center()),
+      )
+    )
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_game_end,
+        lambda show: self.centered_text(self.string('game_over_text') if show else None, self.menu_middle_center()),
+      )
+    )
+    self.nodes.append(SceneNode(lambda: self.show_game_end, lambda show: self.restart_text if show else None))
 
     def _show_game_over(start: bool, timer: Timer) -> bool:
       self.show_game_over = True
@@ -913,25 +1110,6 @@ class GameOverScene(BaseStageScene):
 
     return super().update()
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    if self.show_game_over:
-      game_over_text = self.text(self.string('game_over_title'))
-      game_over_text.center = self.subtitle_center()
-      subjects.append(game_over_text)
-
-    if self.show_game_end:
-      end_text = self.text(self.string('game_over_text'))
-      end_text.center = self.menu_middle_center()
-      subjects.append(end_text)
-
-      self.restart_text.center = self.menu_middle_low_center()
-      subjects.append(self.restart_text)
-
-    return subjects
-
 
 class StageClearScene(BaseStageScene):
   def __init__(self, scene: Scene, point: int, play_timer: Timer | None) -> None:
@@ -958,6 +1136,19 @@ class StageClearScene(BaseStageScene):
     self.show_next = False
     self.walked_jumper = False
 
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_clear,
+        lambda show: self.centered_text(self.string('stage_clear_title') if show else None, self.subtitle_center()),
+      )
+    )
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_next and not self.same_surface,
+        lambda show: self.centered_text(self.string('stage_clear_text') if show else None, self.menu_middle_center()),
+      )
+    )
+
     def _wait_jumper(start: bool, timer: Timer) -> bool:
       if not self.snapshot.jumper.jumping(None):
         self.snapshot.jumper.stop()
@@ -993,6 +1184,8 @@ class StageClearScene(BaseStageScene):
         else:
           if self.snapshot.field.surface == self.snapshot.design.field(self.next_level, self.config).surface:
             self.same_surface = True
+      if self.next_level is None:
+        self.snapshot.music_box.prefetch_raw_bgm(END_BGM[self.snapshot.level.mode])
 
       return True
 
@@ -1038,22 +1231,6 @@ class StageClearScene(BaseStageScene):
 
     return super().update()
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    if self.show_clear:
-      clear_text = self.text(self.string('stage_clear_title'))
-      clear_text.center = self.subtitle_center()
-      subjects.append(clear_text)
-
-    if self.show_next and not self.same_surface:
-      next_text = self.text(self.string('stage_clear_text'))
-      next_text.center = self.menu_middle_center()
-      subjects.append(next_text)
-
-    return subjects
-
 
 class GameClearScene(BaseStageScene):
   def __init__(self, scene: Scene, point: int, play_timer: Timer | None) -> None:
@@ -1070,6 +1247,26 @@ class GameClearScene(BaseStageScene):
     self.show_thanks = False
     self.show_bye = False
 
+    clear_title = 'game_clear_title' if self.next_level is not None else 'game_clear_all_title'
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_clear,
+        lambda show: self.centered_text(self.string(clear_title) if show else None, self.subtitle_center()),
+      )
+    )
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_thanks,
+        lambda show: self.centered_text(self.string('game_clear_all_text_1') if show else None, self.menu_middle_center()),
+      )
+    )
+    self.nodes.append(
+      SceneNode(
+        lambda: self.show_bye,
+        lambda show: self.centered_text(self.string('game_clear_all_text_2') if show else None, self.menu_middle_low_center()),
+      )
+    )
+
     def _show_clear(start: bool, timer: Timer) -> bool:
       self.show_clear = True
       self.snapshot.jumper.joy()
@@ -1112,23 +1309,3 @@ class GameClearScene(BaseStageScene):
 
     return super().update()
 
-  @property
-  def drawing_subjects(self) -> list[Any]:
-    subjects = super().drawing_subjects
-
-    if self.show_clear:
-      clear_text = self.text(self.string('game_clear_title' if self.next_level is not None else 'game_clear_all_title'))
-      clear_text.center = self.subtitle_center()
-      subjects.append(clear_text)
-
-    if self.show_thanks:
-      thanks_text = self.text(self.string('game_clear_all_text_1'))
-      thanks_text.center = self.menu_middle_center()
-      subjects.append(thanks_text)
-
-    if self.show_bye:
-      thanks_text = self.text(self.string('game_clear_all_text_2'))
-      thanks_text.center = self.menu_middle_low_center()
-      subjects.append(thanks_text)
-
-    return subjects
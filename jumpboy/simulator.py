@@ -0,0 +1,166 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from typing import Callable
+from core import (
+  Path, Dice, HeadlessPlatform, Profiler, Key,
+  Language, StringRes,
+  InputReplay,
+  GameConfig,
+  GameEngine,
+)
+from component import GameLevel
+from design import GAME_WINDOW_SIZE, FPS, RENDER_FPS, ASSET_FOLDER, ASSET_FILE, TRANSPARENT_COLOR
+from scene import OpeningScene, ReadyScene, PlayScene
+import time
+
+
+SIMULATOR_COPYRIGHT = 'SIMULATOR'
+
+
+class Simulator:
+  def __init__(
+    self,
+    max_frame: int | None,
+    input_keys: Callable[[int], list[int]] | None,
+    draw: bool,
+    save: bool,
+    debug: bool,
+    seed: int,
+    rollback_interval: int | None,
+  ) -> None:
+    path = Path(__file__, ASSET_FOLDER)
+    string_res = StringRes(path)
+    self.config = GameConfig(
+      path=path,
+      title=string_res.string('game_title_1', Language.EN),
+      window_size=GAME_WINDOW_SIZE,
+      fps=FPS,
+      render_fps=RENDER_FPS,
+      copyright=SIMULATOR_COPYRIGHT,
+      released_year=datetime.now().year,
+      debug=debug,
+    )
+
+    self.platform = HeadlessPlatform(
+      max_frame=max_frame,
+      input_keys=input_keys,
+      draw=draw,
+      save=save,
+    )
+    self.engine = GameEngine(
+      config=self.config,
+      platform=self.platform,
+      quit_key=Key.Q,
+      asset_file=ASSET_FILE,
+      update=self.update,
+      draw=self.draw,
+    )
+    Dice.setup(seed)
+    self.scene = OpeningScene(self.config, string_res)
+
+    self.rollback_interval = rollback_interval
+    self.rollback_count = 0
+    self.rollback_size = 0
+    self.savestate_usec = 0.0
+    self.restore_usec = 0.0
+
+  def start_level(self, level: GameLevel) -> None:
+    self.scene.snapshot.level = level
+    self.scene.initial_sprites(True)
+    self.scene = ReadyScene(self.scene, 0, None)
+
+  def record(self) -> InputReplay:
+    replay = InputReplay(Dice.seed, len(self.scene.snapshot.game_pad.buttons))
+    self.scene.snapshot.game_pad.record(replay)
+    return replay
+
+  def play(self, replay: InputReplay) -> None:
+    self.scene.snapshot.game_pad.play(replay)
+
+  def update(self) -> None:
+    start = Profiler.shared.start()
+    name = type(self.scene).__name__
+    self.scene.snapshot.game_pad.update()
+    self.scene = self.scene.update()
+    self.scene.snapshot.music_box.update()
+    Profiler.shared.stop('update.{}'.format(name), start)
+
+    if self.rollback_interval is not None and self.platform.frame_count%self.rollback_interval == 0:
+      self.rollback()
+
+  def rollback(self) -> None:
+    if not isinstance(self.scene, PlayScene):
+      return
+
+    start = time.perf_counter()
+    data = self.scene.savestate()
+    restore_start = time.perf_counter()
+    self.scene.restore(data)
+    end = time.perf_counter()
+    if self.scene.savestate() != data:
+      raise RuntimeError('savestate mismatch')
+
+    self.rollback_count += 1
+    self.rollback_size = max(self.rollback_size, len(data))
+    self.savestate_usec += (restore_start-start)*1000000
+    self.restore_usec += (end-restore_start)*1000000
+
+  def draw(self, interpolation: float) -> None:
+    self.scene.stopwatch.interpolation = interpolation
+    self.scene.draw(TRANSPARENT_COLOR)
+
+  def step(self, frame: int) -> None:
+    for _ in range(frame):
+      self.platform.step(self.engine.update_frame, self.engine.draw_frame)
+
+  def run(self) -> None:
+    self.engine.run()
+
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='run jumpboy without window, audio and frame wait')
+  parser.add_argument('--frames', type=int, default=FPS*60*5)
+  parser.add_argument('--enter-interval', type=int, default=FPS)
+  parser.add_argument('--draw', action='store_true')
+  parser.add_argument('--profile', type=str, default=None)
+  parser.add_argument('--seed', type=int, default=None)
+  parser.add_argument('--record', type=str, default=None)
+  parser.add_argument('--replay', type=str, default=None)
+  parser.add_argument('--rollback', type=int, default=None)
+  args = parser.parse_args()
+
+  enter_interval = max(args.enter_interval, 2)
+  replay = InputReplay.load(args.replay) if args.replay is not None else None
+  if replay is not None:
+    seed = replay.seed
+  elif args.seed is not None:
+    seed = args.seed
+  else:
+    seed = Dice.new_seed()
+
+  simulator = Simulator(
+    max_frame=args.frames if replay is None else min(args.frames, replay.frame_count),
+    input_keys=lambda frame: [Key.RETURN] if frame%enter_interval == 0 else [],
+    draw=args.draw,
+    save=False,
+    debug=args.profile is not None,
+    seed=seed,
+    rollback_interval=args.rollback,
+  )
+  if replay is not None:
+    simulator.play(replay)
+  record = simulator.record() if args.record is not None else None
+  simulator.run()
+  print('simulator end', simulator.platform.frame_count, type(simulator.scene).__name__, seed)
+  if simulator.rollback_count > 0:
+    print('simulator rollback {} max {} bytes savestate {:.1f} restore {:.1f} usec'.format(
+      simulator.rollback_count,
+      simulator.rollback_size,
+      simulator.savestate_usec/simulator.rollback_count,
+      simulator.restore_usec/simulator.rollback_count,
+    ))
+
+  if record is not None:
+    record.save(args.record)
+  if args.profile is not None:
+    Profiler.shared.dump(args.profile)
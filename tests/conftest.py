@@ -0,0 +1,18 @@
+from typing import Iterator
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jumpboy'))
+
+from core import Platform, HeadlessPlatform
+
+
+@pytest.fixture
+def platform() -> Iterator[HeadlessPlatform]:
+  previous = Platform.shared if hasattr(Platform, 'shared') else None
+  platform = HeadlessPlatform(max_frame=None, input_keys=None, draw=False, save=True)
+  Platform.setup(platform)
+  yield platform
+  if previous is not None:
+    Platform.setup(previous)
@@ -0,0 +1,95 @@
+from typing import Iterator, Sequence
+import os
+import threading
+import pytest
+from core import Path, Platform, BgmTrack, RawBgm, RawBgmBank, HeadlessPlatform
+
+
+class SoundPlatform(HeadlessPlatform):
+  def __init__(self) -> None:
+    super().__init__(max_frame=None, input_keys=None, draw=False, save=False)
+    self.sounds: dict[int, tuple] = {}
+
+  def set_sound(self, id: int, notes: str, tones: str, volumes: str, effects: str, speed: int) -> None:
+    raise AssertionError('binary tracks must not go through mml')
+
+  def set_sound_data(self, id: int, notes: Sequence[int], tones: Sequence[int], volumes: Sequence[int], effects: Sequence[int], speed: int) -> None:
+    self.sounds[id] = (list(notes), list(tones), list(volumes), list(effects), speed)
+
+
+CHANNELS = [
+  BgmTrack.Channel([24, -1, 35, 59, 0], [0], [7, 6, 5, 4, 3], [0, 1, 2, 3, 4], 20),
+  BgmTrack.Channel([-1], [3, 2], [0], [5], 1),
+  BgmTrack.Channel([], [], [], [], 30),
+]
+
+
+def channel_tuples(channels: list[BgmTrack.Channel]) -> list[tuple]:
+  return [(list(channel.notes), list(channel.tones), list(channel.volumes), list(channel.effects), channel.speed) for channel in channels]
+
+
+class CountingBank(RawBgmBank):
+  def __init__(self, path: Path) -> None:
+    super().__init__(RawBgm.Param(path, 'bgm', 0, []))
+    self.parse_count = 0
+    self.started = threading.Event()
+    self.release = threading.Event()
+
+  def parse(self, filename: str) -> BgmTrack:
+    self.parse_count += 1
+    self.started.set()
+    self.release.wait(5)
+    return BgmTrack([], [('c2', 't', '7', 'n', 20)])
+
+
+def test_track_reuses_pending_prefetch(tmp_path) -> None:
+  bank = CountingBank(Path(str(tmp_path/'app.py'), 'assets'))
+  bank.prefetch('title')
+  assert bank.started.wait(5)
+
+  tracks: list[BgmTrack] = []
+  reader = threading.Thread(target=lambda: tracks.append(bank.track('title')))
+  reader.start()
+  bank.release.set()
+  reader.join(5)
+
+  assert len(tracks) == 1
+  assert bank.track('title') is tracks[0]
+  assert bank.parse_count == 1
+
+
+def test_track_parses_once_without_prefetch(tmp_path) -> None:
+  bank = CountingBank(Path(str(tmp_path/'app.py'), 'assets'))
+  bank.release.set()
+
+  track = bank.track('title')
+  bank.prefetch('title')
+
+  assert bank.track('title') is track
+  assert bank.parse_count == 1
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_track_round_trip(compress: bool) -> None:
+  track = BgmTrack.decode(BgmTrack.encode(CHANNELS, compress))
+  assert channel_tuples(track.channels) == channel_tuples(CHANNELS)
+  assert track.channel_count == len(CHANNELS)
+
+
+@pytest.fixture
+def sound_platform() -> Iterator[SoundPlatform]:
+  previous = Platform.shared if hasattr(Platform, 'shared') else None
+  platform = SoundPlatform()
+  Platform.setup(platform)
+  yield platform
+  if previous is not None:
+    Platform.setup(previous)
+
+
+def test_load_sets_sound_data(sound_platform: SoundPlatform, tmp_path) -> None:
+  os.makedirs(tmp_path/'assets'/'bgm')
+  with open(tmp_path/'assets'/'bgm'/('title'+BgmTrack.EXTENSION), mode='wb') as f:
+    f.write(BgmTrack.encode(CHANNELS, True))
+  bank = RawBgmBank(RawBgm.Param(Path(str(tmp_path/'app.py'), 'assets'), 'bgm', 16, [1]))
+  assert bank.load('title') == [0, 2]
+  assert sound_platform.sounds == {16: channel_tuples(CHANNELS)[0], 18: channel_tuples(CHANNELS)[2]}
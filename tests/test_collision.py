@@ -0,0 +1,128 @@
+import pytest
+import random
+from core import Coordinate, Size, Stopwatch, Image, Block, Collision, Sprite, CollisionIndex
+from scene import PlayScene
+
+
+def sprite(name: str, x: float, y: float, width: float, height: float) -> Sprite:
+  image = Image(0, Coordinate(0, 0), Size(1, 1), Image.Pose.NORMAL)
+  sprite = Sprite(name, {0: Block(image, Collision(Coordinate(0, 0), Size(width, height)))}, {}, Stopwatch(60))
+  sprite.center = Coordinate(x, y)
+  return sprite
+
+
+@pytest.mark.parametrize('size, other_size, other_center, hit', [
+  (Size(8, 8), Size(8, 8), Coordinate(8, 0), True),
+  (Size(8, 8), Size(8, 8), Coordinate(0, -8), True),
+  (Size(8, 8), Size(8, 8), Coordinate(8.5, 0), False),
+  (Size(8, 8), Size(8, 8), Coordinate(8, 8), True),
+  (Size(8, 8), Size(8, 8), Coordinate(5, -5), True),
+  (Size(8, 8), Size(8, 8), Coordinate(-9, 7), False),
+  (Size(16, 2), Size(2, 16), Coordinate(0, 0), True),
+  (Size(16, 2), Size(2, 16), Coordinate(7, 0), True),
+  (Size(16, 2), Size(2, 16), Coordinate(10, 0), False),
+  (Size(16, 16), Size(4, 4), Coordinate(3, 3), True),
+])
+def test_hit(size: Size, other_size: Size, other_center: Coordinate, hit: bool) -> None:
+  collision = Collision(Coordinate(0, 0), size)
+  other = Collision(Coordinate(0, 0), other_size)
+  assert collision.hit(Coordinate(0, 0), other, other_center) == hit
+  assert other.hit(other_center, collision, Coordinate(0, 0)) == hit
+
+
+def test_time_of_impact_tunneling() -> None:
+  time = Collision.time_of_impact((0, 0, 4, 4), (100, 0, 104, 4), (50, 0, 54, 4), (50, 0, 54, 4))
+  assert time is not None
+  assert time == pytest.approx(0.46)
+
+
+def test_time_of_impact_overlapping_at_start() -> None:
+  assert Collision.time_of_impact((0, 0, 4, 4), (8, 0, 12, 4), (2, 2, 6, 6), (2, 2, 6, 6)) == 0.0
+  assert Collision.time_of_impact((0, 0, 4, 4), (0, 0, 4, 4), (2, 2, 6, 6), (2, 2, 6, 6)) == 0.0
+
+
+@pytest.mark.parametrize('start, end, other', [
+  ((0, 0, 4, 4), (10, 0, 14, 4), (5, 10, 9, 14)),
+  ((0, 0, 4, 4), (0, 0, 4, 4), (5, 0, 9, 4)),
+  ((0, 0, 4, 4), (-10, 0, -6, 4), (5, 0, 9, 4)),
+  ((0, 0, 4, 4), (10, 10, 14, 14), (9, 0, 13, 3)),
+])
+def test_time_of_impact_miss(start: tuple, end: tuple, other: tuple) -> None:
+  assert Collision.time_of_impact(start, end, other, other) is None
+
+
+def test_swept_hit() -> None:
+  jumper = sprite('jumper', 50, 10, 4, 4)
+  ball = sprite('ball', 0, 10, 4, 4)
+  index = CollisionIndex()
+  index.add(jumper, 0)
+  index.add(ball, 1)
+  index.update()
+
+  ball.place(100, 10)
+  index.update()
+  assert not ball.block.collision.hit(ball.center, jumper.block.collision, jumper.center)
+  assert [other.id for other in index.candidates(0, 1)[jumper.id]] == [ball.id]
+
+  time = index.time_of_impact(ball, jumper)
+  assert time is not None
+  assert index.center_at(ball, time).x == pytest.approx(46)
+
+
+@pytest.mark.parametrize('ball_center, jumper_center, stomp', [
+  (Coordinate(50, 50), Coordinate(50, 40), True),
+  (Coordinate(50, 50), Coordinate(43, 40), True),
+  (Coordinate(50, 50), Coordinate(41, 40), False),
+  (Coordinate(50, 50), Coordinate(40, 50), False),
+  (Coordinate(50, 50), Coordinate(50, 30), False),
+])
+def test_stomp(ball_center: Coordinate, jumper_center: Coordinate, stomp: bool) -> None:
+  assert PlayScene.stomp(ball_center, Size(16, 16), jumper_center, Size(8, 8)) == stomp
+
+
+def brute_force(sprites: list[tuple[Sprite, int]], prev_bounds: dict[str, tuple], group: int, other_group: int) -> set[tuple[str, str]]:
+  intervals = {
+    sprite.id: (min(prev_bounds[sprite.id][0], sprite.bounds[0]), max(prev_bounds[sprite.id][2], sprite.bounds[2]))
+    for (sprite, _) in sprites
+  }
+  return set([
+    (sprite.id, other.id)
+    for (sprite, sprite_group) in sprites
+    for (other, other_sprite_group) in sprites
+    if sprite_group == group and other_sprite_group == other_group
+    if intervals[sprite.id][0] <= intervals[other.id][1] and intervals[other.id][0] <= intervals[sprite.id][1]
+  ])
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_candidates_match_brute_force(seed: int) -> None:
+  dice = random.Random(seed)
+  index = CollisionIndex()
+  sprites: list[tuple[Sprite, int]] = []
+  for number in range(24):
+    group = number%3
+    sprites.append((sprite('sprite{}'.format(number), dice.uniform(0, 200), dice.uniform(0, 50), dice.uniform(2, 16), 8), group))
+    index.add(sprites[-1][0], group)
+  prev_bounds = {moved.id: moved.bounds for (moved, _) in sprites}
+  index.update()
+
+  crossed = False
+  for frame in range(60):
+    if frame%10 == 9:
+      removed = sprites.pop(dice.randrange(len(sprites)))[0]
+      index.remove(removed)
+
+    order = [indexed.id for indexed in index.sprites if indexed.id in index.groups]
+    for (moved, _) in sprites:
+      prev_bounds[moved.id] = moved.bounds
+      moved.place(moved.center.x+dice.uniform(-12, 12), moved.center.y)
+    index.update()
+    crossed = crossed or [indexed.id for indexed in index.sprites] != order
+
+    candidates = index.candidates(0, 1)
+    expected = brute_force(sprites, prev_bounds, 0, 1)
+    assert 0 < len(expected) < len(sprites)**2//9
+    assert set([(id, other.id) for (id, others) in candidates.items() for other in others]) == expected
+    assert sorted([indexed.id for indexed in index.sprites]) == sorted([moved.id for (moved, _) in sprites])
+
+  assert crossed
@@ -0,0 +1,84 @@
+from typing import Any
+from core import Platform, HeadlessPlatform, Glyph, GlyphAtlas, PyxelGlyphFont
+
+
+class SheetImage:
+  def __init__(self, width: int, height: int) -> None:
+    self.width = width
+    self.height = height
+    self.pixels: set[tuple[int, int]] = set()
+
+  def cls(self, col: int) -> None:
+    self.pixels.clear()
+
+  def pset(self, x: int, y: int, col: int) -> None:
+    self.pixels.add((x, y))
+
+
+class SheetPlatform(HeadlessPlatform):
+  def __init__(self) -> None:
+    super().__init__(max_frame=None, input_keys=None, draw=False, save=False)
+    self.images: list[SheetImage] = []
+
+  def image(self, width: int, height: int) -> Any:
+    image = SheetImage(width, height)
+    self.images.append(image)
+    return image
+
+
+def font(cell_size: int, codepoints: list[int]) -> PyxelGlyphFont:
+  glyphs = {codepoint: Glyph(cell_size, 1, 1, 0, 0, [0x80]) for codepoint in codepoints}
+  return PyxelGlyphFont(GlyphAtlas(GlyphAtlas.compile((cell_size, cell_size, 0, 0), glyphs)))
+
+
+def test_atlas_round_trip() -> None:
+  glyphs = {
+    ord('A'): Glyph(6, 5, 2, 0, 1, [0xf8, 0x88]),
+    ord('B'): Glyph(6, 9, 1, 1, 0, [0xff80]),
+  }
+  atlas = GlyphAtlas(GlyphAtlas.compile((10, 10, 0, -2), glyphs))
+
+  assert atlas.bounding_box == (10, 10, 0, -2)
+  assert atlas.count == 2
+  assert atlas.glyph(ord('C')) is None
+  for (codepoint, glyph) in glyphs.items():
+    loaded = atlas.glyph(codepoint)
+    assert loaded is not None
+    assert (loaded.advance, loaded.width, loaded.height, loaded.x_offset, loaded.y_offset, loaded.rows) == (
+      glyph.advance, glyph.width, glyph.height, glyph.x_offset, glyph.y_offset, glyph.rows,
+    )
+
+
+def test_upload_skips_missing_first_glyph(platform: HeadlessPlatform) -> None:
+  sheet_platform = SheetPlatform()
+  Platform.setup(sheet_platform)
+  glyph_font = font(8, [ord('b')])
+
+  assert glyph_font.upload(ord('a')) is None
+  glyph_font.cells[ord('a')] = None
+  cell = glyph_font.upload(ord('b'))
+
+  assert cell is not None
+  assert cell[0] is sheet_platform.images[0]
+  assert cell[1:3] == (0, 0)
+
+
+def test_upload_wraps_to_new_sheet(platform: HeadlessPlatform) -> None:
+  sheet_platform = SheetPlatform()
+  Platform.setup(sheet_platform)
+  glyph_font = font(100, [ord(char) for char in 'abcde'])
+  slot_count = glyph_font.columns*glyph_font.rows
+
+  cells = []
+  for char in 'a!b?c#d$e':
+    codepoint = ord(char)
+    glyph_font.cells[codepoint] = glyph_font.upload(codepoint)
+    if glyph_font.cells[codepoint] is not None:
+      cells.append(glyph_font.cells[codepoint])
+
+  assert slot_count == 4
+  assert len(sheet_platform.images) == 2
+  assert [cell[0] for cell in cells] == [sheet_platform.images[0]]*4+[sheet_platform.images[1]]
+  assert len(set([cell[1:3] for cell in cells[:4]])) == 4
+  assert cells[4][1:3] == (0, 0)
+  assert len(sheet_platform.images[0].pixels) == 4
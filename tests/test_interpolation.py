@@ -0,0 +1,54 @@
+from core import Coordinate
+from component import GameLevel, Jumper
+from design import GameLevelMode, GameLevelStage
+from scene import PlayScene, PauseScene
+from simulator import Simulator
+
+
+def jumper_after_tick() -> Jumper:
+  simulator = Simulator(None, lambda frame: [], False, False, False, 1, None)
+  simulator.start_level(GameLevel(GameLevelMode.NORMAL, GameLevelStage.STAGE_1))
+  jumper = simulator.scene.snapshot.jumper
+  jumper.update(simulator.scene.stopwatch, simulator.scene.snapshot)
+  jumper.stopwatch.interpolation = 0.5
+  return jumper
+
+
+def test_move_interpolates() -> None:
+  jumper = jumper_after_tick()
+  (x, y) = (jumper.center.x, jumper.center.y)
+  jumper.place(x+10, y)
+  assert (jumper.draw_center.x, jumper.draw_center.y) == (x+5, y)
+
+
+def test_origin_setter_snaps() -> None:
+  jumper = jumper_after_tick()
+  jumper.origin = Coordinate(jumper.origin.x+100, jumper.origin.y)
+  assert (jumper.draw_center.x, jumper.draw_center.y) == (jumper.center.x, jumper.center.y)
+
+
+def test_center_setter_snaps() -> None:
+  jumper = jumper_after_tick()
+  jumper.center = Coordinate(jumper.center.x, jumper.center.y-100)
+  assert (jumper.draw_center.x, jumper.draw_center.y) == (jumper.center.x, jumper.center.y)
+
+
+def test_paused_scene_draws_still() -> None:
+  simulator = Simulator(None, lambda frame: [], False, False, False, 1, None)
+  simulator.start_level(GameLevel(GameLevelMode.HARD, GameLevelStage.STAGE_3))
+  while not isinstance(simulator.scene, PlayScene) or len(simulator.scene.snapshot.balls) == 0:
+    simulator.step(1)
+  simulator.step(30)
+  scene = simulator.scene
+  assert isinstance(scene, PlayScene)
+  simulator.scene = PauseScene(scene, scene.point, scene.play_timer)
+
+  blts: list[tuple[float, float]] = []
+  simulator.platform.blt = lambda x, y, img, u, v, w, h, colkey: blts.append((x, y)) # type: ignore
+  positions = []
+  for interpolation in [1.0, 0.0, 0.5]:
+    blts.clear()
+    simulator.draw(interpolation)
+    positions.append(list(blts))
+  assert positions[1] == positions[2]
+  assert len(positions[1]) > 0
@@ -0,0 +1,36 @@
+import pytest
+from component import GameLevel, BallPhysics, numpy_import
+from design import GameLevelMode, GameLevelStage
+from farm import RandomPolicy
+from simulator import Simulator
+
+FRAMES = 1800
+
+
+def trace(level: GameLevel, seed: int, min_batch_count: int) -> list[tuple]:
+  simulator = Simulator(None, RandomPolicy(0.05, 4, seed).keys, False, False, False, seed, None)
+  simulator.start_level(level)
+  simulator.scene.snapshot.ball_physics = BallPhysics(min_batch_count)
+
+  frames: list[tuple] = []
+  for _ in range(FRAMES):
+    simulator.step(1)
+    snapshot = simulator.scene.snapshot
+    frames.append((
+      type(simulator.scene).__name__,
+      tuple((ball.spinning, ball.center.x, ball.center.y, ball.prev_y, ball.accel, ball.spin_direction, int(ball.motion), ball.bounced) for ball in snapshot.balls),
+      snapshot.jumper.center.x,
+      snapshot.jumper.center.y,
+    ))
+  return frames
+
+
+@pytest.mark.skipif(not numpy_import, reason='numpy is not installed')
+@pytest.mark.parametrize('stage', [GameLevelStage.STAGE_1, GameLevelStage.STAGE_3, GameLevelStage.STAGE_6])
+def test_batched_matches_scalar(stage: int) -> None:
+  level = GameLevel(GameLevelMode.HARD, stage)
+  scalar = trace(level, 1, BallPhysics.MIN_BATCH_COUNT)
+  batched = trace(level, 1, 1)
+
+  assert len([frame for frame in scalar if any(ball[0] for ball in frame[1])]) > FRAMES//10
+  assert batched == scalar
@@ -0,0 +1,61 @@
+from core import Coordinate, Size, Stopwatch, Image, Block, Collision, Sprite, Movable, CollisionIndex
+
+
+def sprite(name: str, x: float, y: float, width: float, height: float) -> Sprite:
+  image = Image(0, Coordinate(0, 0), Size(1, 1), Image.Pose.NORMAL)
+  sprite = Sprite(name, {0: Block(image, Collision(Coordinate(0, 0), Size(width, height)))}, {}, Stopwatch(60))
+  sprite.center = Coordinate(x, y)
+  return sprite
+
+
+def test_setters_copy() -> None:
+  placed = sprite('placed', 0, 0, 8, 4)
+  center = Coordinate(10, 20)
+  placed.center = center
+  center.x = 0
+  assert (placed.center.x, placed.center.y) == (10, 20)
+
+  origin = Coordinate(1, 2)
+  placed.origin = origin
+  origin.y = 0
+  assert (placed.center.x, placed.center.y) == (5, 4)
+
+
+def test_center_and_origin_are_live_views() -> None:
+  placed = sprite('placed', 10, 20, 8, 4)
+  (center, origin) = (placed.center, placed.origin)
+  kept = Coordinate(center.x, center.y)
+
+  placed.place(30, 40)
+  assert (center.x, center.y) == (30, 40)
+  assert placed.origin is origin
+  assert (origin.x, origin.y) == (26, 38)
+  assert (kept.x, kept.y) == (10, 20)
+
+
+def test_size_center_is_cached() -> None:
+  size = Size(8, 4)
+  assert size.center is size.center
+  assert (size.center.x, size.center.y) == (4, 2)
+
+
+def test_move_keeps_target() -> None:
+  movable = Movable()
+  target = Coordinate(3, 0)
+  movable.move(target, 1.0)
+  target.x = -3
+  for _ in range(3):
+    movable.update(Stopwatch(60), None)
+  assert (movable.center.x, movable.moving) == (3, False)
+
+
+def test_collision_index_keeps_copies() -> None:
+  placed = sprite('placed', 10, 20, 8, 4)
+  index = CollisionIndex()
+  index.add(placed, 0)
+  index.update()
+
+  placed.place(30, 40)
+  center = index.center_at(placed, 1.0)
+  assert (center.x, center.y) == (10, 20)
+  assert index.bounds[placed.id] == (6, 18, 14, 22)
@@ -0,0 +1,12 @@
+import pytest
+from core import PyxelPlatform
+try:
+  import pyxel
+  pyxel_import = True
+except:
+  pyxel_import = False
+
+
+@pytest.mark.skipif(not pyxel_import, reason='pyxel is not loadable')
+def test_pyxel_constants() -> None:
+  PyxelPlatform()
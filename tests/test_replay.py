@@ -0,0 +1,38 @@
+from core import InputReplay
+from farm import RandomPolicy
+from simulator import Simulator
+
+FRAMES = 1500
+
+
+def trace(simulator: Simulator) -> list[tuple]:
+  frames: list[tuple] = []
+  for _ in range(FRAMES):
+    simulator.step(1)
+    snapshot = simulator.scene.snapshot
+    frames.append((
+      type(simulator.scene).__name__,
+      snapshot.level.mode,
+      snapshot.level.stage,
+      tuple((ball.center.x, ball.center.y, int(ball.motion)) for ball in snapshot.balls),
+      snapshot.jumper.center.x,
+      snapshot.jumper.center.y,
+      snapshot.jumper.life,
+    ))
+  return frames
+
+
+def test_replay_is_deterministic(tmp_path) -> None:
+  recorder = Simulator(None, RandomPolicy(0.05, 4, 7).keys, False, False, False, 7, None)
+  record = recorder.record()
+  expected = trace(recorder)
+  assert len({frame[0] for frame in expected}) > 2
+
+  file_path = str(tmp_path/'replay.bin')
+  record.save(file_path)
+  replay = InputReplay.load(file_path)
+  assert replay.frame_count == record.frame_count
+
+  player = Simulator(None, lambda frame: [], False, False, False, replay.seed, None)
+  player.play(replay)
+  assert trace(player) == expected
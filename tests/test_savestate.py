@@ -0,0 +1,68 @@
+from component import GameLevel, CollisionGroup
+from design import GameLevelMode, GameLevelStage
+from scene import PlayScene
+from simulator import Simulator
+
+FRAMES = 300
+
+
+def play_scene(simulator: Simulator, level: GameLevel) -> PlayScene:
+  simulator.start_level(level)
+  for _ in range(2000):
+    simulator.step(1)
+    if isinstance(simulator.scene, PlayScene) and simulator.scene.play_timer is not None and simulator.scene.play_timer.msec > 1000:
+      break
+  assert isinstance(simulator.scene, PlayScene)
+  return simulator.scene
+
+
+def trace(simulator: Simulator) -> list[tuple]:
+  frames: list[tuple] = []
+  for _ in range(FRAMES):
+    simulator.step(1)
+    snapshot = simulator.scene.snapshot
+    frames.append((
+      type(simulator.scene).__name__,
+      tuple((ball.center.x, ball.center.y, ball.spin_direction, int(ball.motion), ball.dead) for ball in snapshot.balls),
+      snapshot.jumper.center.x,
+      snapshot.jumper.center.y,
+      snapshot.jumper.life,
+    ))
+  return frames
+
+
+def test_restore_round_trip() -> None:
+  simulator = Simulator(None, lambda frame: [], False, False, False, 3, None)
+  scene = play_scene(simulator, GameLevel(GameLevelMode.HARD, GameLevelStage.STAGE_3))
+  data = scene.savestate()
+
+  expected = trace(simulator)
+  simulator.scene = scene
+  scene.restore(data)
+  assert scene.savestate() == data
+  assert trace(simulator) == expected
+
+
+def test_resume_round_trip() -> None:
+  simulator = Simulator(None, lambda frame: [], False, False, False, 3, None)
+  data = play_scene(simulator, GameLevel(GameLevelMode.NORMAL, GameLevelStage.STAGE_2)).savestate()
+
+  resumed = Simulator(None, lambda frame: [], False, False, False, 4, None)
+  resumed.scene = PlayScene.resume(resumed.scene, data)
+  assert resumed.scene.savestate() == data
+
+
+def test_many_balls() -> None:
+  simulator = Simulator(None, lambda frame: [], False, False, False, 3, None)
+  scene = play_scene(simulator, GameLevel(GameLevelMode.NORMAL, GameLevelStage.STAGE_1))
+  snapshot = scene.snapshot
+  while len(snapshot.balls) < 300:
+    ball = snapshot.design.ball(snapshot.level, scene.stopwatch)
+    snapshot.balls.append(ball)
+    snapshot.collision_index.add(ball, CollisionGroup.BALL)
+  data = scene.savestate()
+
+  scene.snapshot.balls = scene.snapshot.balls[:1]
+  scene.restore(data)
+  assert len(scene.snapshot.balls) == 300
+  assert scene.savestate() == data
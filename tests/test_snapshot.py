@@ -0,0 +1,247 @@
+from datetime import datetime
+from typing import Callable, Iterator
+import json
+import os
+import struct
+import pytest
+from core import Path, Language, Snapshot, SnapshotDocument, SnapshotStore, SnapshotWriter, SqliteSnapshotStore
+from component import GameLevel, GamePad, Score, ScoreBoard, Snapshot as GameSnapshot
+
+
+class FailingStore(SnapshotStore):
+  def __init__(self, fail_count: int) -> None:
+    self.fail_count = fail_count
+    self.saved: list[dict] = []
+
+  def save(self, folder: str, file_name: str, document: SnapshotDocument, records: list[dict]) -> None:
+    if self.fail_count > 0:
+      self.fail_count -= 1
+      raise OSError('disk full')
+    self.saved.extend(records)
+
+
+class CountSnapshot(Snapshot):
+  def __init__(self) -> None:
+    super().__init__()
+    self.values: list[int] = []
+
+  def encoder(self, history: bool) -> Callable[[], bytes]:
+    return lambda: b''
+
+  def journal(self, start: int) -> list[dict]:
+    return [{'value': value} for value in self.values[start:]]
+
+  def journal_end(self) -> int:
+    return len(self.values)
+
+
+class MigratingSnapshot(Snapshot):
+  VERSION = 3
+  MIGRATIONS = {
+    1: lambda payload: payload+b'.v2',
+    2: lambda payload: payload.upper(),
+  }
+
+  def __init__(self) -> None:
+    super().__init__()
+    self.loaded: tuple[bytes, int] | None = None
+
+  def from_bytes(self, data: memoryview, seq: int) -> None:
+    self.loaded = (bytes(data), seq)
+
+
+@pytest.fixture
+def store(platform) -> Iterator[FailingStore]:
+  previous = SnapshotWriter.shared
+  store = FailingStore(1)
+  writer = SnapshotWriter(store)
+  writer.worker_enabled = False
+  SnapshotWriter.setup(writer)
+  yield store
+  SnapshotWriter.setup(previous)
+
+
+def test_journal_count_waits_for_save(store: FailingStore, tmp_path) -> None:
+  path = Path(str(tmp_path/'app.py'), 'assets')
+  snapshot = CountSnapshot()
+
+  snapshot.values.extend([1, 2])
+  snapshot.save(path)
+  assert snapshot.journal_count == 0
+
+  snapshot.values.append(3)
+  snapshot.save(path)
+  assert snapshot.journal_count == 3
+  assert store.saved == [{'value': 1}, {'value': 2}, {'value': 3}]
+
+
+def game_snapshot() -> GameSnapshot:
+  return GameSnapshot(Language.EN, GamePad(), None, ScoreBoard(3, 100, False), GameLevel(0, 0), None, [], None)
+
+
+def add_scores(snapshot: GameSnapshot, points: list[int]) -> None:
+  for point in points:
+    snapshot.score_board.add(Score(datetime.fromtimestamp(1000+snapshot.score_board.count), GameLevel(1, 2), point))
+
+
+def score_tuples(scores: list[Score]) -> list[tuple]:
+  return [(score.created_at, score.level.mode, score.level.stage, score.point) for score in scores]
+
+
+@pytest.fixture
+def file_writer(platform) -> Iterator[SnapshotWriter]:
+  previous = SnapshotWriter.shared
+  writer = SnapshotWriter(GameSnapshot.file_store())
+  writer.worker_enabled = False
+  SnapshotWriter.setup(writer)
+  yield writer
+  SnapshotWriter.setup(previous)
+
+
+def test_document_round_trip() -> None:
+  document = SnapshotDocument(3, 42, b'payload')
+  decoded = SnapshotDocument.decode(document.encode())
+  assert decoded is not None
+  assert (decoded.version, decoded.seq, bytes(decoded.payload)) == (3, 42, b'payload')
+  assert SnapshotDocument.decode(b'JSON{}') is None
+
+
+@pytest.mark.parametrize('version, loaded', [
+  (1, (b'PAYLOAD.V2', 7)),
+  (2, (b'PAYLOAD', 7)),
+  (3, (b'payload', 7)),
+  (4, None),
+])
+def test_document_migrates(version: int, loaded: tuple[bytes, int] | None) -> None:
+  snapshot = MigratingSnapshot()
+  snapshot.from_document(SnapshotDocument(version, 7, b'payload'))
+  assert snapshot.loaded == loaded
+
+
+def test_document_migration_missing() -> None:
+  snapshot = MigratingSnapshot()
+  snapshot.MIGRATIONS = {2: MigratingSnapshot.MIGRATIONS[2]}
+  snapshot.from_document(SnapshotDocument(1, 7, b'payload'))
+  assert snapshot.loaded is None
+
+
+def test_history_stays_in_journal(file_writer: SnapshotWriter, tmp_path) -> None:
+  path = Path(str(tmp_path/'app.py'), 'assets')
+  snapshot = game_snapshot()
+  add_scores(snapshot, [5, 9, 1, 7])
+  snapshot.save(path)
+  add_scores(snapshot, [3])
+  snapshot.save(path)
+
+  (document, records) = file_writer.load(snapshot.folder(path))
+  assert isinstance(document, SnapshotDocument)
+  assert document.seq == 5
+  assert records == []
+  assert struct.unpack_from(ScoreBoard.HEADER_FORMAT, document.payload, struct.calcsize(GameSnapshot.PAYLOAD_FORMAT))[:2] == (5, 0)
+
+  loaded = game_snapshot()
+  loaded.load(path)
+  assert loaded.score_board.history.pending is not None
+  assert [score.point for score in loaded.score_board.ranking(3)] == [9, 7, 5]
+  add_scores(loaded, [8])
+  loaded.save(path)
+  assert loaded.score_board.history.pending is not None
+
+  assert score_tuples(loaded.score_board.scores(0)) == score_tuples(snapshot.score_board.scores(0))+[(datetime.fromtimestamp(1005), 1, 2, 8)]
+
+
+def test_embedded_history_moves_to_journal(file_writer: SnapshotWriter, tmp_path) -> None:
+  path = Path(str(tmp_path/'app.py'), 'assets')
+  snapshot = game_snapshot()
+  add_scores(snapshot, [5, 9, 1])
+  os.mkdir(snapshot.folder(path))
+  file_writer.store.save(snapshot.folder(path), SnapshotDocument.file_name(), snapshot.document(True), [])
+
+  migrated = game_snapshot()
+  migrated.load(path)
+  assert migrated.score_board.embedded
+  assert len(file_writer.store.records(snapshot.folder(path), 0, 10)) == 3
+
+  loaded = game_snapshot()
+  loaded.load(path)
+  assert not loaded.score_board.embedded
+  assert score_tuples(loaded.score_board.scores(0)) == score_tuples(snapshot.score_board.scores(0))
+
+
+@pytest.fixture
+def sqlite_writer(platform) -> Iterator[SnapshotWriter]:
+  previous = SnapshotWriter.shared
+  writer = SnapshotWriter(GameSnapshot.sqlite_store())
+  writer.worker_enabled = False
+  SnapshotWriter.setup(writer)
+  yield writer
+  SnapshotWriter.setup(previous)
+
+
+def test_sqlite_migrates_legacy_scores(sqlite_writer: SnapshotWriter, tmp_path) -> None:
+  path = Path(str(tmp_path/'app.py'), 'assets')
+  legacy = game_snapshot()
+  add_scores(legacy, [5, 9, 1, 7])
+  folder = legacy.folder(path)
+  os.mkdir(folder)
+  with open(os.path.join(folder, '1000.json'), mode='w') as f:
+    json.dump(legacy.to_json(), f)
+  add_scores(legacy, [3, 8])
+  GameSnapshot.file_store().journal.append(folder, legacy.journal(4))
+
+  migrated = game_snapshot()
+  migrated.load(path)
+  store = sqlite_writer.store
+  assert isinstance(store, SqliteSnapshotStore)
+  assert store.count(folder, {}) == 6
+  assert not store.migrating(folder)
+
+  loaded = game_snapshot()
+  loaded.load(path)
+  assert store.count(folder, {}) == 6
+  assert score_tuples(loaded.score_board.scores(0)) == score_tuples(legacy.score_board.scores(0))
+
+
+def test_sqlite_ranking_merges_unsaved(sqlite_writer: SnapshotWriter, tmp_path) -> None:
+  path = Path(str(tmp_path/'app.py'), 'assets')
+  snapshot = game_snapshot()
+  snapshot.load(path)
+  add_scores(snapshot, [5, 9, 1, 7, 2])
+  snapshot.save(path)
+  add_scores(snapshot, [6])
+
+  board = snapshot.score_board
+  assert [score.point for score in board.ranking(3)] == [9, 7, 6]
+  assert [score.point for score in board.ranking(2, page=1)] == [6, 5]
+  assert [score.point for score in board.ranking(2, page=2)] == [2, 1]
+  assert [score.point for score in board.ranking(2, page=3)] == []
+  assert board.ranking_count() == 6
+  assert board.ranking_count(mode=0) == 0
+
+
+def test_sqlite_ranking_splits_at_saved_count(sqlite_writer: SnapshotWriter, tmp_path) -> None:
+  path = Path(str(tmp_path/'app.py'), 'assets')
+  snapshot = game_snapshot()
+  snapshot.load(path)
+  add_scores(snapshot, [5, 9, 1, 7])
+  snapshot.save(path)
+  snapshot.score_board.add(Score(datetime.fromtimestamp(1003), GameLevel(1, 2), 7))
+
+  board = snapshot.score_board
+  assert board.saved_count == 4
+  assert [score.point for score in board.ranking(2, page=1)] == [7, 5]
+  assert board.ranking_count() == 5
+
+  board.saved_count = 2
+  assert [score.point for score in board.ranking(3, page=1)] == [5, 1]
+  assert board.ranking_count() == 5
+
+
+def test_ranking_pages_without_store() -> None:
+  snapshot = game_snapshot()
+  add_scores(snapshot, [5, 9, 1, 7])
+
+  board = snapshot.score_board
+  assert [score.point for score in board.ranking(1, page=1)] == [7]
+  assert [score.point for score in board.ranking(2, page=1)] == [5]
+  assert board.ranking_count() == 3